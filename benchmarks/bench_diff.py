@@ -0,0 +1,112 @@
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Add the project directory to Python path
+sys.path.insert(0, str(Path(__file__).parent.parent.absolute()))
+
+from calendar_event import Event
+from diff_engine import diff_events
+
+SIZES = (1_000, 2_000, 5_000, 10_000, 50_000, 100_000)
+LEGACY_MAX_SIZE = 50_000  # The old algorithm is quadratic; don't wait on it beyond this
+CHURN = 0.05  # Fraction of events moved, edited, removed and added between runs
+REPEATS = 5  # Timings are the best of this many runs, interleaving both algorithms
+
+def make_calendar(size, seed=42):
+    """Build an event map with recurring series (repeated subjects) and one-off meetings"""
+    rng = random.Random(seed)
+    base = datetime(2025, 9, 1, 8, 0)
+    events = {}
+    for index in range(size):
+        if index % 3 == 0:
+            subject = f"Standup {index % 50}"  # Many instances share a subject
+        else:
+            subject = f"Meeting {index}"
+        start = base + timedelta(minutes=30 * rng.randrange(size * 4))
+        event = Event(subject, str(start), str(start + timedelta(minutes=30)),
+                      f"Room {index % 20}", f"Agenda {index}")
+        events[event.event_id] = event
+    return events
+
+def churn(previous, seed=7):
+    """Return a copy of the calendar with moved, edited, removed and added events
+
+    Unchanged events are fresh objects, as they are when the next export reads them.
+    """
+    rng = random.Random(seed)
+    current = {event_id: Event(event.subject, event.start_text, event.end_text, event.location, event.body)
+               for event_id, event in previous.items()}
+    ids = list(previous)
+    rng.shuffle(ids)
+    step = max(1, int(len(ids) * CHURN))
+    moved, edited, removed = ids[:step], ids[step:2 * step], ids[2 * step:3 * step]
+
+    for event_id in moved:
+        old = current.pop(event_id)
+        start = old.start + timedelta(hours=1)
+        event = Event(old.subject, str(start), str(start + timedelta(minutes=30)), old.location, old.body)
+        current[event.event_id] = event
+    for event_id in edited:
+        old = current[event_id]
+        current[event_id] = Event(old.subject, old.start_text, old.end_text, "Moved room", old.body)
+    for event_id in removed:
+        current.pop(event_id)
+    for index in range(step):
+        start = datetime(2026, 1, 1, 9, 0) + timedelta(minutes=15 * index)
+        event = Event(f"New meeting {index}", str(start), str(start + timedelta(hours=1)))
+        current[event.event_id] = event
+    return current
+
+def legacy_find_changes(previous_events, current_events):
+    """The subject-map / list.remove algorithm SyncTracker.find_changes used to run"""
+    current_ids = set(current_events.keys())
+    previous_ids = set(previous_events.keys())
+    added = list(current_ids - previous_ids)
+    deleted = list(previous_ids - current_ids)
+    modified = []
+    subjects_current = {current_events[eid].subject: eid for eid in current_ids}
+    subjects_previous = {previous_events[eid].subject: eid for eid in previous_ids}
+    for subject in subjects_current:
+        if subject in subjects_previous:
+            current_id = subjects_current[subject]
+            previous_id = subjects_previous[subject]
+            if current_id != previous_id:
+                if current_id in added:
+                    added.remove(current_id)
+                if previous_id in deleted:
+                    deleted.remove(previous_id)
+                modified.append((previous_id, current_id))
+    return added, deleted, modified
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+def best_times(previous, current, legacy, repeats):
+    """Best (diff_events, legacy) seconds over repeated, interleaved runs; legacy None when skipped"""
+    times, legacy_times = [], []
+    for _ in range(repeats):
+        elapsed, result = timed(diff_events, previous, current)
+        times.append(elapsed)
+        if legacy:
+            legacy_times.append(timed(legacy_find_changes, previous, current)[0])
+    return min(times), min(legacy_times) if legacy_times else None, result
+
+def main():
+    print(f"{'events':>8} {'diff_events':>12} {'per event':>10} {'legacy':>10} "
+          f"{'added':>6} {'deleted':>7} {'modified':>8}")
+    for size in SIZES:
+        previous = make_calendar(size)
+        current = churn(previous)
+        elapsed, legacy_elapsed, result = best_times(previous, current, size <= LEGACY_MAX_SIZE,
+                                                     REPEATS if size < 50_000 else 2)
+        legacy = f"{legacy_elapsed * 1000:.2f}ms" if legacy_elapsed is not None else "-"
+        print(f"{size:>8} {elapsed * 1000:>10.2f}ms {elapsed / size * 1e6:>8.2f}us {legacy:>10} "
+              f"{len(result.added):>6} {len(result.deleted):>7} {len(result.modified):>8}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Add the project directory to Python path
+sys.path.insert(0, str(Path(__file__).parent.parent.absolute()))
+
+from calendar_event import Event
+from csv_to_ics import events_to_ics
+
+SIZES = (1_000, 10_000, 100_000)
+REPEATS = 5  # Timings are the best of this many runs, interleaving both writers
+
+def iter_events(size):
+    """Generate events lazily, with bodies long enough to need folding and escaping"""
+    base = datetime(2025, 9, 1, 8, 0)
+    for index in range(size):
+        start = base + timedelta(minutes=30 * index)
+        yield Event(f"Meeting {index}; planning, review", str(start), str(start + timedelta(minutes=30)),
+                    f"Room {index % 20}", f"Agenda item {index}, notes; " * 8)
+
+def legacy_events_to_ics(events, ics_file):
+    """The per-property f.write writer csv_to_ics used before ics_writer"""
+    with open(ics_file, 'w', encoding='utf-8') as f:
+        f.write("BEGIN:VCALENDAR\n")
+        f.write("VERSION:2.0\n")
+        f.write("PRODID:-//Outlook Calendar Export//CSV2ICS//EN\n")
+        f.write("CALSCALE:GREGORIAN\n")
+        f.write("METHOD:PUBLISH\n")
+        f.write("X-WR-CALNAME:Outlook Work Calendar\n")
+        for event in events:
+            now_timestamp = datetime.now().strftime('%Y%m%dT%H%M%SZ')
+            f.write("BEGIN:VEVENT\n")
+            f.write(f"UID:{event.uid}\n")
+            f.write(f"DTSTAMP:{now_timestamp}\n")
+            f.write(f"CREATED:{now_timestamp}\n")
+            f.write(f"LAST-MODIFIED:{now_timestamp}\n")
+            f.write(f"SUMMARY:{event.subject}\n")
+            f.write(f"DTSTART:{event.start.strftime('%Y%m%dT%H%M%S')}\n")
+            f.write(f"DTEND:{event.end.strftime('%Y%m%dT%H%M%S')}\n")
+            if event.location:
+                f.write(f"LOCATION:{event.location}\n")
+            if event.body:
+                description = str(event.body).replace('\n', '\\n').replace(',', '\\,').replace(';', '\\;')
+                f.write(f"DESCRIPTION:{description}\n")
+            f.write("STATUS:CONFIRMED\n")
+            f.write("TRANSP:OPAQUE\n")
+            f.write("END:VEVENT\n")
+        f.write("END:VCALENDAR\n")
+
+def timed(func, events, ics_file):
+    start = time.perf_counter()
+    func(events, ics_file)
+    return time.perf_counter() - start
+
+def best_times(events, ics_file, repeats):
+    """Best (writer, legacy) seconds over repeated, interleaved runs"""
+    writer, legacy = [], []
+    for _ in range(repeats):
+        writer.append(timed(write_ics, events, ics_file))
+        legacy.append(timed(legacy_events_to_ics, events, ics_file))
+    return min(writer), min(legacy)
+
+def peak_memory(func, events, ics_file):
+    """Peak traced allocation in MB while writing"""
+    tracemalloc.start()
+    func(events, ics_file)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 1e6
+
+def write_ics(events, ics_file):
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w')  # events_to_ics prints a status line
+    try:
+        events_to_ics(events, ics_file)
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        ics_file = os.path.join(tmp, "bench.ics")
+        print(f"{'events':>8} {'writer':>10} {'legacy':>10} {'per event':>10} {'size':>8} {'peak (streamed)':>16}")
+        for size in SIZES:
+            events = list(iter_events(size))
+            write_ics(events, ics_file)
+            file_size = os.path.getsize(ics_file) / 1e6
+            elapsed, legacy_elapsed = best_times(events, ics_file, REPEATS if size < 100_000 else 3)
+            del events
+            peak = peak_memory(write_ics, iter_events(size), ics_file)
+            print(f"{size:>8} {elapsed * 1000:>8.1f}ms {legacy_elapsed * 1000:>8.1f}ms "
+                  f"{elapsed / size * 1e6:>8.2f}us {file_size:>6.1f}MB {peak:>14.1f}MB")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+import argparse
+import subprocess
+import sys
+from pathlib import Path
+
+PROJECT_DIR = Path(__file__).parent.parent.absolute()
+
+# Add the project directory to Python path
+sys.path.insert(0, str(PROJECT_DIR))
+
+from config import find_env_file
+
+# What the desktop shortcut, scheduled runs and the daemon import before doing anything
+ENTRY_POINTS = ("sync", "sync_daemon", "desktop_sync")
+BUDGET_MS = 100.0  # Import time allowed per entry point (best of --runs); was ~120ms before deferral
+RUNS = 5
+
+# Only the stage that needs these may import them
+DEFERRED_MODULES = ("smtplib", "ssl", "email.message", "http.client", "concurrent.futures",
+                    "psutil", "win32com", "pythoncom")
+
+def import_profile(module):
+    """Import module in a fresh interpreter under -X importtime; returns {name: (self_us, cumulative_us)}"""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=PROJECT_DIR, capture_output=True, text=True, check=True)
+    profile = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        profile[name.strip()] = (int(self_us), int(cumulative_us))
+    return profile
+
+def main():
+    parser = argparse.ArgumentParser(description="Startup import-time budget check (python -X importtime)")
+    parser.add_argument("--budget-ms", type=float, default=BUDGET_MS, help="Allowed import time per entry point")
+    parser.add_argument("--runs", type=int, default=RUNS, help="Imports per entry point; the fastest counts")
+    parser.add_argument("--top", type=int, default=8, help="Slowest imports to list per entry point")
+    args = parser.parse_args()
+
+    env_file = find_env_file()
+    print(f".env: {env_file or 'none'} (python-dotenv is only imported when there is one)")
+    failures = []
+    for module in ENTRY_POINTS:
+        profiles = [import_profile(module) for _ in range(args.runs)]
+        best = min(profiles, key=lambda profile: profile[module][1])
+        total_ms = best[module][1] / 1000
+        status = "ok" if total_ms <= args.budget_ms else "OVER BUDGET"
+        print(f"\n{module}: {total_ms:.1f}ms of {args.budget_ms:g}ms  {status}")
+        for name, (self_us, _) in sorted(best.items(), key=lambda item: -item[1][0])[:args.top]:
+            print(f"  {self_us / 1000:>7.2f}ms  {name}")
+        if total_ms > args.budget_ms:
+            failures.append(f"{module} takes {total_ms:.1f}ms to import")
+        eager = [name for name in DEFERRED_MODULES if name in best]
+        if eager:
+            failures.append(f"{module} imports {', '.join(eager)} at startup")
+
+    if failures:
+        print("\nStartup budget exceeded:")
+        for failure in failures:
+            print(f"  {failure}")
+        return 1
+    print(f"\nAll entry points import within {args.budget_ms:g}ms without deferred modules")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,162 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from pathlib import Path
+
+# Add the project directory to Python path
+sys.path.insert(0, str(Path(__file__).parent.parent.absolute()))
+
+from calendar_sources import SyntheticSource
+from csv_to_ics import csv_to_ics
+from export_outlook_calendar import write_events_csv
+from sync_tracker import SyncTracker
+
+SIZES = (1_000, 10_000, 100_000)
+FULL_SIZES = SIZES + (1_000_000,)
+BODY_LENGTH = 500  # BODY_CHAR_LIMIT default, so bodies are as long as a real export's
+BASELINE_FILE = Path(__file__).with_name("bench_sync_baseline.json")
+THRESHOLD = 0.25  # Allowed slowdown (or memory growth) over the baseline before failing
+
+STAGES = ("extract", "state_load", "load_current_events", "find_changes", "csv_to_ics",
+          "generate_deletion_ics", "state_save")
+
+def peak_rss_mb():
+    """Peak resident memory of this process in MB (None where unsupported)"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1e6 if sys.platform == "darwin" else peak / 1e3
+
+def run_size(size):
+    """Two syncs of one synthetic calendar (revision 0 then 1); time every stage of the second"""
+    timings = {}
+
+    def timed(stage, func, *args):
+        start = time.perf_counter()
+        result = func(*args)
+        timings[stage] = time.perf_counter() - start
+        return result
+
+    with tempfile.TemporaryDirectory() as tmp, open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        state_file = os.path.join(tmp, "sync_state.db")
+        csv_file = os.path.join(tmp, "export.csv")
+        ics_file = os.path.join(tmp, "export.ics")
+
+        # Baseline run: the state the measured run diffs against
+        tracker = SyncTracker(state_file)
+        tracker.load_previous_sync()
+        tracker.load_events(SyntheticSource(size, revision=0, body_length=BODY_LENGTH).export())
+        tracker.save_current_sync()
+        tracker.state_store.close()
+
+        tracker = SyncTracker(state_file)
+        timed("state_load", tracker.load_previous_sync)
+        events = timed("extract", SyntheticSource(size, revision=1, body_length=BODY_LENGTH).export)
+        write_events_csv(events, csv_file)
+        del events
+        timed("load_current_events", tracker.load_current_events, csv_file)
+        added, deleted, modified = timed("find_changes", tracker.find_changes)
+        timed("csv_to_ics", csv_to_ics, csv_file, ics_file)
+        deletion_ids = deleted + [change.old_id for change in modified if change.old_id != change.new_id]
+        timed("generate_deletion_ics", tracker.generate_deletion_ics, deletion_ids, ics_file)
+        timed("state_save", tracker.save_current_sync)
+        tracker.state_store.close()
+
+    return {
+        "events": size,
+        "stages": timings,
+        "total": sum(timings.values()),
+        "peak_rss_mb": peak_rss_mb(),
+        "changes": {"added": len(added), "deleted": len(deleted), "modified": len(modified)},
+    }
+
+def run_isolated(size):
+    """Run one size in a fresh interpreter so peak memory is measured per size"""
+    output = subprocess.run([sys.executable, __file__, "--child", str(size)],
+                            check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def print_result(result):
+    size = result["events"]
+    print(f"\n{size:,} events  (total {result['total']:.2f}s, "
+          f"peak RSS {result['peak_rss_mb'] or 0:.0f}MB, changes {result['changes']})")
+    print(f"  {'stage':<22} {'seconds':>9} {'per event':>10} {'events/s':>12}")
+    for stage in STAGES:
+        seconds = result["stages"][stage]
+        rate = size / seconds if seconds else float('inf')
+        print(f"  {stage:<22} {seconds:>9.3f} {seconds / size * 1e6:>8.2f}us {rate:>12,.0f}")
+
+def compare(results, baseline, threshold):
+    """Return the stage/memory metrics that regressed by more than threshold"""
+    regressions = []
+    for result in results:
+        base = baseline.get(str(result["events"]))
+        if not base:
+            continue
+        metrics = [(stage, result["stages"][stage], base["stages"].get(stage)) for stage in STAGES]
+        metrics.append(("peak_rss_mb", result["peak_rss_mb"], base.get("peak_rss_mb")))
+        for name, value, reference in metrics:
+            # Ignore sub-millisecond stages; their noise swamps any real change
+            if value is None or not reference or (name != "peak_rss_mb" and reference < 0.001):
+                continue
+            change = value / reference - 1
+            if change > threshold:
+                regressions.append(f"{result['events']:,} events: {name} {reference:.3f} -> "
+                                   f"{value:.3f} (+{change:.0%})")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end sync pipeline benchmark")
+    parser.add_argument("--sizes", help="Comma-separated event counts (default 1k,10k,100k)")
+    parser.add_argument("--full", action="store_true", help="Include the 1M-event calendar")
+    parser.add_argument("--baseline", default=str(BASELINE_FILE), help="Baseline JSON file")
+    parser.add_argument("--save-baseline", action="store_true", help="Store these results as the baseline")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD,
+                        help="Allowed regression as a fraction (default 0.25)")
+    parser.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_size(args.child)))
+        return 0
+
+    if args.sizes:
+        sizes = [int(size.replace("_", "")) for size in args.sizes.split(",")]
+    else:
+        sizes = FULL_SIZES if args.full else SIZES
+
+    results = []
+    for size in sizes:
+        result = run_isolated(size)
+        print_result(result)
+        results.append(result)
+
+    baseline_path = Path(args.baseline)
+    if args.save_baseline:
+        baseline = json.loads(baseline_path.read_text()) if baseline_path.exists() else {}
+        baseline.update({str(result["events"]): result for result in results})
+        baseline_path.write_text(json.dumps(baseline, indent=2))
+        print(f"\nBaseline saved to {baseline_path}")
+        return 0
+    if not baseline_path.exists():
+        print(f"\nNo baseline at {baseline_path}; run with --save-baseline to create one")
+        return 0
+
+    regressions = compare(results, json.loads(baseline_path.read_text()), args.threshold)
+    if regressions:
+        print(f"\nRegressions over {args.threshold:.0%}:")
+        for regression in regressions:
+            print(f"  {regression}")
+        return 1
+    print(f"\nNo regressions over {args.threshold:.0%} against {baseline_path}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
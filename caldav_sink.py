@@ -0,0 +1,250 @@
+import atexit
+import base64
+import http.client
+import io
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+from urllib.parse import quote, urlsplit
+from config import load_config
+from ics_writer import ICSWriter
+
+# Load environment variables
+load_config()
+
+# Calendar collection URL, e.g. https://caldav.example.com/user/calendar/
+caldav_url = os.getenv("CALDAV_URL", "")
+caldav_username = os.getenv("CALDAV_USERNAME") or os.getenv("ICLOUD_EMAIL", "")
+caldav_password = os.getenv("CALDAV_PASSWORD") or os.getenv("ICLOUD_APP_PASSWORD", "")
+caldav_workers = int(os.getenv("CALDAV_WORKERS", 4))  # Requests (and connections) in flight
+caldav_timeout = int(os.getenv("CALDAV_TIMEOUT", 30))
+
+PRODID = "-//Outlook Calendar Export//CalDAV//EN"
+
+class CalDAVError(Exception):
+    """A CalDAV request got an unexpected HTTP status"""
+
+    def __init__(self, method, href, status, reason=""):
+        super().__init__(f"{method} {href} failed: {status} {reason}".rstrip())
+        self.status = status
+
+class CalDAVClient:
+    """HTTP client for one calendar collection over a pool of keep-alive connections
+
+    At most `connections` requests run at once; each takes an idle connection from
+    the pool (opening one only when none is idle) and hands it back afterwards, so
+    consecutive requests reuse the TCP and TLS session. A pooled connection the
+    server has closed in the meantime is replaced and the request retried once.
+    """
+
+    def __init__(self, url, username="", password="", connections=4, timeout=30):
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise ValueError(f"Invalid CalDAV collection URL: {url!r}")
+        self.https = parts.scheme == "https"
+        self.host = parts.hostname
+        self.port = parts.port
+        self.path = parts.path if parts.path.endswith("/") else parts.path + "/"
+        self.timeout = timeout
+        self.headers = {}
+        if username:
+            credentials = base64.b64encode(f"{username}:{password}".encode()).decode()
+            self.headers["Authorization"] = f"Basic {credentials}"
+        self.connects = 0
+        self.requests = 0
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(connections)
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        connection_class = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+        with self._lock:
+            self.connects += 1
+        return connection_class(self.host, self.port, timeout=self.timeout)
+
+    def _send(self, connection, method, href, body, headers):
+        connection.request(method, self.path + href, body=body, headers={**self.headers, **headers})
+        response = connection.getresponse()
+        response.read()  # Drain it so the connection can be reused
+        return response
+
+    def request(self, method, href, body=None, headers=None):
+        """Send one request relative to the collection; returns the (read) response"""
+        headers = headers or {}
+        with self._slots:
+            try:
+                connection, reused = self._idle.get_nowait(), True
+            except queue.Empty:
+                connection, reused = self._connect(), False
+            try:
+                try:
+                    response = self._send(connection, method, href, body, headers)
+                except (http.client.RemoteDisconnected, ConnectionError):
+                    if not reused:
+                        raise
+                    connection.close()  # Closed while idle; requests here are idempotent
+                    connection = self._connect()
+                    response = self._send(connection, method, href, body, headers)
+            except Exception:
+                connection.close()
+                raise
+            with self._lock:
+                self.requests += 1
+            if response.will_close:
+                connection.close()
+            else:
+                self._idle.put(connection)
+            return response
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+_client = None
+
+def get_client() -> CalDAVClient:
+    """The process-wide client for CALDAV_URL, so runs share pooled connections"""
+    global _client
+    if _client is None:
+        _client = CalDAVClient(caldav_url, caldav_username, caldav_password,
+                               caldav_workers, caldav_timeout)
+        atexit.register(_client.close)
+    return _client
+
+class CalDAVSink:
+    """Pushes sync changes to a CalDAV calendar as one resource per event
+
+    Changed events are PUT and removed ones DELETEd, conditionally on the ETag
+    from our last write (If-Match) or on the resource not existing yet
+    (If-None-Match: *). A 412 means someone else changed the resource since: it
+    is fetched again, and unless it turns out to be gone the server's version is
+    kept and reported as a conflict, never overwritten. The next change made in
+    Outlook is written over the fetched ETag. Deleting an event we hold no ETag
+    for fetches it first and deletes that version.
+
+    A recurring series is one resource: its master plus the modified occurrences
+    (overrides), all sharing the master's UID, as RFC 4791 requires.
+
+    Known resources come in as {event_id: (href, etag)}; after push(),
+    `updates` and `removed` hold what to store for next time.
+    """
+
+    def __init__(self, client: CalDAVClient, resources=None, calendar_name="Outlook Work Calendar",
+                 workers=None):
+        self.client = client
+        self.resources = dict(resources or {})
+        self.calendar_name = calendar_name
+        self.workers = workers or caldav_workers
+        self.dtstamp = datetime.now(timezone.utc)
+        self.updates = {}
+        self.removed = set()
+        self.stats = {'put': 0, 'deleted': 0, 'conflicts': 0, 'failed': 0, 'bytes': 0}
+        self.conflicts = []  # (kind, event_id, href) left as they are on the server
+
+    @staticmethod
+    def href(event) -> str:
+        return quote(event.uid, safe="") + ".ics"
+
+    def render(self, event, sequence=None, overrides=()) -> bytes:
+        """One VCALENDAR holding just this event, and the (event, sequence) overrides of a series"""
+        buffer = io.StringIO()
+        writer = ICSWriter(buffer, self.calendar_name, method=None, prodid=PRODID, dtstamp=self.dtstamp)
+        writer.begin()
+        writer.write_event(event, sequence)
+        for override, override_sequence in overrides:
+            writer.write_event(override, override_sequence)
+        writer.end()
+        return buffer.getvalue().encode("utf-8")
+
+    def _write(self, method, href, etag=None, body=None, new=False):
+        """Conditional request; returns (response, conflict)
+
+        On a 412 the resource is fetched again. If it is gone, a DELETE is done and a
+        PUT creates it afresh (If-None-Match: *); otherwise nothing is written and the
+        GET response, carrying the server's current ETag, comes back as a conflict.
+        """
+        headers = {"Content-Type": "text/calendar; charset=utf-8"} if body is not None else {}
+        if etag:
+            conditional = {**headers, "If-Match": etag}
+        elif new:
+            conditional = {**headers, "If-None-Match": "*"}
+        else:
+            conditional = headers
+        response = self.client.request(method, href, body, conditional)
+        if response.status != 412:
+            return response, False
+        current = self.client.request("GET", href)
+        if current.status == 404:  # Deleted on the server in the meantime
+            if method == "DELETE":
+                return current, False
+            return self.client.request(method, href, body, {**headers, "If-None-Match": "*"}), False
+        if current.status != 200:
+            raise CalDAVError("GET", href, current.status, current.reason)
+        return current, True
+
+    def put(self, event, sequence=None, overrides=()):
+        new = event.event_id not in self.resources
+        href, etag = self.resources.get(event.event_id, (self.href(event), None))
+        body = self.render(event, sequence, overrides)
+        response, conflict = self._write("PUT", href, etag, body, new)
+        if conflict:
+            return href, response.getheader("ETag"), 0, True
+        if response.status not in (200, 201, 204):
+            raise CalDAVError("PUT", href, response.status, response.reason)
+        return href, response.getheader("ETag"), len(body), conflict
+
+    def delete(self, event_id, event=None):
+        if event_id in self.resources:
+            href, etag = self.resources[event_id]
+        elif event is not None:
+            # Not tracked (never pushed, or the state was reset): only ever delete the
+            # version we have just seen, never whatever happens to be there
+            href = self.href(event)
+            current = self.client.request("GET", href)
+            if current.status == 404:
+                return href, None, 0, False
+            if current.status != 200:
+                raise CalDAVError("GET", href, current.status, current.reason)
+            etag = current.getheader("ETag")
+            if not etag:
+                return href, None, 0, True  # Can't delete it conditionally; leave it
+        else:
+            return None, None, 0, False  # Never pushed and nothing to derive the href from
+        response, conflict = self._write("DELETE", href, etag)
+        if conflict:
+            return href, None, 0, True  # Edited on the server: kept there, no longer tracked
+        if response.status not in (200, 204, 404):  # 404: already gone
+            raise CalDAVError("DELETE", href, response.status, response.reason)
+        return href, None, 0, conflict
+
+    def push(self, upserts, deletions) -> bool:
+        """PUT (event, sequence[, overrides]) and DELETE (event_id, event) pairs; True if all succeeded"""
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = {pool.submit(self.delete, event_id, event): ('deleted', event_id)
+                       for event_id, event in deletions}
+            futures.update({pool.submit(self.put, *upsert): ('put', upsert[0].event_id)
+                            for upsert in upserts})
+            for future in as_completed(futures):
+                kind, event_id = futures[future]
+                try:
+                    href, etag, size, conflict = future.result()
+                except Exception as e:
+                    self.stats['failed'] += 1
+                    print(f"  CalDAV {kind} of {event_id} failed: {e}")
+                    continue
+                self.stats['bytes'] += size
+                if conflict:
+                    self.stats['conflicts'] += 1
+                    self.conflicts.append((kind, event_id, href))
+                else:
+                    self.stats[kind] += 1
+                if kind == 'put':
+                    self.updates[event_id] = (href, etag)
+                else:
+                    self.removed.add(event_id)
+        return self.stats['failed'] == 0
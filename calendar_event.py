@@ -0,0 +1,239 @@
+import hashlib
+import re
+from datetime import datetime
+from typing import Dict, List, Optional
+
+UID_DOMAIN = "outlooksync.local"
+
+# Formats seen in Outlook exports, most common first
+DATETIME_FORMATS = (
+    "%Y-%m-%d %H:%M:%S",      # Standard Outlook export format
+    "%m/%d/%Y %I:%M:%S %p",   # Alternative format
+    "%Y-%m-%d %H:%M:%S%z",    # With timezone
+    "%Y-%m-%dT%H:%M:%S%z",    # ISO format with timezone
+    "%Y-%m-%dT%H:%M:%S"       # ISO format without timezone
+)
+
+ISO_FORMATS = frozenset(DATETIME_FORMATS[0:1] + DATETIME_FORMATS[2:])  # All parseable by fromisoformat
+US_DATETIME = re.compile(r"(\d{1,2})/(\d{1,2})/(\d{4}) (\d{1,2}):(\d{2}):(\d{2}) ([AP]M)$", re.IGNORECASE)
+PARSE_CACHE_SIZE = 4096  # Cleared when full; keeps the shared parser's memory flat
+
+def parse_outlook_datetime(dt_str: str) -> datetime:
+    """Parse an Outlook datetime string, keeping the wall-clock (local) time"""
+    return _match_format(dt_str)[0]
+
+def _match_format(dt_str: str):
+    """Slow path: try every known format; returns (datetime, format)"""
+    for fmt in DATETIME_FORMATS:
+        try:
+            return datetime.strptime(dt_str, fmt), fmt
+        except ValueError:
+            continue
+    raise ValueError(f"Unrecognized date format: {dt_str}")
+
+def _parse_iso(dt_str: str) -> datetime:
+    # fromisoformat also takes dates, fractions and basic format; leave those to strptime
+    if len(dt_str) < 19 or (len(dt_str) > 19 and dt_str[19] not in '+-Z'):
+        raise ValueError(dt_str)
+    return datetime.fromisoformat(dt_str)
+
+def _parse_us(dt_str: str) -> datetime:
+    match = US_DATETIME.match(dt_str)
+    if not match:
+        raise ValueError(dt_str)
+    month, day, year, hour, minute, second, meridiem = match.groups()
+    hour = int(hour)
+    if not 1 <= hour <= 12:
+        raise ValueError(dt_str)
+    hour = hour % 12 + (12 if meridiem.upper() == 'PM' else 0)
+    return datetime(int(year), int(month), int(day), hour, int(minute), int(second))
+
+class DateParser:
+    """Datetime parser that learns the format in use from the first value it sees
+
+    Files and exports use a single format throughout, so after the first value every
+    later one goes through a compiled fast path (fromisoformat or a regex) instead of
+    trying each format with strptime. Values that don't fit fall back to the full
+    format list. Parsed values are cached, since recurring instances repeat times.
+    """
+
+    def __init__(self):
+        self.format = None
+        self._fast = None
+        self._cache: Dict[str, datetime] = {}
+
+    def parse(self, dt_str: str) -> datetime:
+        cached = self._cache.get(dt_str)
+        if cached is not None:
+            return cached
+        value = None
+        if self._fast is not None:
+            try:
+                value = self._fast(dt_str)
+            except ValueError:
+                pass
+        if value is None:
+            value, fmt = _match_format(dt_str)
+            if self.format is None:
+                self._learn(fmt)
+        if len(self._cache) >= PARSE_CACHE_SIZE:
+            self._cache.clear()
+        self._cache[dt_str] = value
+        return value
+
+    def _learn(self, fmt: str):
+        self.format = fmt
+        if fmt in ISO_FORMATS:
+            self._fast = _parse_iso
+        elif fmt == "%m/%d/%Y %I:%M:%S %p":
+            self._fast = _parse_us
+        else:
+            self._fast = lambda dt_str: datetime.strptime(dt_str, fmt)
+
+# Shared by Events built without a per-file parser
+default_parser = DateParser()
+
+def digest_text(text: str) -> str:
+    """Short stable digest used to compare field values without storing them"""
+    return hashlib.md5(text.encode('utf-8')).hexdigest()
+
+def _try_parse(dt_str: str, parser: DateParser) -> Optional[datetime]:
+    if not dt_str:
+        return None
+    try:
+        return parser.parse(dt_str)
+    except ValueError:
+        return None
+
+class Event:
+    """A single calendar event shared by the export, ICS conversion and sync tracker
+
+    The original start/end strings are kept because the event ID (and so the ICS UID)
+    is derived from them; the parsed datetimes are computed once at construction.
+    `source` labels the calendar an event came from in a multi-source export.
+
+    A recurring series exported as one unit is a master whose `recurrence` holds its
+    RRULE (and EXDATE) lines; each modified occurrence is an event of its own with a
+    RECURRENCE-ID line in `recurrence` and the master's event ID in `series`.
+    """
+
+    __slots__ = ('subject', 'start_text', 'end_text', 'location', 'body', 'source',
+                 'recurrence', 'series', 'start', 'end', '_body_digest', '_event_id', '_id_fields')
+
+    __hash__ = None  # Mutable and compared by value; key collections by event_id instead
+
+    def __init__(self, subject: str, start_text: str, end_text: str,
+                 location: str = "", body: str = "", source: str = "",
+                 recurrence: str = "", series: str = "", parser: Optional[DateParser] = None):
+        self.subject = subject
+        self.start_text = start_text
+        self.end_text = end_text
+        self.location = location
+        self.body = body
+        self.source = source
+        self.recurrence = recurrence
+        self.series = series
+        parser = parser or default_parser
+        self.start = _try_parse(start_text, parser)
+        self.end = _try_parse(end_text, parser)
+        self._body_digest = None
+        self._event_id = None
+        self._id_fields = None
+
+    @property
+    def event_id(self) -> str:
+        """Hash of subject + start time + end time (+ source, if any), as used by the sync history
+
+        A modified occurrence is identified by its series and original start instead,
+        so edits to it (even of subject or time) keep its ID. The hash is kept until
+        one of the fields it covers is reassigned (e.g. `source` after an export).
+        """
+        fields = (self.subject, self.start_text, self.end_text, self.source, self.series, self.recurrence)
+        if fields != self._id_fields:
+            if self.series:
+                event_string = f"{self.series}|{self.recurrence}"
+            else:
+                event_string = f"{self.subject}|{self.start_text}|{self.end_text}"
+                if self.source:
+                    # The same meeting on two published calendars must not share a UID
+                    event_string += f"|{self.source}"
+            self._event_id = hashlib.md5(event_string.encode('utf-8')).hexdigest()
+            self._id_fields = fields
+        return self._event_id
+
+    @property
+    def uid(self) -> str:
+        # Occurrences share their series' UID (RFC 5545 RECURRENCE-ID)
+        return f"{self.series or self.event_id}@{UID_DOMAIN}"
+
+    @property
+    def body_digest(self) -> str:
+        """Digest of the body; the only trace of the body kept in the sync state store"""
+        if self._body_digest is None:
+            self._body_digest = digest_text(self.body or "")
+        return self._body_digest
+
+    def same_body(self, other: "Event") -> bool:
+        """Whether two events have the same body; texts are compared unless one side has only a digest"""
+        if self._body_digest is None and other._body_digest is None:
+            return (self.body or "") == (other.body or "")
+        return self.body_digest == other.body_digest
+
+    @classmethod
+    def from_digest(cls, subject: str, start_text: str, end_text: str,
+                    location: str, body_digest: str, source: str = "",
+                    recurrence: str = "", series: str = "") -> "Event":
+        """Build a stored event whose body is known only by its digest"""
+        event = cls(subject, start_text, end_text, location, "", source, recurrence, series)
+        event._body_digest = body_digest
+        return event
+
+    @classmethod
+    def from_csv_row(cls, row: Dict, parser: Optional[DateParser] = None) -> "Event":
+        """Build from a csv.DictReader row (Subject/Start/End/Location/Body/Source/Recurrence/Series)"""
+        return cls(row.get('Subject', ''), row.get('Start', ''), row.get('End', ''),
+                   row.get('Location', '') or '', row.get('Body', '') or '',
+                   row.get('Source', '') or '', row.get('Recurrence', '') or '',
+                   row.get('Series', '') or '', parser=parser)
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "Event":
+        """Build from a sync history entry (subject/start/end/location/body/source/recurrence/series)"""
+        return cls(data.get('subject', ''), data.get('start', ''), data.get('end', ''),
+                   data.get('location', '') or '', data.get('body', '') or '',
+                   data.get('source', '') or '', data.get('recurrence', '') or '',
+                   data.get('series', '') or '')
+
+    def to_csv_row(self) -> List[str]:
+        return [self.subject, self.start_text, self.end_text, self.location, self.body, self.source,
+                self.recurrence, self.series]
+
+    def to_dict(self) -> Dict:
+        return {
+            'subject': self.subject,
+            'start': self.start_text,
+            'end': self.end_text,
+            'location': self.location,
+            'body': self.body,
+            'source': self.source,
+            'recurrence': self.recurrence,
+            'series': self.series
+        }
+
+    def __eq__(self, other):
+        if not isinstance(other, Event):
+            return NotImplemented
+        return self.to_csv_row() == other.to_csv_row()
+
+    def __repr__(self):
+        return f"Event({self.subject!r}, {self.start_text!r}, {self.end_text!r})"
+
+def as_event(value) -> Event:
+    """Convert an Event, CSV row dict, sync history dict or CSV row list to an Event"""
+    if isinstance(value, Event):
+        return value
+    if isinstance(value, dict):
+        if 'Subject' in value or 'Start' in value:
+            return Event.from_csv_row(value)
+        return Event.from_dict(value)
+    return Event(*value)
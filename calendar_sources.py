@@ -0,0 +1,262 @@
+import os
+import random
+from datetime import datetime, timedelta, timezone
+from typing import Iterator, List, Optional
+from config import load_config
+from calendar_event import Event
+
+# Load environment variables
+load_config()
+
+# Which backend run_sync_with_deletions reads from: outlook, fake-outlook, ics or synthetic
+source_backend = os.getenv("SOURCE_BACKEND", "outlook").lower()
+source_ics_file = os.getenv("SOURCE_ICS_FILE", "")
+synthetic_events = int(os.getenv("SYNTHETIC_EVENTS", 1000))
+synthetic_seed = int(os.getenv("SYNTHETIC_SEED", 42))
+synthetic_revision = int(os.getenv("SYNTHETIC_REVISION", 0))
+
+class CalendarSource:
+    """Where the sync gets its events from
+
+    prepare() makes the source usable (e.g. starts Outlook) and returns False if it
+    can't be; export() returns the current Events. Only the Outlook backend needs
+    Windows, the others let the whole sync run anywhere.
+    """
+
+    name = "source"
+
+    def prepare(self) -> bool:
+        return True
+
+    def export(self, cache=None) -> List[Event]:
+        raise NotImplementedError
+
+class OutlookSource(CalendarSource):
+    """Classic Outlook over COM, via export_outlook_calendar
+
+    With a namespace_factory (e.g. fake_outlook.build_sample_namespace) the Outlook
+    process checks are skipped and the export runs against that namespace.
+    """
+
+    name = "outlook"
+
+    def __init__(self, namespace_factory=None):
+        self.namespace_factory = namespace_factory
+        self.namespace = None
+
+    def prepare(self) -> bool:
+        """Connect to Outlook, reusing a connection from an earlier run if it still answers"""
+        if self.namespace is not None and self._namespace_alive():
+            return True
+        if self.namespace_factory is not None:
+            self.namespace = self.namespace_factory()
+            return True
+        from outlook_manager import OutlookManager  # Windows-only dependencies
+
+        manager = OutlookManager()
+        if not manager.ensure_classic_outlook_running():
+            return False
+        self.namespace = manager.namespace
+        return True
+
+    def _namespace_alive(self) -> bool:
+        try:
+            self.namespace.GetDefaultFolder(9)  # Cheap round trip; fails if Outlook went away
+            return True
+        except Exception as e:
+            print(f"Outlook connection lost ({e}), reconnecting...")
+            self.namespace = None
+            return False
+
+    def export(self, cache=None, entry_ids=None) -> List[Event]:
+        """Export the calendar; with entry_ids, re-read only those items (see export_calendar)"""
+        from export_outlook_calendar import export_calendar
+
+        return export_calendar(namespace=self.namespace, cache=cache,
+                               namespace_factory=self.namespace_factory, entry_ids=entry_ids)
+
+def _unescape_text(value: str) -> str:
+    return (value.replace('\\n', '\n').replace('\\N', '\n').replace('\\,', ',')
+            .replace('\\;', ';').replace('\\\\', '\\'))
+
+def _ics_value_text(value: str, params: str) -> str:
+    """Turn an ICS DATE / DATE-TIME value into the text form the Outlook export uses"""
+    if 'VALUE=DATE' in params and 'VALUE=DATE-TIME' not in params:
+        return str(datetime.strptime(value, '%Y%m%d'))
+    if value.endswith('Z'):
+        # To naive local time like every other value, so starts stay comparable when sorting
+        utc = datetime.strptime(value, '%Y%m%dT%H%M%SZ').replace(tzinfo=timezone.utc)
+        return str(utc.astimezone().replace(tzinfo=None))
+    return str(datetime.strptime(value, '%Y%m%dT%H%M%S'))
+
+def _unfold(lines) -> Iterator[str]:
+    current = None
+    for line in lines:
+        line = line.rstrip('\r\n')
+        if line[:1] in (' ', '\t') and current is not None:
+            current += line[1:]
+            continue
+        if current is not None:
+            yield current
+        current = line
+    if current is not None:
+        yield current
+
+def iter_ics_events(ics_file: str, source: str = "") -> Iterator[Event]:
+    """Stream the VEVENTs of an ICS file as Events
+
+    Times are kept as naive local wall-clock values (TZID is ignored, UTC is converted
+    to local time), which matches what the Outlook export produces. Cancelled events are skipped and
+    recurring events contribute their first instance only. Properties of components nested in
+    an event (VALARM reminders and the like) are not the event's own and are ignored.
+    """
+    with open(ics_file, 'r', encoding='utf-8') as f:
+        fields = None
+        depth = 0  # Components open inside the current VEVENT
+        for line in _unfold(f):
+            if line == 'BEGIN:VEVENT':
+                fields = {}
+                depth = 0
+                continue
+            if fields is not None and line.startswith('BEGIN:'):
+                depth += 1
+                continue
+            if depth and line.startswith('END:'):
+                depth -= 1
+                continue
+            if line == 'END:VEVENT':
+                if fields is not None and fields.get('STATUS') != 'CANCELLED' and 'DTSTART' in fields:
+                    yield Event(fields.get('SUMMARY', ''), fields['DTSTART'],
+                                fields.get('DTEND', fields['DTSTART']), fields.get('LOCATION', ''),
+                                fields.get('DESCRIPTION', ''), source)
+                fields = None
+                continue
+            if fields is None or depth or ':' not in line:
+                continue
+            name, value = line.split(':', 1)
+            name, _, params = name.partition(';')
+            name = name.upper()
+            try:
+                if name in ('DTSTART', 'DTEND'):
+                    fields[name] = _ics_value_text(value, params.upper())
+                elif name in ('SUMMARY', 'LOCATION', 'DESCRIPTION'):
+                    fields[name] = _unescape_text(value)
+                elif name == 'STATUS':
+                    fields[name] = value.upper()
+            except ValueError:
+                print(f"Skipping unreadable {name} value: {value}")
+
+class ICSFileSource(CalendarSource):
+    """Events read from an .ics file (e.g. a calendar exported elsewhere)"""
+
+    name = "ics"
+
+    def __init__(self, ics_file: str, source: str = ""):
+        self.ics_file = ics_file
+        self.source = source
+
+    def prepare(self) -> bool:
+        if not os.path.exists(self.ics_file):
+            print(f"ICS source file not found: {self.ics_file}")
+            return False
+        return True
+
+    def export(self, cache=None) -> List[Event]:
+        events = list(iter_ics_events(self.ics_file, self.source))
+        print(f"Read {len(events)} events from {self.ics_file}")
+        return events
+
+class SyntheticSource(CalendarSource):
+    """Deterministic in-memory calendar for load tests and profiling
+
+    A third of the events form daily series sharing a subject (like standups); the
+    rest are one-off meetings. The same seed always yields the same calendar, and
+    body_length pads bodies to a realistic size. Each revision step moves, edits,
+    removes and adds a `churn` fraction of events, so consecutive runs with an
+    increasing revision exercise change detection like a real, changing calendar.
+    """
+
+    name = "synthetic"
+
+    def __init__(self, count: int = 1000, seed: int = 42, revision: int = 0, churn: float = 0.05,
+                 start: Optional[datetime] = None, body_length: int = 0):
+        self.count = count
+        self.body_length = body_length
+        self.seed = seed
+        self.revision = revision
+        self.churn = churn
+        today = datetime.now().replace(hour=8, minute=0, second=0, microsecond=0)
+        self.start = start or today - timedelta(weeks=2)
+
+    def _base_events(self) -> List[Event]:
+        rng = random.Random(self.seed)
+        days = 14 * 7  # The sync window
+        slots = days * 120  # Five-minute slots, 8:00-18:00
+        # A third of the events are daily series: same subject and time every day
+        series_count = max(50, -(-self.count // (3 * days)))
+        padding = " Notes, actions; follow-ups." * (self.body_length // 28 + 1) if self.body_length else ""
+        events = []
+        for index in range(self.count):
+            if index % 3 == 0:
+                day, series = divmod(index // 3, series_count)
+                subject = f"Standup {series}"
+                slot = day * 120 + series % 120
+            else:
+                subject = f"Meeting {index}"
+                slot = rng.randrange(slots)
+            begin = self.start + timedelta(days=slot // 120, minutes=5 * (slot % 120))
+            body = f"Agenda for {subject}"
+            if padding:
+                body = (body + padding)[:self.body_length]
+            events.append(Event(subject, str(begin), str(begin + timedelta(minutes=30)),
+                                f"Room {index % 20}", body))
+        return events
+
+    def _apply_revision(self, events: List[Event], revision: int) -> List[Event]:
+        rng = random.Random(self.seed * 1000 + revision)
+        step = max(1, int(len(events) * self.churn)) if events else 0
+        picked = rng.sample(range(len(events)), min(len(events), 3 * step))
+        moved, edited, removed = picked[:step], picked[step:2 * step], set(picked[2 * step:])
+        ids = {event.event_id for event in events}
+        for index in moved:
+            old = events[index]
+            begin = old.start + timedelta(hours=1)
+            event = Event(old.subject, str(begin), str(begin + timedelta(minutes=30)),
+                          old.location, old.body)
+            if event.event_id not in ids:
+                ids.add(event.event_id)
+                events[index] = event
+        for index in edited:
+            old = events[index]
+            events[index] = Event(old.subject, old.start_text, old.end_text,
+                                  f"Room {rng.randrange(100)}", old.body)
+        events = [event for index, event in enumerate(events) if index not in removed]
+        for index in range(step):
+            begin = self.start + timedelta(days=rng.randrange(98), hours=rng.randrange(8, 18))
+            events.append(Event(f"Revision {revision} meeting {index}", str(begin),
+                                str(begin + timedelta(hours=1)), "", ""))
+        return events
+
+    def export(self, cache=None) -> List[Event]:
+        events = self._base_events()
+        for revision in range(1, self.revision + 1):
+            events = self._apply_revision(events, revision)
+        events.sort(key=lambda event: event.start)
+        print(f"Generated {len(events)} synthetic events (seed {self.seed}, revision {self.revision})")
+        return events
+
+def get_source(backend: Optional[str] = None) -> CalendarSource:
+    """Build the configured source backend (SOURCE_BACKEND)"""
+    backend = (backend or source_backend).lower()
+    if backend == "outlook":
+        return OutlookSource()
+    if backend == "fake-outlook":
+        from fake_outlook import build_sample_namespace
+
+        namespace = build_sample_namespace()
+        return OutlookSource(namespace_factory=lambda: namespace)
+    if backend == "ics":
+        return ICSFileSource(source_ics_file)
+    if backend == "synthetic":
+        return SyntheticSource(synthetic_events, synthetic_seed, synthetic_revision)
+    raise ValueError(f"Unknown SOURCE_BACKEND: {backend}")
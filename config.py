@@ -0,0 +1,35 @@
+import os
+
+# Settings stay module-level os.getenv reads; this only makes sure the .env file has
+# been applied to the environment first, once per process however many modules ask.
+_loaded = False
+
+def find_env_file():
+    """The .env file load_dotenv() would pick: next to these modules or in a parent, else from the cwd"""
+    for start in (os.path.dirname(os.path.abspath(__file__)), os.getcwd()):
+        directory = start
+        while True:
+            path = os.path.join(directory, ".env")
+            if os.path.isfile(path):
+                return path
+            parent = os.path.dirname(directory)
+            if parent == directory:
+                break
+            directory = parent
+    return None
+
+def load_config():
+    """Apply .env to os.environ on the first call; later calls return at once
+
+    python-dotenv is only imported when there is a .env file to read. As with
+    load_dotenv(), variables already set in the environment win.
+    """
+    global _loaded
+    if not _loaded:
+        _loaded = True
+        path = find_env_file()
+        if path is not None:
+            from dotenv import load_dotenv
+
+            load_dotenv(path)
+    return os.environ
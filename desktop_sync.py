@@ -7,8 +7,6 @@ from pathlib import Path
 script_dir = Path(__file__).parent.absolute()
 sys.path.insert(0, str(script_dir))
 
-from sync import run_sync_with_deletions
-
 def main():
     """Ad-hoc calendar sync with user interaction"""
     print("🗓️  Outlook Calendar Sync - Manual Run")
@@ -41,6 +39,9 @@ def main():
     print("-" * 50)
     
     try:
+        # Imported only now so the prompt above shows without waiting for the sync modules
+        from sync import run_sync_with_deletions
+
         success = run_sync_with_deletions()
         
         print("-" * 50)
@@ -0,0 +1,142 @@
+from typing import Dict, List, NamedTuple, Tuple
+from calendar_event import Event
+
+FIELD_TIME = 'time'
+FIELD_LOCATION = 'location'
+FIELD_BODY = 'body'
+FIELD_SUBJECT = 'subject'  # Only changes under a stable ID for modified occurrences
+FIELD_RECURRENCE = 'recurrence'
+
+class EventChange(NamedTuple):
+    """A modified event: old and new IDs (equal when only location/body/recurrence changed)"""
+    old_id: str
+    new_id: str
+    fields: Tuple[str, ...]
+
+class DiffResult(NamedTuple):
+    added: List[str]
+    deleted: List[str]
+    modified: List[EventChange]
+
+def changed_fields(old: Event, new: Event) -> Tuple[str, ...]:
+    """Names of the fields that differ between two versions of an event"""
+    fields = []
+    if old.subject != new.subject:
+        fields.append(FIELD_SUBJECT)
+    if old.start_text != new.start_text or old.end_text != new.end_text:
+        fields.append(FIELD_TIME)
+    if (old.location or "") != (new.location or ""):
+        fields.append(FIELD_LOCATION)
+    if not old.same_body(new):
+        fields.append(FIELD_BODY)
+    if (old.recurrence or "") != (new.recurrence or ""):
+        fields.append(FIELD_RECURRENCE)
+    return tuple(fields)
+
+def _same_fields(old: Event, new: Event) -> bool:
+    """Quick check that nothing changed; changed_fields() tells what did when it fails"""
+    return (old.location == new.location and old.start_text == new.start_text
+            and old.end_text == new.end_text and old.subject == new.subject
+            and old.recurrence == new.recurrence and old.same_body(new))
+
+# Keys tried, in order, to pair a vanished event with a new one of the same subject
+# (from the same source calendar). Each pass only sees what earlier passes left unmatched.
+def _key_same_start(event: Event):
+    return event.source, event.subject, event.start_text
+
+def _key_same_end(event: Event):
+    return event.source, event.subject, event.end_text
+
+def _key_same_day(event: Event):
+    return event.source, event.subject, event.start.date() if event.start else event.start_text
+
+MATCH_KEYS = (_key_same_start, _key_same_end, _key_same_day)
+
+def _sort_key(event: Event):
+    # By wall-clock time: exports can mix naive and offset-aware starts, which don't compare
+    if event.start is None:
+        return True, event.start_text
+    return False, event.start.replace(tzinfo=None)
+
+def _pair_by_key(previous, current, old_ids, new_ids, key, pairs):
+    """Pair unmatched IDs sharing a key, first come first served; returns the leftovers"""
+    buckets: Dict[object, List[str]] = {}
+    for old_id in old_ids:
+        buckets.setdefault(key(previous[old_id]), []).append(old_id)
+    for bucket in buckets.values():
+        bucket.reverse()  # pop() from the end hands them out in original order
+
+    unmatched_new = []
+    for new_id in new_ids:
+        bucket = buckets.get(key(current[new_id]))
+        if bucket:
+            pairs.append((bucket.pop(), new_id))
+        else:
+            unmatched_new.append(new_id)
+    unmatched_old = [old_id for bucket in buckets.values() for old_id in reversed(bucket)]
+    return unmatched_old, unmatched_new
+
+def _pair_by_subject_rank(previous, current, old_ids, new_ids, pairs):
+    """Pair the n-th remaining instance of a subject with the n-th new one, by start time"""
+    old_by_subject: Dict[Tuple[str, str], List[str]] = {}
+    for old_id in old_ids:
+        event = previous[old_id]
+        old_by_subject.setdefault((event.source, event.subject), []).append(old_id)
+    new_by_subject: Dict[Tuple[str, str], List[str]] = {}
+    for new_id in new_ids:
+        event = current[new_id]
+        new_by_subject.setdefault((event.source, event.subject), []).append(new_id)
+
+    unmatched_old, unmatched_new = [], []
+    for subject, olds in old_by_subject.items():
+        news = new_by_subject.pop(subject, [])
+        olds.sort(key=lambda old_id: _sort_key(previous[old_id]))
+        news.sort(key=lambda new_id: _sort_key(current[new_id]))
+        pairs.extend(zip(olds, news))
+        unmatched_old.extend(olds[len(news):])
+        unmatched_new.extend(news[len(olds):])
+    for news in new_by_subject.values():
+        unmatched_new.extend(news)
+    return unmatched_old, unmatched_new
+
+def diff_events(previous: Dict[str, Event], current: Dict[str, Event]) -> DiffResult:
+    """Compare two event maps keyed by event ID
+
+    Events with the same ID are compared field by field (location/body edits keep the
+    ID). The remaining ones are paired by subject using progressively looser keys, so
+    repeated subjects such as recurring meetings each find their own counterpart.
+    Everything is dict/set based: linear in the number of events, plus a sort of the
+    few events still unmatched after the keyed passes. Exact ID matches are settled
+    in one pass first (the same object needs no comparing), and the pairing passes
+    only run when that pass leaves both vanished and new events behind.
+    """
+    modified: List[EventChange] = []
+    new_ids: List[str] = []
+    for event_id, event in current.items():
+        old = previous.get(event_id)
+        if old is None:
+            new_ids.append(event_id)
+        elif old is not event and not _same_fields(old, event):
+            fields = changed_fields(old, event)
+            if fields:
+                modified.append(EventChange(event_id, event_id, fields))
+
+    if len(current) - len(new_ids) == len(previous):
+        old_ids: List[str] = []  # Every previous event is still there
+    else:
+        old_ids = [event_id for event_id in previous if event_id not in current]
+    if not old_ids or not new_ids:
+        return DiffResult(new_ids, old_ids, modified)
+
+    pairs: List[Tuple[str, str]] = []
+    for key in MATCH_KEYS:
+        if not old_ids or not new_ids:
+            break
+        old_ids, new_ids = _pair_by_key(previous, current, old_ids, new_ids, key, pairs)
+    if old_ids and new_ids:
+        old_ids, new_ids = _pair_by_subject_rank(previous, current, old_ids, new_ids, pairs)
+
+    for old_id, new_id in pairs:
+        modified.append(EventChange(old_id, new_id, changed_fields(previous[old_id], current[new_id])))
+
+    return DiffResult(new_ids, old_ids, modified)
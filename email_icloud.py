@@ -1,12 +1,11 @@
+import atexit
 import os
 import socket
-from dotenv import load_dotenv
-import smtplib
-from email.message import EmailMessage
+from config import load_config
+from ics_packer import split_ics
 
 # Load environment variables
-load_dotenv()
-print("Loaded environment variables.")
+load_config()
 
 # Configuration from environment variables
 sender_email = os.getenv("ICLOUD_EMAIL")  # Use same email as authenticated account
@@ -25,54 +24,189 @@ smtp_port = int(os.getenv("SMTP_PORT", 465))
 smtp_timeout = int(os.getenv("SMTP_TIMEOUT", 30))
 smtp_user = os.getenv("ICLOUD_EMAIL")
 smtp_password = os.getenv("ICLOUD_APP_PASSWORD")
+smtp_security = os.getenv("SMTP_SECURITY", "ssl").lower()  # ssl, starttls or none (local test servers)
 
-print(f"Preparing to send email from {sender_email} to {receiver_email}")
-
-# Validate environment variables
-if not smtp_user or not smtp_password:
-    print("Error: ICLOUD_EMAIL or ICLOUD_APP_PASSWORD not set in .env file")
-    exit(1)
-
-# Check if ICS file exists
-if not os.path.exists(ics_path):
-    print(f"Error: ICS file not found at {ics_path}")
-    print("Please run csv_to_ics.py first to create the ICS file.")
-    exit(1)
-
-print("Opening ICS file...")
-
-# Create email message
-msg = EmailMessage()
-msg["From"] = sender_email
-msg["To"] = receiver_email
-msg["Subject"] = subject
-msg.set_content(body)
-
-# Attach ICS file
-with open(ics_path, "rb") as f:
-    print("ICS file attached.")
-    msg.add_attachment(f.read(), maintype="text", subtype="calendar", filename="outlook_calendar_export.ics")
-
-# Send email
-print(f"Connecting to SMTP server: {smtp_server}:{smtp_port}")
-try:
-    with smtplib.SMTP_SSL(smtp_server, smtp_port, timeout=smtp_timeout) as server:
-        print("Connected to SMTP server.")
-        print(f"Logging in as {smtp_user}...")
-        server.login(smtp_user, smtp_password)
-        print("Logged in successfully. Sending email...")
-        server.send_message(msg)
+# Largest ICS attachment per message; bigger calendars are split (0 = never split).
+# Base64 encoding adds a third on the wire, so 10MB stays under 20MB message limits.
+ics_part_max_bytes = int(os.getenv("ICS_PART_MAX_BYTES", 10_000_000))
+
+# Error category of the last failed send (None after a success), for run reports
+last_error = None
+
+class SMTPSession:
+    """One authenticated SMTP connection, reused for every message sent through it
+
+    Connects and logs in on the first send. When the server has dropped the
+    connection since (idle timeout, network change) the message is retried once on
+    a fresh connection; any other error goes to the caller.
+    """
+
+    def __init__(self, host=None, port=None, user=None, password=None, timeout=None, security=None):
+        self.host = host or smtp_server
+        self.port = port or smtp_port
+        self.user = user or smtp_user
+        self.password = password or smtp_password
+        self.timeout = timeout or smtp_timeout
+        self.security = (security or smtp_security).lower()
+        self.server = None
+        self.connects = 0
+        self.messages_sent = 0
+
+    def connect(self):
+        import smtplib  # Only runs that send mail pay for smtplib/ssl
+
+        self.close()
+        print(f"Connecting to SMTP server: {self.host}:{self.port}")
+        if self.security == "ssl":
+            server = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout)
+        else:
+            server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.security == "starttls":
+                server.starttls()
+            print(f"Logging in as {self.user}...")
+            server.login(self.user, self.password)
+        except Exception:
+            server.close()
+            raise
+        print("Logged in successfully.")
+        self.server = server
+        self.connects += 1
+
+    def send(self, msg):
+        import smtplib
+
+        if self.server is None:
+            self.connect()
+        try:
+            try:
+                self.server.send_message(msg)
+            except (smtplib.SMTPServerDisconnected, ConnectionError) as e:
+                print(f"SMTP connection lost ({e or 'closed by server'}), reconnecting...")
+                self.connect()
+                self.server.send_message(msg)
+            except smtplib.SMTPResponseException as e:
+                if e.smtp_code != 421:  # 421: server is closing this connection
+                    raise
+                print("SMTP server closed the session, reconnecting...")
+                self.connect()
+                self.server.send_message(msg)
+        except Exception:
+            self.discard()  # Unknown connection state; the next send starts fresh
+            raise
+        self.messages_sent += 1
+
+    def discard(self):
+        """Drop the connection without a QUIT round trip"""
+        if self.server is not None:
+            self.server.close()
+            self.server = None
+
+    def close(self):
+        if self.server is None:
+            return
+        server, self.server = self.server, None
+        try:
+            server.quit()
+        except Exception:
+            server.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+_session = None
+
+def get_session() -> SMTPSession:
+    """The process-wide session send_calendar_email uses unless given another"""
+    global _session
+    if _session is None:
+        _session = SMTPSession()
+        atexit.register(_session.close)
+    return _session
+
+def build_message(file_path, email_subject, email_body):
+    """An email (EmailMessage) to the iCloud account with the ICS file attached"""
+    from email.message import EmailMessage
+
+    msg = EmailMessage()
+    msg["From"] = sender_email
+    msg["To"] = receiver_email
+    msg["Subject"] = email_subject
+    msg.set_content(email_body)
+    with open(file_path, "rb") as f:
+        msg.add_attachment(f.read(), maintype="text", subtype="calendar",
+                           filename=os.path.basename(file_path))
+    return msg
+
+def send_calendar_email(file_path=None, email_subject=None, email_body=None, session=None):
+    """Email an ICS file to the iCloud account; returns True when the message was sent
+
+    Messages go over one pooled SMTPSession (get_session() unless session is given),
+    so a run's calendar and deletion files share a single TLS handshake and login.
+    Files over ICS_PART_MAX_BYTES are split into several calendars, one per message.
+    """
+    global last_error
+    last_error = None
+    file_path = file_path or ics_path
+    email_subject = email_subject or subject
+    email_body = email_body or body
+
+    print(f"Preparing to send email from {sender_email} to {receiver_email}")
+
+    # Validate environment variables
+    if not smtp_user or not smtp_password:
+        print("Error: ICLOUD_EMAIL or ICLOUD_APP_PASSWORD not set in .env file")
+        last_error = "config"
+        return False
+
+    # Check if ICS file exists
+    if not os.path.exists(file_path):
+        print(f"Error: ICS file not found at {file_path}")
+        print("Please run csv_to_ics.py first to create the ICS file.")
+        last_error = "missing_file"
+        return False
+
+    # Send email
+    import smtplib
+
+    session = session or get_session()
+    try:
+        # Large calendars go out as several messages, each under the size budget
+        parts = split_ics(file_path, ics_part_max_bytes) if ics_part_max_bytes else [file_path]
+        for index, part_path in enumerate(parts, 1):
+            part_subject = email_subject
+            if len(parts) > 1:
+                part_subject = f"{email_subject} (part {index} of {len(parts)})"
+            msg = build_message(part_path, part_subject, email_body)
+            print(f"Sending email {index} of {len(parts)}..." if len(parts) > 1 else "Sending email...")
+            session.send(msg)
         print("Email sent successfully!")
-        
-except socket.timeout:
-    print("Error: Connection timeout. Check your internet connection.")
-except ConnectionRefusedError:
-    print("Error: Connection refused. Check SMTP server and port.")
-except smtplib.SMTPAuthenticationError:
-    print("Error: Authentication failed. Check your iCloud email and app password.")
-except smtplib.SMTPException as e:
-    print(f"SMTP error: {e}")
-except Exception as e:
-    print(f"Unexpected error: {e}")
-
-print("Process completed.")
\ No newline at end of file
+        return True
+
+    except socket.timeout:
+        print("Error: Connection timeout. Check your internet connection.")
+        last_error = "timeout"
+    except ConnectionRefusedError:
+        print("Error: Connection refused. Check SMTP server and port.")
+        last_error = "connection"
+    except smtplib.SMTPAuthenticationError:
+        print("Error: Authentication failed. Check your iCloud email and app password.")
+        last_error = "auth"
+    except smtplib.SMTPException as e:
+        print(f"SMTP error: {e}")
+        last_error = "smtp"
+    except Exception as e:
+        print(f"Unexpected error: {e}")
+        last_error = "unexpected"
+
+    return False
+
+if __name__ == "__main__":
+    print("Loaded environment variables.")
+    sent = send_calendar_email()
+    print("Process completed.")
+    if not sent:
+        exit(1)
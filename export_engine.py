@@ -0,0 +1,430 @@
+import heapq
+from datetime import datetime, time, timedelta
+from calendar_event import Event
+from ics_writer import format_local_time
+
+OL_USER_ITEMS = 0  # OlTableContents.olUserItems
+OL_APPT_OCCURRENCE = 2  # OlRecurrenceState: an unmodified occurrence of a series
+
+# OlRecurrenceType values and the OlDaysOfWeek mask bits, Sunday (1) first
+OL_RECURS_DAILY, OL_RECURS_WEEKLY, OL_RECURS_MONTHLY, OL_RECURS_MONTH_NTH = 0, 1, 2, 3
+OL_RECURS_YEARLY, OL_RECURS_YEAR_NTH = 5, 6
+ICS_WEEKDAYS = ["SU", "MO", "TU", "WE", "TH", "FR", "SA"]
+
+# Columns requested from Folder.GetTable - only what we serialize, plus the EntryID
+# needed to fetch the Body (which a Table cannot return) from the item itself
+TABLE_COLUMNS = ["EntryID", "Subject", "Start", "End", "Location", "LastModificationTime"]
+
+def format_restrict_date(value: datetime) -> str:
+    """Format a datetime the way Items.Restrict / Folder.GetTable expect in Jet filters"""
+    return value.strftime("%m/%d/%Y %I:%M %p")
+
+def get_export_window(outlook_start: datetime, outlook_end: datetime):
+    """Widen a date range to whole days: [first day 00:00, day after last day 00:00)"""
+    window_start = datetime.combine(outlook_start.date(), time.min)
+    window_end = datetime.combine(outlook_end.date() + timedelta(days=1), time.min)
+    return window_start, window_end
+
+def build_restriction(window_start: datetime, window_end: datetime, recurring=None) -> str:
+    """Build the Jet filter selecting items that start inside the window"""
+    restriction = (f"[Start] >= '{format_restrict_date(window_start)}' "
+                   f"AND [Start] < '{format_restrict_date(window_end)}'")
+    if recurring is not None:
+        restriction += f" AND [IsRecurring] = {'True' if recurring else 'False'}"
+    return restriction
+
+def _naive(value):
+    """Drop tzinfo so COM datetimes compare with the naive export window"""
+    if isinstance(value, datetime) and value.tzinfo is not None:
+        return value.replace(tzinfo=None)
+    return value
+
+def _text(value):
+    """Render a COM value the same way csv.writer does"""
+    return "" if value is None else str(value)
+
+def _by_day(day_of_week_mask) -> str:
+    return ",".join(day for bit, day in enumerate(ICS_WEEKDAYS) if day_of_week_mask & (1 << bit))
+
+def build_rrule(pattern) -> str:
+    """Translate an Outlook RecurrencePattern into an RFC 5545 RRULE line"""
+    recurrence_type = pattern.RecurrenceType
+    interval = pattern.Interval or 1
+    if recurrence_type == OL_RECURS_DAILY:
+        parts = ["FREQ=DAILY"]
+    elif recurrence_type == OL_RECURS_WEEKLY:
+        parts = ["FREQ=WEEKLY", f"BYDAY={_by_day(pattern.DayOfWeekMask)}"]
+    elif recurrence_type == OL_RECURS_MONTHLY:
+        parts = ["FREQ=MONTHLY", f"BYMONTHDAY={pattern.DayOfMonth}"]
+    elif recurrence_type == OL_RECURS_MONTH_NTH:
+        parts = ["FREQ=MONTHLY", f"BYDAY={_by_day(pattern.DayOfWeekMask)}"]
+    elif recurrence_type in (OL_RECURS_YEARLY, OL_RECURS_YEAR_NTH):
+        parts = ["FREQ=YEARLY", f"BYMONTH={pattern.MonthOfYear}"]
+        parts.append(f"BYMONTHDAY={pattern.DayOfMonth}" if recurrence_type == OL_RECURS_YEARLY
+                     else f"BYDAY={_by_day(pattern.DayOfWeekMask)}")
+        if interval >= 12 and interval % 12 == 0:
+            interval //= 12  # Yearly intervals are counted in months
+    else:
+        raise ValueError(f"Unsupported recurrence type {recurrence_type}")
+    if recurrence_type in (OL_RECURS_MONTH_NTH, OL_RECURS_YEAR_NTH):
+        parts.append(f"BYSETPOS={-1 if pattern.Instance == 5 else pattern.Instance}")  # 5: last
+    if interval > 1:
+        parts.append(f"INTERVAL={interval}")
+    if not pattern.NoEndDate:
+        until = datetime.combine(_naive(pattern.PatternEndDate).date(), time(23, 59, 59))
+        parts.append(f"UNTIL={format_local_time(until)}")
+    return "RRULE:" + ";".join(parts)
+
+class OutlookExportEngine:
+    """Export one calendar folder using server-side filtering and column-only reads
+
+    Single appointments are read through Folder.GetTable with only the columns we
+    serialize. Recurring series need Items with IncludeRecurrences to expand their
+    occurrences, so they are read from a sorted, restricted Items collection that is
+    abandoned as soon as the stream passes the end of the window.
+
+    With recurrence="rrule", each series is instead read once, unexpanded, and
+    exported as a master event carrying its RRULE and EXDATEs, followed by an event
+    per modified occurrence. Series are few and cheap to read that way, so they are
+    not cached as events.
+
+    Body is the costliest property to fetch, so it is read at most once per item
+    version: bodies are remembered by item key and LastModificationTime, seeded from
+    the cache, and unmodified occurrences of a series share one. With a body limit of
+    0 (metadata only) it is never read.
+
+    With an ExportCache, items whose LastModificationTime matches the cached value are
+    taken from the cache instead of being re-read, and cache entries for items that
+    are no longer in the window are dropped. A `source` label is stamped on every
+    event and scopes the cache keys, so several folders can share one cache.
+    """
+
+    def __init__(self, folder, namespace=None, body_char_limit=500, cache=None, source="",
+                 recurrence="expand"):
+        if recurrence not in ("expand", "rrule"):
+            raise ValueError(f"Unknown recurrence mode {recurrence!r} (expected expand or rrule)")
+        self.folder = folder
+        self.namespace = namespace
+        self.body_char_limit = body_char_limit
+        self.cache = cache
+        self.source = source
+        self.recurrence = recurrence
+        self.key_prefix = f"{source}|" if source else ""
+        self.cached_items = {}
+        self.cache_updates = {}
+        self.seen_keys = set()
+        self.bodies = {}  # {(item key without source prefix, last_modified): cleaned body}
+        self.bodies_stale = False
+        self.stats = {'table_rows': 0, 'occurrences': 0, 'series': 0, 'body_reads': 0,
+                      'cache_hits': 0}
+
+    def _load_cache(self):
+        """Load this source's cache entries and the bodies they hold"""
+        self.cached_items = {key: cached for key, cached in self.cache.load().items()
+                             if key.startswith(self.key_prefix)}
+        # Bodies cut to another limit (or left out as metadata only) are no good to reuse
+        cached_limit = getattr(self.cache, 'body_limit', None)
+        self.bodies_stale = cached_limit is not None and cached_limit != self.body_char_limit
+        for key, (last_modified, event) in self.cached_items.items():
+            if self._body_usable(event):
+                self.bodies[(key[len(self.key_prefix):], last_modified)] = event.body
+
+    def _body_usable(self, event) -> bool:
+        return not self.bodies_stale and len(event.body or "") <= max(self.body_char_limit, 0)
+
+    def _cached_event(self, key, last_modified):
+        """Return the cached Event for an item key if it has not been modified since"""
+        self.seen_keys.add(key)
+        cached = self.cached_items.get(key)
+        if cached is not None and cached[0] == last_modified and self._body_usable(cached[1]):
+            self.stats['cache_hits'] += 1
+            event = cached[1]
+            event.source = self.source  # The cache stores fields only
+            return event
+        return None
+
+    def _remember(self, key, last_modified, event):
+        if self.cache is not None:
+            self.cache_updates[key] = (last_modified, event)
+
+    def clean_body(self, body) -> str:
+        """Truncate, then flatten, the body text the same way the CSV export always has"""
+        if not body or self.body_char_limit <= 0:
+            return ""
+        # Cut first so a large HTML/RTF-derived body is not copied whole by replace()
+        return str(body)[:self.body_char_limit].replace('\n', ' ').replace('\r', ' ')
+
+    def item_body(self, item, key=None, last_modified=None) -> str:
+        """Cleaned Body of item, read from Outlook only if this version's body is not known yet
+
+        `key` names whose body it is (by default the item's EntryID); `last_modified`
+        defaults to the item's LastModificationTime.
+        """
+        if self.body_char_limit <= 0:
+            return ""
+        if key is None:
+            key = item.EntryID
+        if last_modified is None:
+            last_modified = _text(item.LastModificationTime)
+        body = self.bodies.get((key, last_modified))
+        if body is None:
+            body = self.clean_body(getattr(item, 'Body', ''))
+            self.stats['body_reads'] += 1
+            self.bodies[(key, last_modified)] = body
+        return body
+
+    def read_body(self, entry_id, last_modified) -> str:
+        """Body of a single item by EntryID, fetching the item only when the body is not known"""
+        if self.body_char_limit <= 0 or self.namespace is None:
+            return ""
+        body = self.bodies.get((entry_id, last_modified))
+        if body is not None:
+            return body
+        try:
+            item = self.namespace.GetItemFromID(entry_id)
+        except Exception as e:
+            print(f"Could not read body for item {entry_id}: {e}")
+            return ""
+        return self.item_body(item, entry_id, last_modified)
+
+    def iter_single_events(self, window_start, window_end):
+        """Yield (start, event) for non-recurring appointments in the window from a column-only Table"""
+        table = self.folder.GetTable(build_restriction(window_start, window_end, recurring=False),
+                                     OL_USER_ITEMS)
+        table.Columns.RemoveAll()
+        for column in TABLE_COLUMNS:
+            table.Columns.Add(column)
+        table.Sort("[Start]", False)
+
+        while not table.EndOfTable:
+            row = table.GetNextRow()
+            if row is None:
+                break
+            entry_id, subject, start, end, location, last_modified = row.GetValues()
+            if _naive(start) >= window_end:
+                break
+            self.stats['table_rows'] += 1
+            last_modified = _text(last_modified)
+            key = self.key_prefix + entry_id
+            event = self._cached_event(key, last_modified)
+            if event is None:
+                event = Event(_text(subject), _text(start), _text(end),
+                              _text(location), self.read_body(entry_id, last_modified), self.source)
+                self._remember(key, last_modified, event)
+            yield _naive(start), event
+
+    def read_occurrence(self, item, start) -> Event:
+        """Build the Event for one expanded occurrence, from the cache when unchanged"""
+        key = last_modified = None
+        if self.cache is not None:
+            # Occurrences share the series EntryID, so the start tells them apart
+            key = f"{self.key_prefix}{item.EntryID}|{_text(start)}"
+            last_modified = _text(item.LastModificationTime)
+            event = self._cached_event(key, last_modified)
+            if event is not None:
+                return event
+        body = ""
+        if self.body_char_limit > 0:
+            # Unmodified occurrences all have the series' body; an exception may have its own
+            entry_id = item.EntryID
+            shared = getattr(item, 'RecurrenceState', OL_APPT_OCCURRENCE) == OL_APPT_OCCURRENCE
+            body = self.item_body(item, f"{entry_id}|*" if shared else f"{entry_id}|{_text(start)}",
+                                  last_modified)
+        event = Event(
+            _text(getattr(item, 'Subject', 'No Subject')),
+            _text(start),
+            _text(getattr(item, 'End', '')),
+            _text(getattr(item, 'Location', '')),
+            body,
+            self.source
+        )
+        self._remember(key, last_modified, event)
+        return event
+
+    def iter_recurring_events(self, window_start, window_end):
+        """Yield (start, event) for expanded occurrences of recurring series in the window"""
+        items = self.folder.Items
+        # Sort must be applied before IncludeRecurrences for Outlook to expand series
+        items.Sort("[Start]", False)
+        items.IncludeRecurrences = True
+        restricted = items.Restrict(build_restriction(window_start, window_end, recurring=True))
+
+        # Count is meaningless with IncludeRecurrences, so walk with GetFirst/GetNext and
+        # stop at the first occurrence past the window (unbounded series never end)
+        item = restricted.GetFirst()
+        while item is not None:
+            start = item.Start
+            if _naive(start) >= window_end:
+                break
+            if _naive(start) >= window_start:
+                self.stats['occurrences'] += 1
+                yield _naive(start), self.read_occurrence(item, start)
+            item = restricted.GetNext()
+
+    def series_body(self, item, key, last_modified) -> str:
+        """Body of a series master or exception, kept in the cache under a key of its own
+
+        These keys carry no event for the cache; they only let the next run skip the Body read.
+        """
+        body = self.item_body(item, key, last_modified)
+        if self.cache is not None and self.body_char_limit > 0:
+            cache_key = self.key_prefix + key
+            self.seen_keys.add(cache_key)
+            cached = self.cached_items.get(cache_key)
+            if cached is None or cached[0] != last_modified or cached[1].body != body:
+                self._remember(cache_key, last_modified, Event("", "", "", body=body))
+        return body
+
+    def read_series(self, item, pattern=None):
+        """Build the master Event of a series plus one Event per modified occurrence
+
+        Pass the series' RecurrencePattern when it is already at hand; each
+        GetRecurrencePattern() is another COM round trip.
+        """
+        if pattern is None:
+            pattern = item.GetRecurrencePattern()
+        rules = [build_rrule(pattern)]
+        occurrences = []
+        exdates = []
+        entry_id = item.EntryID
+        # Exceptions live inside the master, so its LastModificationTime covers them too
+        last_modified = _text(item.LastModificationTime) if self.body_char_limit > 0 else None
+        master = Event(_text(item.Subject), _text(item.Start), _text(item.End), _text(item.Location),
+                       self.series_body(item, f"{entry_id}|series", last_modified), self.source)
+        exceptions = pattern.Exceptions
+        for index in range(1, exceptions.Count + 1):
+            exception = exceptions.Item(index)
+            original = format_local_time(_naive(exception.OriginalDate))
+            if exception.Deleted:
+                exdates.append(original)
+                continue
+            occurrence = exception.AppointmentItem
+            occurrences.append(Event(
+                _text(occurrence.Subject), _text(occurrence.Start), _text(occurrence.End),
+                _text(occurrence.Location),
+                self.series_body(occurrence, f"{entry_id}|{original}", last_modified),
+                self.source, recurrence=f"RECURRENCE-ID:{original}", series=master.event_id))
+        if exdates:
+            rules.append("EXDATE:" + ",".join(sorted(exdates)))
+        master.recurrence = "\n".join(rules)
+        return master, occurrences
+
+    def iter_series_events(self, window_start, window_end):
+        """Yield (start, event) for each series reaching into the window, as master plus overrides
+
+        Masters sort by the start of their first occurrence, which may be before the window.
+        """
+        restricted = self.folder.Items.Restrict(
+            f"[IsRecurring] = True AND [Start] < '{format_restrict_date(window_end)}'")
+        pairs = []
+        for item in restricted:
+            pattern = item.GetRecurrencePattern()
+            if not pattern.NoEndDate and _naive(pattern.PatternEndDate) < window_start:
+                continue  # Ended before the window
+            try:
+                master, occurrences = self.read_series(item, pattern)
+            except ValueError as e:
+                print(f"Skipping series {item.EntryID}: {e}")
+                continue
+            self.stats['series'] += 1
+            pairs.append((_naive(item.Start), master))
+            pairs.extend((_naive(occurrence.start), occurrence) for occurrence in occurrences)
+        pairs.sort(key=lambda pair: pair[0] or datetime.min)
+        return iter(pairs)
+
+    def export(self, outlook_start: datetime, outlook_end: datetime, max_events=None):
+        """Return Events for items starting in the date range, oldest first"""
+        window_start, window_end = get_export_window(outlook_start, outlook_end)
+        print(f"Restriction filter: {build_restriction(window_start, window_end)}")
+        if self.cache is not None:
+            self._load_cache()
+            print(f"Incremental export: {len(self.cached_items)} cached items")
+
+        if self.recurrence == "rrule":
+            recurring = self.iter_series_events(window_start, window_end)
+        else:
+            recurring = self.iter_recurring_events(window_start, window_end)
+        merged = heapq.merge(
+            self.iter_single_events(window_start, window_end),
+            recurring,
+            key=lambda pair: pair[0]
+        )
+        events = []
+        for _, event in merged:
+            events.append(event)
+            if max_events is not None and len(events) >= max_events:
+                print(f"Reached {max_events} events limit...")
+                break
+
+        if self.cache is not None and (max_events is None or len(events) < max_events):
+            # Only a complete pass tells us which cached items disappeared
+            removed = self.cached_items.keys() - self.seen_keys
+            self.cache.save(self.cache_updates, removed, self.body_char_limit)
+            print(f"Export cache: {self.stats['cache_hits']} unchanged, "
+                  f"{len(self.cache_updates)} re-read, {len(removed)} removed")
+
+        recurring = (f"recurring series: {self.stats['series']}" if self.recurrence == "rrule"
+                     else f"recurring occurrences: {self.stats['occurrences']}")
+        print(f"Table rows: {self.stats['table_rows']}, {recurring}, "
+              f"body reads: {self.stats['body_reads']}")
+        return events
+
+    def export_items(self, entry_ids, outlook_start: datetime, outlook_end: datetime):
+        """Re-read only the given items and take every other event from the cache
+
+        Used when Outlook told us exactly which items were added or changed. Returns
+        None when that is not enough and a full export is needed: there is no cached
+        pass yet, or one of the items is a recurring series (its occurrences would
+        have to be re-expanded). In rrule mode series are simply all re-read.
+        """
+        if self.cache is None:
+            return None
+        window_start, window_end = get_export_window(outlook_start, outlook_end)
+        self._load_cache()
+        if not self.cached_items:
+            return None
+
+        touched = set(entry_ids)
+        removed = set()
+        fresh = {}
+        events = []
+        for key, (_, event) in self.cached_items.items():
+            entry_id, _, occurrence = key[len(self.key_prefix):].partition("|")
+            if occurrence and self.recurrence == "rrule":
+                continue  # Expanded by an earlier run; the next full export drops it
+            if entry_id in touched:
+                removed.add(key)
+                continue
+            start = _naive(event.start)
+            if start is not None and not window_start <= start < window_end:
+                continue  # Drifted out of the window; the next full export drops it
+            event.source = self.source
+            events.append(event)
+
+        for entry_id in touched:
+            try:
+                item = self.namespace.GetItemFromID(entry_id)
+            except Exception:
+                continue  # Deleted again before we got to it
+            if item.IsRecurring:
+                if self.recurrence == "rrule":
+                    continue  # Re-read with every other series below
+                print(f"Recurring series {entry_id} changed, full export needed")
+                return None
+            start = item.Start
+            if not window_start <= _naive(start) < window_end:
+                continue
+            last_modified = _text(item.LastModificationTime)
+            event = Event(_text(item.Subject), _text(start), _text(item.End), _text(item.Location),
+                          self.item_body(item, entry_id, last_modified), self.source)
+            fresh[self.key_prefix + entry_id] = (last_modified, event)
+
+        self.cache_updates.update(fresh)
+        events.extend(event for _, event in fresh.values())
+        if self.recurrence == "rrule":
+            events.extend(event for _, event in self.iter_series_events(window_start, window_end))
+        # After the series pass, so the series bodies it read are cached too
+        self.cache.save(self.cache_updates, removed - fresh.keys(), self.body_char_limit)
+        print(f"Targeted export: {len(touched)} items re-read, {len(events)} events in total")
+        events.sort(key=lambda event: _naive(event.start) or datetime.min)
+        return events
@@ -1,231 +1,352 @@
 import csv
-import win32com.client
+import heapq
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 import os
-from dotenv import load_dotenv
+from config import load_config
+from calendar_event import Event
+from export_engine import OutlookExportEngine
 
 # Load environment variables
-load_dotenv()
+load_config()
 
 # Get configuration from environment
 export_dir = os.getenv("EXPORT_DIRECTORY", r"C:\OutlookCalendarExports")
 csv_filename = os.getenv("CSV_FILENAME", "outlook_calendar_export.csv")
 export_days = int(os.getenv("EXPORT_DAYS", 30))
 body_char_limit = int(os.getenv("BODY_CHAR_LIMIT", 500))
+# "text" exports the first BODY_CHAR_LIMIT characters of each body, "none" metadata only
+body_mode = os.getenv("BODY_MODE", "text").lower()
+export_body_limit = 0 if body_mode == "none" else body_char_limit
 outlook_email = os.getenv("OUTLOOK_EMAIL", "")  # Specific mailbox to access
+export_engine = os.getenv("EXPORT_ENGINE", "table")  # "table" (GetTable/Restrict) or "items" (legacy walk)
+# Recurring series as expanded occurrences ("expand") or as RRULE masters ("rrule")
+export_recurrence = os.getenv("EXPORT_RECURRENCE", "expand").lower()
+export_incremental = os.getenv("EXPORT_INCREMENTAL", "true").lower() in ("1", "true", "yes")
+# Several calendars to publish together, comma-separated: "default", "mailbox" or "mailbox/Folder"
+outlook_sources = os.getenv("OUTLOOK_SOURCES", "")
+export_workers = int(os.getenv("EXPORT_WORKERS", 4))
 
-# Ensure export directory exists
-os.makedirs(export_dir, exist_ok=True)
-export_path = os.path.join(export_dir, csv_filename)
+CSV_HEADER = ["Subject", "Start", "End", "Location", "Body", "Source", "Recurrence", "Series"]
 
-# Configure date range: 2 weeks in the past, 12 weeks into the future
-outlook_start = datetime.now() - timedelta(weeks=2)
-outlook_end = datetime.now() + timedelta(weeks=12)
+def get_export_path():
+    """Return the CSV export path, creating the export directory if needed"""
+    os.makedirs(export_dir, exist_ok=True)
+    return os.path.join(export_dir, csv_filename)
 
-# Connect to Outlook
-print("Connecting to Outlook...")
-outlook = win32com.client.Dispatch("Outlook.Application")
-namespace = outlook.GetNamespace("MAPI")
+def get_date_range():
+    """Configure date range: 2 weeks in the past, 12 weeks into the future"""
+    now = datetime.now()
+    return now - timedelta(weeks=2), now + timedelta(weeks=12)
 
-# Access specific mailbox if configured, otherwise use default
-if outlook_email:
-    print(f"Accessing mailbox: {outlook_email}")
+def connect_outlook():
+    """Connect to Outlook and return the MAPI namespace"""
+    import win32com.client
+
+    print("Connecting to Outlook...")
+    outlook = win32com.client.Dispatch("Outlook.Application")
+    return outlook.GetNamespace("MAPI")
+
+def get_calendar_items(namespace, mailbox_email=""):
+    """Return the Items collection of the calendar to export"""
+    return get_calendar_folder(namespace, mailbox_email).Items
+
+def get_calendar_folder(namespace, mailbox_email=""):
+    """Return the calendar folder to export"""
+    # Access specific mailbox if configured, otherwise use default
+    if not mailbox_email:
+        print("Using default calendar")
+        return namespace.GetDefaultFolder(9)
+
+    print(f"Accessing mailbox: {mailbox_email}")
     try:
         # Try to get the specific mailbox
-        recipient = namespace.CreateRecipient(outlook_email)
+        recipient = namespace.CreateRecipient(mailbox_email)
         recipient.Resolve()
-        if recipient.Resolved:
-            # Get the main calendar folder (not birthday calendar)
-            mailbox = namespace.GetSharedDefaultFolder(recipient, 9)  # 9 = Calendar folder
-            print(f"Successfully accessed {outlook_email} main calendar")
-            
-            # List available calendar folders and find the work calendar
-            print("Available calendar folders:")
-            work_calendar = None
-            try:
-                # Get the mailbox store
-                store = mailbox.Parent
-                print(f"Store name: {store.Name}")
-                
-                # Look for all calendar folders in this mailbox
-                folders = store.Folders
-                for folder in folders:
-                    if folder.Name == "Calendar":  # This is the Calendar top-level folder
-                        print(f"Found Calendar folder with subfolders:")
-                        if hasattr(folder, 'Folders'):
-                            for subfolder in folder.Folders:
-                                if subfolder.DefaultItemType == 1:  # Calendar items
-                                    print(f"  - Calendar: {subfolder.Name} ({subfolder.Items.Count} items)")
-                        
-                        # Use the main Calendar folder itself (not subfolders)
-                        # This should be Peter Kenny's primary calendar
-                        work_calendar = folder.Items
-                        print(f"  >> Using main calendar folder for Peter Kenny")
-                        
-                        # Verify we're getting reasonable results by checking item count
-                        item_count = work_calendar.Count
-                        print(f"  >> Calendar contains {item_count} total items")
-                        
-                        # If the main calendar seems empty or problematic, 
-                        # we could add fallback logic here in the future
-                        break
-                
-                # Use work calendar if found, otherwise fall back to default
-                if work_calendar:
-                    calendar = work_calendar
-                else:
-                    print("Main calendar not found, using default calendar")
-                    calendar = mailbox.Items
-                            
-            except Exception as e:
-                print(f"Could not list folders: {e}")
-                calendar = mailbox.Items
-                
-        else:
-            print(f"Could not resolve {outlook_email}, falling back to default calendar")
-            calendar = namespace.GetDefaultFolder(9).Items
+        if not recipient.Resolved:
+            print(f"Could not resolve {mailbox_email}, falling back to default calendar")
+            return namespace.GetDefaultFolder(9)
+
+        # Get the main calendar folder (not birthday calendar)
+        mailbox = namespace.GetSharedDefaultFolder(recipient, 9)  # 9 = Calendar folder
+        print(f"Successfully accessed {mailbox_email} main calendar")
+
+        # List available calendar folders and find the work calendar
+        print("Available calendar folders:")
+        work_calendar = None
+        try:
+            # Get the mailbox store
+            store = mailbox.Parent
+            print(f"Store name: {store.Name}")
+
+            # Look for all calendar folders in this mailbox
+            folders = store.Folders
+            for folder in folders:
+                if folder.Name == "Calendar":  # This is the Calendar top-level folder
+                    print(f"Found Calendar folder with subfolders:")
+                    if hasattr(folder, 'Folders'):
+                        for subfolder in folder.Folders:
+                            if subfolder.DefaultItemType == 1:  # Calendar items
+                                print(f"  - Calendar: {subfolder.Name} ({subfolder.Items.Count} items)")
+
+                    # Use the main Calendar folder itself (not subfolders)
+                    # This should be Peter Kenny's primary calendar
+                    work_calendar = folder
+                    print(f"  >> Using main calendar folder for Peter Kenny")
+
+                    # Verify we're getting reasonable results by checking item count
+                    item_count = work_calendar.Items.Count
+                    print(f"  >> Calendar contains {item_count} total items")
+
+                    # If the main calendar seems empty or problematic,
+                    # we could add fallback logic here in the future
+                    break
+
+            # Use work calendar if found, otherwise fall back to default
+            if work_calendar:
+                return work_calendar
+            print("Main calendar not found, using default calendar")
+            return mailbox
+
+        except Exception as e:
+            print(f"Could not list folders: {e}")
+            return mailbox
+
     except Exception as e:
-        print(f"Error accessing {outlook_email}: {e}")
+        print(f"Error accessing {mailbox_email}: {e}")
         print("Falling back to default calendar")
-        calendar = namespace.GetDefaultFolder(9).Items
-else:
-    print("Using default calendar")
-    calendar = namespace.GetDefaultFolder(9).Items
-
-calendar.IncludeRecurrences = True
-calendar.Sort("[Start]", True)  # True for descending (newest first)
-
-# Check total items in calendar first
-total_items = calendar.Count
-print(f"Total items in calendar: {total_items}")
-
-# Apply date restriction to get current events only
-print(f"Applying date filter: {outlook_start.strftime('%Y-%m-%d')} to {outlook_end.strftime('%Y-%m-%d')}")
-
-# Create a restriction to filter events by date range - try different format
-start_date_str = outlook_start.strftime('%m/%d/%Y')
-end_date_str = outlook_end.strftime('%m/%d/%Y')
-restriction = f"[Start] >= '{start_date_str}' AND [Start] < '{end_date_str}'"
-print(f"Restriction filter: {restriction}")
-
-try:
-    # Apply the restriction
-    filtered_items = calendar.Restrict(restriction)
-    filtered_count = filtered_items.Count
-    print(f"Filtered items count: {filtered_count}")
-    
-    # If restriction doesn't work properly, let's manually filter first few items
-    if filtered_count == 0 or filtered_count > 10000:  # Unreasonable number
-        print("Restriction filter may not be working, trying manual approach...")
-        print("Checking first 10 items in calendar:")
-        item_count = 0
-        for item in calendar:
-            if item_count >= 10:
-                break
-            try:
-                print(f"  {item.Subject} - {item.Start} - Type: {type(item.Start)}")
-                item_count += 1
-            except Exception as e:
-                print(f"  Error reading item: {e}")
-                item_count += 1
-    
-    # Export to CSV with restricted items
-    with open(export_path, "w", newline='', encoding="utf-8") as csvfile:
-        writer = csv.writer(csvfile)
-        writer.writerow(["Subject", "Start", "End", "Location", "Body"])
-        exported_count = 0
-        
-        # Use filtered items if reasonable, otherwise manual filter
-        items_to_process = calendar  # Always use manual filter since restriction isn't working
-        
-        for item in items_to_process:
-            try:
-                # Manual date check - only get current events
-                item_start = item.Start
-                
-                # Convert to Python datetime for comparison
-                if hasattr(item_start, 'date'):
-                    item_date = item_start.date()
-                elif isinstance(item_start, str):
-                    item_date = datetime.strptime(item_start.split(' ')[0], '%Y-%m-%d').date()
-                else:
-                    item_date = item_start.date()
-                
-                # Only process events in our target date range (current month)
-                if not (outlook_start.date() <= item_date <= outlook_end.date()):
-                    continue
-                
-                print(f"Processing: {getattr(item, 'Subject', 'No Subject')} - {item.Start}")
-                
-                # Get event details with better error handling
-                subject = getattr(item, 'Subject', 'No Subject')
-                start_time = item.Start
-                end_time = getattr(item, 'End', '')
-                location = getattr(item, 'Location', '')
-                body = getattr(item, 'Body', '')
-                
-                # Clean up body text
-                if body:
-                    body = str(body).replace('\n', ' ').replace('\r', ' ')[:body_char_limit]
-                
-                writer.writerow([
-                    subject,
-                    start_time,
-                    end_time,
-                    location,
-                    body
-                ])
-                exported_count += 1
-                
-                # No limit - get all events in the date range
-                if exported_count >= 100:  # Safety limit
-                    print("Reached 100 events limit...")
-                    break
-                    
-            except Exception as e:
-                print(f"Skipping an item due to error: {e}")
+        return namespace.GetDefaultFolder(9)
+
+def parse_sources(spec):
+    """Split an OUTLOOK_SOURCES value into source labels"""
+    return [source.strip() for source in spec.split(",") if source.strip()]
+
+def get_source_folder(namespace, source):
+    """Resolve a source label ("default", "mailbox" or "mailbox/Folder") to a calendar folder"""
+    mailbox, _, folder_name = source.partition("/")
+    if mailbox.lower() == "default":
+        mailbox = ""
+    calendar = get_calendar_folder(namespace, mailbox)
+    if not folder_name:
+        return calendar
+    for folder in calendar.Folders:
+        if folder.Name == folder_name:
+            return folder
+    raise ValueError(f"Calendar folder '{folder_name}' not found in {mailbox or 'default mailbox'}")
+
+@contextmanager
+def com_apartment():
+    """Give the calling thread its own COM apartment (no-op where pywin32 is absent)"""
+    try:
+        import pythoncom
+    except ImportError:
+        yield
+        return
+    pythoncom.CoInitialize()
+    try:
+        yield
+    finally:
+        pythoncom.CoUninitialize()
+
+class _SourceCache:
+    """One worker's view of the ExportCache: reads a preloaded copy, defers writes
+
+    SQLite connections can't cross threads, so the main thread loads the cache once
+    and writes back what every worker collected.
+    """
+
+    def __init__(self, items, body_limit=None):
+        self.items = items
+        self.body_limit = body_limit
+        self.updates = {}
+        self.removed = []
+
+    def load(self):
+        return self.items
+
+    def save(self, updates, removed_keys, body_limit=None):
+        self.updates = updates
+        self.removed = list(removed_keys)
+
+def export_source(source, outlook_start, outlook_end, namespace_factory=None, cache=None):
+    """Export one source calendar on the calling thread; every event is tagged with the source
+
+    COM objects belong to the apartment that created them, so each call connects to
+    Outlook itself instead of sharing the caller's namespace.
+    """
+    with com_apartment():
+        namespace = (namespace_factory or connect_outlook)()
+        folder = get_source_folder(namespace, source)
+        if export_engine == "items":
+            events = read_calendar_events(folder.Items, outlook_start, outlook_end)
+            for event in events:
+                event.source = source
+            return events
+        engine = OutlookExportEngine(folder, namespace, export_body_limit, cache=cache, source=source,
+                                     recurrence=export_recurrence)
+        return engine.export(outlook_start, outlook_end)
+
+def _start_key(event):
+    if event.start is None:
+        return (1, datetime.min)
+    return (0, event.start.replace(tzinfo=None))
+
+def export_sources(sources, outlook_start, outlook_end, namespace_factory=None, cache=None):
+    """Export several calendars concurrently and merge them into one start-ordered list"""
+    from concurrent.futures import ThreadPoolExecutor  # Only multi-calendar runs need threads
+
+    cached_items = cache.load() if cache is not None else None
+    views = {source: _SourceCache(cached_items, cache.body_limit) if cache is not None else None
+             for source in sources}
+
+    print(f"Exporting {len(sources)} calendars with {min(export_workers, len(sources))} workers")
+    with ThreadPoolExecutor(max_workers=max(1, min(export_workers, len(sources)))) as pool:
+        futures = {
+            source: pool.submit(export_source, source, outlook_start, outlook_end,
+                                namespace_factory, views[source])
+            for source in sources
+        }
+    results, failed = [], []
+    for source, future in futures.items():
+        try:
+            events = future.result()
+            print(f"  {source}: {len(events)} events")
+            results.append(events)
+        except Exception as e:
+            print(f"  {source}: export failed: {e}")
+            failed.append(source)
+
+    if cache is not None:
+        updates, removed = {}, []
+        for view in views.values():
+            updates.update(view.updates)
+            removed.extend(view.removed)
+        cache.save(updates, removed, export_body_limit)
+    if failed:
+        # A missing calendar would look like every one of its events was deleted
+        raise RuntimeError(f"Export failed for: {', '.join(failed)}")
+    return list(heapq.merge(*results, key=_start_key))
+
+def _item_date(item_start):
+    """Convert an Outlook start value to a Python date for comparison"""
+    if hasattr(item_start, 'date'):
+        return item_start.date()
+    if isinstance(item_start, str):
+        return datetime.strptime(item_start.split(' ')[0], '%Y-%m-%d').date()
+    return item_start.date()
+
+def _text(value):
+    """Render a COM value the same way csv.writer does"""
+    return "" if value is None else str(value)
+
+def read_calendar_events(calendar, outlook_start, outlook_end, max_events=100):
+    """Read events in the date range from an Items collection"""
+    calendar.IncludeRecurrences = True
+    calendar.Sort("[Start]", True)  # True for descending (newest first)
+
+    # Check total items in calendar first
+    print(f"Total items in calendar: {calendar.Count}")
+    print(f"Applying date filter: {outlook_start.strftime('%Y-%m-%d')} to {outlook_end.strftime('%Y-%m-%d')}")
+
+    events = []
+    for item in calendar:
+        try:
+            # Manual date check - only get current events
+            item_date = _item_date(item.Start)
+
+            # Only process events in our target date range
+            if not (outlook_start.date() <= item_date <= outlook_end.date()):
                 continue
-                
-except Exception as e:
-    print(f"Error applying restriction: {e}")
-    # Fallback to manual filtering
+
+            print(f"Processing: {getattr(item, 'Subject', 'No Subject')} - {item.Start}")
+
+            # Get event details with better error handling; Body is costly, so only when exported
+            body = getattr(item, 'Body', '') if export_body_limit > 0 else ''
+
+            # Clean up body text, truncating before the copies replace() makes
+            if body:
+                body = str(body)[:export_body_limit].replace('\n', ' ').replace('\r', ' ')
+
+            events.append(Event(
+                _text(getattr(item, 'Subject', 'No Subject')),
+                _text(item.Start),
+                _text(getattr(item, 'End', '')),
+                _text(getattr(item, 'Location', '')),
+                _text(body)
+            ))
+
+            # No limit - get all events in the date range
+            if len(events) >= max_events:  # Safety limit
+                print(f"Reached {max_events} events limit...")
+                break
+
+        except Exception as e:
+            print(f"Skipping an item due to error: {e}")
+            continue
+
+    return events
+
+def write_events_csv(events, export_path):
+    """Write Events to the export file"""
     with open(export_path, "w", newline='', encoding="utf-8") as csvfile:
         writer = csv.writer(csvfile)
-        writer.writerow(["Subject", "Start", "End", "Location", "Body"])
-        exported_count = 0
-        print("Using manual date filtering...")
-        
-        for item in calendar:
-            try:
-                # Check if event starts within our date range
-                item_start = item.Start
-                if hasattr(item_start, 'date'):
-                    item_date = item_start.date()
-                else:
-                    # Handle different datetime formats
-                    if isinstance(item_start, str):
-                        item_date = datetime.strptime(item_start.split(' ')[0], '%Y-%m-%d').date()
-                    else:
-                        item_date = item_start.date()
-                
-                # Check if item is in our date range
-                if outlook_start.date() <= item_date <= outlook_end.date():
-                    print(f"Processing: {item.Subject} - {item.Start}")
-                    writer.writerow([
-                        item.Subject,
-                        item.Start,
-                        item.End,
-                        item.Location if hasattr(item, 'Location') else "",
-                        str(item.Body).replace('\n', ' ').replace('\r', ' ')[:body_char_limit] if hasattr(item, 'Body') else ""
-                    ])
-                    exported_count += 1
-                    
-                    # Limit for testing
-                    if exported_count >= 50:
-                        print("Reached 50 events limit for testing...")
-                        break
-                        
-            except Exception as e:
-                print(f"Skipping an item due to error: {e}")
-
-print(f"Export complete! Exported {exported_count} events to: {export_path}")
\ No newline at end of file
+        writer.writerow(CSV_HEADER)
+        for event in events:
+            writer.writerow(event.to_csv_row())
+
+def get_export_folders(namespace, mailbox_email=None, sources=None):
+    """Return the calendar folder(s) export_calendar reads, one per source"""
+    if sources is None:
+        sources = parse_sources(outlook_sources)
+    if sources:
+        return [get_source_folder(namespace, source) for source in sources]
+    return [get_calendar_folder(namespace, outlook_email if mailbox_email is None else mailbox_email)]
+
+def export_calendar(namespace=None, export_path=None, mailbox_email=None, cache=None,
+                    sources=None, namespace_factory=None, entry_ids=None):
+    """Export the configured calendar(s); returns the exported Events
+
+    The events are also written to the CSV export file so the standalone
+    conversion and debugging workflows keep working. Pass an ExportCache to
+    re-read only items modified since the previous export. Events of a calendar
+    named in OUTLOOK_SOURCES are tagged with that source, however many there are,
+    so their IDs don't change when a source is added or removed; with more than
+    one, each calendar is read on its own thread and namespace from namespace_factory.
+    With entry_ids (items Outlook reported as added or changed) only those items
+    are re-read and the rest comes from the cache, when that is possible.
+    """
+    if sources is None:
+        sources = parse_sources(outlook_sources)
+    if export_path is None:
+        export_path = get_export_path()
+    outlook_start, outlook_end = get_date_range()
+
+    if len(sources) > 1:
+        events = export_sources(sources, outlook_start, outlook_end, namespace_factory, cache)
+        write_events_csv(events, export_path)
+        print(f"Export complete! Exported {len(events)} events to: {export_path}")
+        return events
+
+    if namespace is None:
+        namespace = (namespace_factory or connect_outlook)()
+    folder = get_export_folders(namespace, mailbox_email, sources)[0]
+    source = sources[0] if sources else ""
+    if export_engine == "items":
+        events = read_calendar_events(folder.Items, outlook_start, outlook_end)
+        for event in events:
+            event.source = source
+    else:
+        engine = OutlookExportEngine(folder, namespace, export_body_limit, cache=cache, source=source,
+                                     recurrence=export_recurrence)
+        events = None
+        if entry_ids:
+            events = engine.export_items(entry_ids, outlook_start, outlook_end)
+        if events is None:
+            events = engine.export(outlook_start, outlook_end)
+
+    write_events_csv(events, export_path)
+    print(f"Export complete! Exported {len(events)} events to: {export_path}")
+    return events
+
+if __name__ == "__main__":
+    export_calendar()
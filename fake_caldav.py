@@ -0,0 +1,125 @@
+# Minimal local CalDAV collection standing in for iCloud or Radicale, so CalDAV
+# delivery can run without network access. It honours If-Match/If-None-Match like
+# a real server, and edit() changes a resource behind the client's back.
+import itertools
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class _CalDAVHandler(BaseHTTPRequestHandler):
+    """GET, PUT and DELETE of resources in one collection, over keep-alive connections"""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def reply(self, status, etag=None, body=b""):
+        self.send_response(status)
+        if etag:
+            self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def resource_name(self):
+        fake = self.server.fake
+        if not self.path.startswith(fake.path):
+            return None
+        return self.path[len(fake.path):]
+
+    def precondition_failed(self, current):
+        """True when the request's If-Match/If-None-Match does not hold for the current resource"""
+        if_match = self.headers.get("If-Match")
+        if_none_match = self.headers.get("If-None-Match")
+        if if_match is not None and (current is None or if_match not in ("*", current[0])):
+            return True
+        return if_none_match == "*" and current is not None
+
+    def do_GET(self):
+        current = self.server.fake._request("GET", self.resource_name())
+        if current is None:
+            self.reply(404)
+        else:
+            self.reply(200, *current)
+
+    def do_PUT(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        fake = self.server.fake
+        name = self.resource_name()
+        with fake._lock:
+            current = fake.resources.get(name)
+            if name is None or self.precondition_failed(current):
+                status, etag = 412, None
+            else:
+                etag = fake._next_etag()
+                fake.resources[name] = (etag, body)
+                status = 201 if current is None else 204
+            fake.requests.append(("PUT", name, status))
+        self.reply(status, etag)
+
+    def do_DELETE(self):
+        fake = self.server.fake
+        name = self.resource_name()
+        with fake._lock:
+            current = fake.resources.get(name)
+            if current is None:
+                status = 404
+            elif self.precondition_failed(current):
+                status = 412
+            else:
+                del fake.resources[name]
+                status = 204
+            fake.requests.append(("DELETE", name, status))
+        self.reply(status)
+
+class FakeCalDAVServer:
+    """Plain-HTTP calendar collection on localhost keeping resources in memory
+
+    `resources` maps a resource name to (etag, body); `requests` records every
+    (method, name, status). Use as a context manager, or start()/stop().
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, path="/calendars/user/work/"):
+        self.path = path
+        self.resources = {}
+        self.requests = []
+        self._etags = itertools.count(1)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), _CalDAVHandler)
+        self._server.daemon_threads = True
+        self._server.fake = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}{self.path}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def edit(self, name, body):
+        """Change a resource on the server side, as another calendar client would"""
+        with self._lock:
+            self.resources[name] = (self._next_etag(), body)
+
+    def _next_etag(self):
+        return f'"{next(self._etags)}"'
+
+    def _request(self, method, name):
+        with self._lock:
+            current = self.resources.get(name)
+            self.requests.append((method, name, 200 if current else 404))
+            return current
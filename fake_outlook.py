@@ -0,0 +1,370 @@
+# In-memory stand-in for the Outlook COM object model, so the export code can run
+# without Outlook (Linux, CI, benchmarks). Property reads are counted so callers can
+# see how many COM round-trips an export costs.
+import re
+from datetime import datetime, timedelta
+
+MAX_COM_COUNT = 2147483647  # What Items.Count reports once IncludeRecurrences is on
+
+_CLAUSE = re.compile(r"\[(\w+)\]\s*(>=|<=|<>|=|<|>)\s*(?:'([^']*)'|(\w+))")
+
+def _parse_value(quoted, bare):
+    if quoted is not None:
+        return datetime.strptime(quoted, "%m/%d/%Y %I:%M %p")
+    return {'true': True, 'false': False}.get(bare.lower(), bare)
+
+def parse_restriction(restriction):
+    """Parse a Jet filter of AND-ed "[Field] op value" clauses into a predicate"""
+    clauses = []
+    for part in re.split(r"\s+AND\s+", restriction.strip(), flags=re.IGNORECASE):
+        match = _CLAUSE.fullmatch(part.strip())
+        if not match:
+            raise ValueError(f"Unsupported restriction clause: {part}")
+        field, op, quoted, bare = match.groups()
+        clauses.append((field, op, _parse_value(quoted, bare)))
+
+    compare = {
+        '=': lambda a, b: a == b, '<>': lambda a, b: a != b,
+        '<': lambda a, b: a < b, '<=': lambda a, b: a <= b,
+        '>': lambda a, b: a > b, '>=': lambda a, b: a >= b,
+    }
+
+    def predicate(item):
+        return all(compare[op](item.get_property(field), value) for field, op, value in clauses)
+    return predicate
+
+class ComCounter:
+    """Tally of simulated COM property reads"""
+
+    def __init__(self):
+        self.property_reads = 0
+        self.pattern_reads = 0  # GetRecurrencePattern() calls
+
+class FakeException:
+    """One entry of RecurrencePattern.Exceptions: a deleted or a modified occurrence"""
+
+    def __init__(self, original_date, appointment=None):
+        self.OriginalDate = original_date
+        self.Deleted = appointment is None
+        self._appointment = appointment
+
+    @property
+    def AppointmentItem(self):
+        if self.Deleted:
+            raise AttributeError("A deleted occurrence has no AppointmentItem")
+        return self._appointment
+
+class FakeExceptions(list):
+    """RecurrencePattern.Exceptions; Item() is 1-based like COM collections"""
+
+    @property
+    def Count(self):
+        return len(self)
+
+    def Item(self, index):
+        return self[index - 1]
+
+class FakeRecurrencePattern:
+    """RecurrencePattern of a series: olRecursWeekly (1) by default, never ending"""
+
+    def __init__(self, recurrence_type=1, interval=1, day_of_week_mask=0, day_of_month=0,
+                 instance=0, month_of_year=0, pattern_start=None, pattern_end=None):
+        self.RecurrenceType = recurrence_type
+        self.Interval = interval
+        self.DayOfWeekMask = day_of_week_mask
+        self.DayOfMonth = day_of_month
+        self.Instance = instance
+        self.MonthOfYear = month_of_year
+        self.PatternStartDate = pattern_start
+        self.NoEndDate = pattern_end is None
+        self.PatternEndDate = pattern_end or datetime(4501, 1, 1)  # What Outlook reports
+        self.Exceptions = FakeExceptions()
+
+class FakeAppointment:
+    """An AppointmentItem; recurring masters carry the start of every occurrence"""
+
+    _FIELDS = ('EntryID', 'Subject', 'Start', 'End', 'Location', 'Body', 'IsRecurring',
+               'LastModificationTime', 'RecurrenceState')
+
+    def __init__(self, subject, start, end, location="", body="", entry_id=None,
+                 occurrences=None, counter=None, is_recurring=None, last_modified=None,
+                 pattern=None):
+        self._values = {
+            'EntryID': entry_id,
+            'Subject': subject,
+            'Start': start,
+            'End': end,
+            'Location': location,
+            'Body': body,
+            'IsRecurring': bool(occurrences) if is_recurring is None else is_recurring,
+            'LastModificationTime': last_modified or datetime(2000, 1, 1),
+        }
+        # OlRecurrenceState: 0 single, 1 master; expand() marks occurrences 2 and exceptions 3
+        self._values['RecurrenceState'] = 1 if self._values['IsRecurring'] else 0
+        self.occurrences = list(occurrences or [])
+        self._pattern = pattern
+        self._counter = counter
+
+    def get_property(self, name):
+        """Read a property without counting it as a COM round-trip"""
+        return self._values[name]
+
+    def modify(self, **values):
+        """Change properties the way a user edit would, bumping LastModificationTime"""
+        self._values.update(values)
+        self._values['LastModificationTime'] = datetime.now()
+
+    def GetRecurrencePattern(self):
+        if self._pattern is None:
+            raise AttributeError("Not a recurring appointment")
+        if self._counter is not None:
+            self._counter.pattern_reads += 1
+        return self._pattern
+
+    def except_occurrence(self, original_start, **values):
+        """Delete one occurrence of the series, or with values, modify just that one"""
+        appointment = None
+        if values:
+            duration = self._values['End'] - self._values['Start']
+            start = values.pop('Start', original_start)
+            appointment = FakeAppointment(
+                values.pop('Subject', self._values['Subject']), start,
+                values.pop('End', start + duration), values.pop('Location', self._values['Location']),
+                values.pop('Body', self._values['Body']), entry_id=self._values['EntryID'],
+                counter=self._counter, is_recurring=True)
+            appointment._values['RecurrenceState'] = 3
+        self._pattern.Exceptions.append(FakeException(original_start, appointment))
+        self._values['LastModificationTime'] = datetime.now()
+
+    def __getattr__(self, name):
+        if name.startswith('_') or name not in self._FIELDS:
+            raise AttributeError(name)
+        if self._counter is not None:
+            self._counter.property_reads += 1
+        return self._values[name]
+
+    def expand(self):
+        """Return one appointment per occurrence (or self when not recurring)"""
+        if not self.occurrences:
+            return [self]
+        duration = self._values['End'] - self._values['Start']
+        exceptions = {exception.OriginalDate: exception
+                      for exception in (self._pattern.Exceptions if self._pattern else ())}
+        expanded = []
+        for start in self.occurrences:
+            exception = exceptions.get(start)
+            if exception is None:
+                occurrence = FakeAppointment(
+                    self._values['Subject'], start, start + duration,
+                    self._values['Location'], self._values['Body'],
+                    entry_id=self._values['EntryID'], counter=self._counter, is_recurring=True,
+                    last_modified=self._values['LastModificationTime'])
+                occurrence._values['RecurrenceState'] = 2
+                expanded.append(occurrence)
+            elif not exception.Deleted:
+                expanded.append(exception.AppointmentItem)
+        return expanded
+
+class FakeItems:
+    """Items collection supporting Sort, IncludeRecurrences, Restrict and GetFirst/GetNext"""
+
+    def __init__(self, appointments):
+        self._appointments = list(appointments)
+        self._sort_key = None
+        self._descending = False
+        self.IncludeRecurrences = False
+        self._cursor = None
+
+    def _materialize(self):
+        items = self._appointments
+        if self.IncludeRecurrences:
+            items = [occurrence for item in items for occurrence in item.expand()]
+        if self._sort_key:
+            items = sorted(items, key=lambda item: item.get_property(self._sort_key),
+                           reverse=self._descending)
+        return items
+
+    @property
+    def Count(self):
+        if self.IncludeRecurrences:
+            return MAX_COM_COUNT
+        return len(self._appointments)
+
+    def Sort(self, key, descending=False):
+        self._sort_key = key.strip('[]')
+        self._descending = descending
+
+    def Restrict(self, restriction):
+        predicate = parse_restriction(restriction)
+        restricted = FakeItems(item for item in self._materialize() if predicate(item))
+        return restricted
+
+    def GetFirst(self):
+        self._cursor = iter(self._materialize())
+        return next(self._cursor, None)
+
+    def GetNext(self):
+        if self._cursor is None:
+            return self.GetFirst()
+        return next(self._cursor, None)
+
+    def __iter__(self):
+        return iter(self._materialize())
+
+class FakeRow:
+    def __init__(self, values):
+        self._values = values
+
+    def GetValues(self):
+        return tuple(self._values)
+
+class FakeColumns:
+    def __init__(self, names):
+        self.names = list(names)
+
+    def RemoveAll(self):
+        self.names = []
+
+    def Add(self, name):
+        self.names.append(name)
+
+class FakeTable:
+    """Folder.GetTable result: filtered, column-only rows of non-expanded items"""
+
+    def __init__(self, appointments):
+        self._appointments = list(appointments)
+        self.Columns = FakeColumns(['EntryID', 'Subject', 'Start', 'End'])
+        self._position = 0
+
+    def Sort(self, key, descending=False):
+        key = key.strip('[]')
+        self._appointments.sort(key=lambda item: item.get_property(key), reverse=descending)
+
+    @property
+    def EndOfTable(self):
+        return self._position >= len(self._appointments)
+
+    def GetNextRow(self):
+        if self.EndOfTable:
+            return None
+        item = self._appointments[self._position]
+        self._position += 1
+        return FakeRow([item.get_property(name) for name in self.Columns.names])
+
+class FakeFolder:
+    def __init__(self, name="Calendar", appointments=(), folders=(), default_item_type=1):
+        self.Name = name
+        self.DefaultItemType = default_item_type
+        self.Folders = list(folders)
+        self.Parent = None
+        self._appointments = list(appointments)
+        self._handlers = []
+        for folder in self.Folders:
+            folder.Parent = self
+
+    @property
+    def Items(self):
+        # Outlook hands out a fresh Items object on every access
+        return FakeItems(self._appointments)
+
+    def GetTable(self, restriction="", table_contents=0):
+        appointments = self._appointments
+        if restriction:
+            predicate = parse_restriction(restriction)
+            appointments = [item for item in appointments if predicate(item)]
+        return FakeTable(appointments)
+
+    def subscribe(self, handler):
+        """Deliver Items events to handler, like DispatchWithEvents on folder.Items"""
+        self._handlers.append(handler)
+
+    def add(self, appointment):
+        self._appointments.append(appointment)
+        for handler in self._handlers:
+            handler.OnItemAdd(appointment)
+
+    def change(self, appointment, **values):
+        appointment.modify(**values)
+        for handler in self._handlers:
+            handler.OnItemChange(appointment)
+
+    def remove(self, appointment):
+        self._appointments.remove(appointment)
+        for handler in self._handlers:
+            handler.OnItemRemove()  # Outlook doesn't say which item went
+
+class FakeRecipient:
+    def __init__(self, address, resolved=True):
+        self.Address = address
+        self.Resolved = False
+        self._resolvable = resolved
+
+    def Resolve(self):
+        self.Resolved = self._resolvable
+        return self.Resolved
+
+class FakeNamespace:
+    """MAPI namespace exposing a default calendar plus optional shared mailboxes"""
+
+    def __init__(self, calendar=None, shared_calendars=None):
+        self.calendar = calendar or FakeFolder()
+        self.shared_calendars = dict(shared_calendars or {})
+        self.inbox = FakeFolder("Inbox", default_item_type=0)
+        self._by_entry_id = {}
+
+    def GetDefaultFolder(self, folder_type):
+        return self.calendar if folder_type == 9 else self.inbox
+
+    def CreateRecipient(self, address):
+        return FakeRecipient(address, resolved=address in self.shared_calendars)
+
+    def GetSharedDefaultFolder(self, recipient, folder_type):
+        return self.shared_calendars[recipient.Address]
+
+    def _folders(self):
+        yield self.calendar
+        yield from self.shared_calendars.values()
+
+    def GetItemFromID(self, entry_id):
+        if entry_id not in self._by_entry_id:
+            self._by_entry_id = {
+                item.get_property('EntryID'): item
+                for folder in self._folders() for item in folder._appointments
+            }
+        return self._by_entry_id[entry_id]
+
+class FakeOutlookApplication:
+    def __init__(self, namespace=None):
+        self.namespace = namespace or FakeNamespace()
+
+    def GetNamespace(self, name):
+        return self.namespace
+
+def build_sample_namespace(single_events=50, recurring_series=5, days=120, history_years=3,
+                           start=None):
+    """Build a namespace holding a calendar with history, singles and weekly series"""
+    start = start or datetime.now().replace(minute=0, second=0, microsecond=0)
+    counter = ComCounter()
+    appointments = []
+    first = start - timedelta(days=365 * history_years)
+    span_days = 365 * history_years + days
+    total = max(single_events, 1)
+    for index in range(single_events):
+        begin = first + timedelta(days=index * span_days // total, hours=9 + index % 8)
+        appointments.append(FakeAppointment(
+            f"Meeting {index}", begin, begin + timedelta(hours=1), f"Room {index % 10}",
+            f"Agenda for meeting {index}\r\nDetails follow.", entry_id=f"S{index:08d}",
+            counter=counter))
+    for index in range(recurring_series):
+        begin = first + timedelta(days=index, hours=10)
+        occurrences = [begin + timedelta(weeks=week) for week in range(span_days // 7)]
+        pattern = FakeRecurrencePattern(
+            day_of_week_mask=1 << (begin.isoweekday() % 7), pattern_start=begin.replace(hour=0),
+            pattern_end=occurrences[-1].replace(hour=0) if occurrences else None)
+        appointments.append(FakeAppointment(
+            f"Weekly sync {index}", begin, begin + timedelta(minutes=30), "Online",
+            "Standing agenda", entry_id=f"R{index:08d}", occurrences=occurrences,
+            counter=counter, pattern=pattern))
+    namespace = FakeNamespace(FakeFolder("Calendar", appointments))
+    namespace.counter = counter
+    return namespace
@@ -0,0 +1,149 @@
+# Minimal local SMTP server standing in for iCloud, so delivery can run without
+# network access or real credentials (use SMTP_SECURITY=none). Connections and
+# logins are counted so callers can see how many handshakes a run costs.
+import base64
+import socketserver
+import threading
+from email import message_from_bytes, policy
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    """Speaks just enough SMTP for smtplib: EHLO, AUTH PLAIN, MAIL, RCPT, DATA, QUIT"""
+
+    def reply(self, line):
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self):
+        fake = self.server.fake
+        fake._opened(self.connection)
+        authenticated = False
+        self.reply("220 fake-smtp ready")
+        try:
+            while True:
+                line = self.rfile.readline()
+                if not line:
+                    break
+                command = line.decode("utf-8", "replace").rstrip("\r\n")
+                verb = command.split(" ", 1)[0].upper()
+                if verb == "EHLO":
+                    self.reply("250-fake-smtp")
+                    self.reply("250 AUTH PLAIN")
+                elif verb == "HELO":
+                    self.reply("250 fake-smtp")
+                elif verb == "AUTH":
+                    authenticated = self.authenticate(command.split(" ")[1:])
+                    self.reply("235 Authentication successful" if authenticated
+                               else "535 Authentication failed")
+                elif verb in ("MAIL", "RCPT"):
+                    self.reply("250 OK" if authenticated else "530 Authentication required")
+                elif verb == "DATA":
+                    self.reply("354 End data with <CR><LF>.<CR><LF>")
+                    fake._received(self.read_data())
+                    self.reply("250 OK: queued")
+                elif verb in ("RSET", "NOOP"):
+                    self.reply("250 OK")
+                elif verb == "QUIT":
+                    self.reply("221 Bye")
+                    break
+                else:
+                    self.reply("502 Command not implemented")
+        except OSError:
+            pass  # Connection dropped (see FakeSMTPServer.drop_connections)
+        finally:
+            fake._closed(self.connection)
+
+    def authenticate(self, arguments):
+        if not arguments or arguments[0].upper() != "PLAIN":
+            return False
+        if len(arguments) > 1:
+            response = arguments[1]
+        else:
+            self.reply("334 ")
+            response = self.rfile.readline().decode().strip()
+        _, user, password = base64.b64decode(response).decode().split("\0")
+        return self.server.fake._login(user, password)
+
+    def read_data(self):
+        lines = []
+        while True:
+            line = self.rfile.readline()
+            if not line or line == b".\r\n":
+                break
+            lines.append(line[1:] if line.startswith(b"..") else line)
+        return b"".join(lines)
+
+class _ThreadingServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+class FakeSMTPServer:
+    """Plain-text SMTP server on localhost that keeps every message it accepts
+
+    With user/password set, only those credentials are accepted; otherwise any
+    login succeeds. Use as a context manager, or start()/stop().
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, user=None, password=None):
+        self.user = user
+        self.password = password
+        self.messages = []
+        self.connections = 0
+        self.logins = 0
+        self._lock = threading.Lock()
+        self._open = set()
+        self._server = _ThreadingServer((host, port), _SMTPHandler)
+        self._server.fake = self
+        self._thread = None
+
+    @property
+    def host(self):
+        return self._server.server_address[0]
+
+    @property
+    def port(self):
+        return self._server.server_address[1]
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self.drop_connections()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def drop_connections(self):
+        """Close every client connection, like a server-side idle timeout"""
+        with self._lock:
+            connections = list(self._open)
+        for connection in connections:
+            try:
+                connection.shutdown(2)
+            except OSError:
+                pass
+
+    def _opened(self, connection):
+        with self._lock:
+            self.connections += 1
+            self._open.add(connection)
+
+    def _closed(self, connection):
+        with self._lock:
+            self._open.discard(connection)
+
+    def _login(self, user, password):
+        if self.user is not None and (user, password) != (self.user, self.password):
+            return False
+        with self._lock:
+            self.logins += 1
+        return True
+
+    def _received(self, data):
+        with self._lock:
+            self.messages.append(message_from_bytes(data, policy=policy.default))
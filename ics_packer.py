@@ -0,0 +1,109 @@
+import bisect
+import glob
+import os
+from typing import Dict, List, Tuple
+
+COPY_CHUNK = 1 << 20  # Bytes copied per read when writing a part
+
+def scan_ics(path: str) -> Tuple[bytes, List[Tuple[int, int, bytes]], bytes]:
+    """Split an ICS file into its calendar header, VEVENT blocks and trailer
+
+    The header holds every line outside a VEVENT (calendar properties, VTIMEZONE
+    and other components), so each part can repeat it. Events are returned as
+    (offset, length, uid) byte ranges rather than read into memory.
+    """
+    header = []
+    footer = b""
+    blocks = []
+    offset = 0
+    event_start = None
+    uid = b""
+    with open(path, 'rb') as f:
+        for line in f:
+            name = line.rstrip(b"\r\n")
+            if event_start is not None:
+                if name.startswith(b"UID:"):
+                    uid = name[4:]
+                elif name == b"END:VEVENT":
+                    blocks.append((event_start, offset + len(line) - event_start, uid))
+                    event_start = None
+            elif name == b"BEGIN:VEVENT":
+                event_start = offset
+                uid = b""
+            elif name == b"END:VCALENDAR":
+                footer = line
+            else:
+                header.append(line)
+            offset += len(line)
+    return b"".join(header), blocks, footer
+
+def pack_sizes(sizes: List[int], capacity: int) -> List[List[int]]:
+    """Best-fit decreasing bin packing; returns bins of indexes into sizes
+
+    Each item, largest first, goes into the fullest bin it still fits; the free
+    space of open bins is kept sorted so that lookup is a bisect. Items larger
+    than capacity get a bin of their own.
+    """
+    bins = []
+    rooms = []  # Sorted (free bytes, bin index)
+    for index in sorted(range(len(sizes)), key=lambda i: sizes[i], reverse=True):
+        size = sizes[index]
+        position = bisect.bisect_left(rooms, (size, -1))
+        if position < len(rooms):
+            room, target = rooms.pop(position)
+        else:
+            room, target = capacity, len(bins)
+            bins.append([])
+        bins[target].append(index)
+        if room - size > 0:
+            bisect.insort(rooms, (room - size, target))
+    return bins
+
+def part_paths(path: str, count: int) -> List[str]:
+    stem, extension = os.path.splitext(path)
+    return [f"{stem}.part{index}of{count}{extension}" for index in range(1, count + 1)]
+
+def split_ics(path: str, max_bytes: int) -> List[str]:
+    """Split an ICS file into as few valid VCALENDAR files as fit max_bytes each
+
+    Returns [path] when the file already fits. Otherwise events are packed on
+    their boundaries into part files next to the original (NAME.part1of3.ics ...),
+    each repeating the calendar header, with events kept in file order within a
+    part. Events sharing a UID (a recurring master and its modified occurrences)
+    always land in the same part. An event bigger than the budget on its own still
+    gets a (too big) part.
+    """
+    if os.path.getsize(path) <= max_bytes:
+        return [path]
+    header, blocks, footer = scan_ics(path)
+    groups: Dict[bytes, List[int]] = {}
+    for index, (_, _, uid) in enumerate(blocks):
+        groups.setdefault(uid or b"%d" % index, []).append(index)
+    groups = list(groups.values())
+    if len(groups) < 2:
+        return [path]  # Nothing to split on
+    capacity = max_bytes - len(header) - len(footer)
+    group_bins = pack_sizes([sum(blocks[index][1] for index in group) for group in groups], capacity)
+    bins = [[index for group in group_bin for index in groups[group]] for group_bin in group_bins]
+
+    stem, extension = os.path.splitext(path)
+    for stale in glob.glob(f"{glob.escape(stem)}.part*of*{extension}"):
+        os.remove(stale)
+    paths = part_paths(path, len(bins))
+    with open(path, 'rb') as source:
+        for part_path, indexes in zip(paths, bins):
+            with open(part_path, 'wb') as part:
+                part.write(header)
+                for offset, length, _ in sorted(blocks[index] for index in indexes):
+                    source.seek(offset)
+                    while length:
+                        chunk = source.read(min(length, COPY_CHUNK))
+                        part.write(chunk)
+                        length -= len(chunk)
+                part.write(footer)
+    oversized = sum(1 for _, length, _ in blocks if length > capacity)
+    if oversized:
+        print(f"Warning: {oversized} events are larger than the {max_bytes} byte part budget on their own")
+    print(f"Split {os.path.basename(path)} ({len(blocks)} events) into {len(paths)} parts "
+          f"of at most {max_bytes} bytes")
+    return paths
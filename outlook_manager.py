@@ -1,12 +1,34 @@
 import subprocess
+import sys
 import time
-import win32com.client
-import psutil
 import os
 from pathlib import Path
+from config import load_config
+
+# Load environment variables
+load_config()
+
+# What to do when only New Outlook is running: ask (prompt when run from a console,
+# continue when unattended), continue (start Classic Outlook alongside it) or abort.
+outlook_new_policy = os.getenv("OUTLOOK_NEW_POLICY", "ask").lower()
+outlook_start_timeout = float(os.getenv("OUTLOOK_START_TIMEOUT", 30))  # Seconds for COM to answer
+outlook_path = os.getenv("OUTLOOK_PATH", "")  # Skip the executable search
+
+OUTLOOK_PROCESS_NAMES = ("outlook.exe", "olk.exe")  # olk.exe is New Outlook
+PROBE_FIRST_DELAY = 0.1  # Seconds before the second COM probe; doubled after every failure
+PROBE_MAX_DELAY = 2.0
+
+_classic_outlook_path = None  # Resolved once per process
+
+def _is_new_outlook(name, exe_path):
+    # New Outlook is olk.exe, or an outlook.exe packaged under WindowsApps
+    return (name == "olk.exe" or 'WindowsApps' in exe_path
+            or 'Microsoft.OutlookForWindows' in exe_path)
 
 class OutlookManager:
-    def __init__(self):
+    def __init__(self, new_outlook_policy=None, start_timeout=None):
+        self.new_outlook_policy = (new_outlook_policy or outlook_new_policy).lower()
+        self.start_timeout = outlook_start_timeout if start_timeout is None else start_timeout
         self.classic_outlook_paths = [
             r"C:\Program Files\Microsoft Office\root\Office16\OUTLOOK.EXE",
             r"C:\Program Files (x86)\Microsoft Office\root\Office16\OUTLOOK.EXE",
@@ -14,32 +36,56 @@ class OutlookManager:
             r"C:\Program Files (x86)\Microsoft Office\Office16\OUTLOOK.EXE",
             # Add more common paths as needed
         ]
+        self.namespace = None  # MAPI namespace, reused by the in-process export
     
-    def is_outlook_running(self):
-        """Check if any version of Outlook is running"""
+    def find_outlook_processes(self):
+        """One pass over the process list: [(pid, exe path, is_new_outlook)] for Outlook processes
+
+        Only the name is read for every process; the executable path (a costlier,
+        sometimes denied query) only for the Outlook ones.
+        """
+        global _classic_outlook_path
+        import psutil  # Only the Outlook source needs process checks
+
+        found = []
         for proc in psutil.process_iter(['pid', 'name']):
+            name = (proc.info['name'] or '').lower()
+            if name not in OUTLOOK_PROCESS_NAMES:
+                continue
             try:
-                if proc.info['name'].lower() == 'outlook.exe':
-                    return True, proc.info['pid']
+                exe_path = proc.exe() or ''
             except (psutil.NoSuchProcess, psutil.AccessDenied):
-                continue
+                exe_path = ''
+            is_new = _is_new_outlook(name, exe_path)
+            if exe_path and not is_new and _classic_outlook_path is None:
+                _classic_outlook_path = exe_path  # A running Classic Outlook tells us where it lives
+            found.append((proc.info['pid'], exe_path, is_new))
+        return found
+    
+    def is_outlook_running(self):
+        """Check if any version of Outlook is running"""
+        processes = self.find_outlook_processes()
+        if processes:
+            return True, processes[0][0]
         return False, None
     
     def is_classic_outlook_running(self):
         """Check if classic Outlook is running (not new Outlook)"""
-        for proc in psutil.process_iter(['pid', 'name', 'exe']):
-            try:
-                if proc.info['name'].lower() == 'outlook.exe':
-                    exe_path = proc.info.get('exe', '')
-                    # New Outlook typically runs from WindowsApps folder
-                    if 'WindowsApps' not in exe_path and 'Microsoft.OutlookForWindows' not in exe_path:
-                        return True, proc.info['pid']
-            except (psutil.NoSuchProcess, psutil.AccessDenied):
-                continue
+        for pid, _, is_new in self.find_outlook_processes():
+            if not is_new:
+                return True, pid
         return False, None
     
     def find_classic_outlook_path(self):
-        """Find the path to classic Outlook executable"""
+        """Find the path to classic Outlook executable (OUTLOOK_PATH, else searched once per process)"""
+        global _classic_outlook_path
+        if outlook_path:
+            return outlook_path
+        if _classic_outlook_path is None:
+            _classic_outlook_path = self._search_classic_outlook_path()
+        return _classic_outlook_path
+    
+    def _search_classic_outlook_path(self):
         for path in self.classic_outlook_paths:
             if os.path.exists(path):
                 return path
@@ -71,48 +117,83 @@ class OutlookManager:
         except Exception as e:
             raise Exception(f"Failed to start Classic Outlook: {e}")
     
-    def wait_for_outlook_com(self, timeout=30):
-        """Wait for Outlook COM interface to be available"""
-        start_time = time.time()
-        while time.time() - start_time < timeout:
+    def probe_outlook_com(self):
+        """Return the MAPI namespace if Outlook answers over COM right now, else raise"""
+        import win32com.client
+
+        outlook = win32com.client.Dispatch("Outlook.Application")
+        namespace = outlook.GetNamespace("MAPI")
+        # Try to access a folder to ensure it's fully loaded
+        namespace.GetDefaultFolder(6)  # Inbox folder
+        return namespace
+    
+    def wait_for_outlook_com(self, timeout=None):
+        """Wait for Outlook COM interface to be available
+
+        Probes right away and then with exponentially growing pauses (0.1s doubling
+        up to 2s), so a running Outlook is picked up at once and a starting one within
+        moments of being ready.
+        """
+        timeout = self.start_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        delay = PROBE_FIRST_DELAY
+        attempts = 0
+        while True:
+            attempts += 1
             try:
-                outlook = win32com.client.Dispatch("Outlook.Application")
-                namespace = outlook.GetNamespace("MAPI")
-                # Try to access a folder to ensure it's fully loaded
-                namespace.GetDefaultFolder(6)  # Inbox folder
-                print("Outlook COM interface is ready")
+                self.namespace = self.probe_outlook_com()
+                print(f"Outlook COM interface is ready (attempt {attempts})")
                 return True
             except Exception as e:
-                print(f"Waiting for Outlook COM interface... ({e})")
-                time.sleep(2)
-        
+                error = e
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                print(f"Outlook COM interface did not answer within {timeout:g}s ({error})")
+                return False
+            if attempts == 1:
+                print(f"Waiting for Outlook COM interface... ({error})")
+            time.sleep(min(delay, remaining))
+            delay = min(delay * 2, PROBE_MAX_DELAY)
+    
+    def continue_despite_new_outlook(self):
+        """Apply OUTLOOK_NEW_POLICY; only "ask" from an interactive console prompts
+
+        Unattended runs treat "ask" as "continue", starting Classic Outlook as they
+        always have; not syncing while New Outlook is open takes an explicit "abort".
+        """
+        policy = self.new_outlook_policy
+        if policy == "ask" and not (sys.stdin and sys.stdin.isatty()):
+            policy = "continue"  # Nobody to answer; an unattended run must not hang on input()
+        if policy == "continue":
+            print(f"Continuing and starting Classic Outlook (OUTLOOK_NEW_POLICY={self.new_outlook_policy})")
+            return True
+        if policy == "ask":
+            return input("Do you want to continue anyway? (y/n): ").lower() == 'y'
+        print("Not starting Classic Outlook next to New Outlook (OUTLOOK_NEW_POLICY=abort)")
         return False
     
     def ensure_classic_outlook_running(self):
         """Ensure Classic Outlook is running and COM interface is ready"""
         print("Checking Outlook status...")
         
-        # Check if classic Outlook is already running
-        is_classic_running, pid = self.is_classic_outlook_running()
+        # One look at the process list tells both whether Classic and New Outlook run
+        processes = self.find_outlook_processes()
+        classic = [pid for pid, _, is_new in processes if not is_new]
         
-        if is_classic_running:
-            print(f"Classic Outlook is already running (PID: {pid})")
+        if classic:
+            print(f"Classic Outlook is already running (PID: {classic[0]})")
         else:
-            # Check if any Outlook is running (might be new Outlook)
-            is_any_running, pid = self.is_outlook_running()
-            if is_any_running:
-                print(f"WARNING: New Outlook or other Outlook version detected (PID: {pid})")
+            if processes:
+                print(f"WARNING: New Outlook or other Outlook version detected (PID: {processes[0][0]})")
                 print("This tool requires Classic Outlook. Please close New Outlook and restart this script.")
-                choice = input("Do you want to continue anyway? (y/n): ").lower()
-                if choice != 'y':
+                if not self.continue_despite_new_outlook():
                     return False
             
-            # Start classic Outlook
+            # Start classic Outlook; readiness is polled below instead of sleeping
             print("Starting Classic Outlook...")
             try:
                 self.start_classic_outlook()
                 print("Waiting for Classic Outlook to initialize...")
-                time.sleep(5)  # Give Outlook time to start
             except Exception as e:
                 print(f"Error starting Classic Outlook: {e}")
                 return False
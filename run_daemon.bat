@@ -0,0 +1,24 @@
+@echo off
+REM Run Outlook Calendar Sync as a resident process (syncs every SYNC_INTERVAL_MINUTES)
+set LOGFILE="%~dp0sync_daemon_log_%date:~-4,4%_%date:~-10,2%_%date:~-7,2%.txt"
+echo Starting Outlook Calendar Sync daemon at %date% %time% >> %LOGFILE%
+echo Starting Outlook Calendar Sync daemon at %date% %time%
+
+REM Change to the script directory (critical for Task Scheduler)
+cd /d "%~dp0"
+
+REM Check if virtual environment exists
+if not exist ".venv\Scripts\activate.bat" (
+    echo ERROR: Virtual environment not found at %~dp0.venv >> %LOGFILE%
+    echo ERROR: Virtual environment not found at %~dp0.venv
+    exit /b 1
+)
+
+call "%~dp0.venv\Scripts\activate.bat"
+
+REM Runs until Ctrl+C / Ctrl+Break; the current sync finishes before it exits
+python sync_daemon.py >> %LOGFILE% 2>&1
+
+echo Sync daemon exited with code %ERRORLEVEL% at %date% %time% >> %LOGFILE%
+echo Sync daemon exited with code %ERRORLEVEL% at %date% %time%
+exit /b %ERRORLEVEL%
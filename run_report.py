@@ -0,0 +1,182 @@
+import json
+import os
+import socket
+import sqlite3
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List, Optional
+
+METRIC_PREFIX = "outlook_sync"
+
+def error_category(error: BaseException) -> str:
+    """Coarse, stable label for an exception, for reports and alerting"""
+    if isinstance(error, (socket.timeout, TimeoutError)):
+        return "timeout"
+    smtplib = sys.modules.get("smtplib")  # Not imported yet: no SMTP error can have happened
+    if smtplib is not None and isinstance(error, smtplib.SMTPAuthenticationError):
+        return "auth"
+    if smtplib is not None and isinstance(error, smtplib.SMTPException):
+        return "smtp"
+    if isinstance(error, ConnectionError):
+        return "connection"
+    if isinstance(error, sqlite3.Error):
+        return "state_store"
+    if isinstance(error, OSError):
+        return "io"
+    if isinstance(error, ValueError):
+        return "data"
+    return "unexpected"
+
+class StageRecord:
+    """Timing and counters for one step of a sync run"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.seconds = 0.0
+        self.items = None
+        self.bytes = None
+        self.status = "ok"
+        self.error = None
+        self.message = None
+
+    def fail(self, category: str, message: Optional[str] = None):
+        self.status = "error"
+        self.error = category
+        self.message = message
+
+    def add_file(self, path: Optional[str]):
+        """Count the size of a file this stage wrote or sent"""
+        if path and os.path.exists(path):
+            self.bytes = (self.bytes or 0) + os.path.getsize(path)
+
+    def to_dict(self) -> Dict:
+        data = {"name": self.name, "seconds": round(self.seconds, 6), "status": self.status}
+        for key in ("items", "bytes", "error", "message"):
+            value = getattr(self, key)
+            if value is not None:
+                data[key] = value
+        return data
+
+class RunReport:
+    """Machine-readable record of one sync run: per-stage timing, counts and errors
+
+    Written as JSON (RUN_REPORT_FILE) and, if configured, as a Prometheus
+    textfile-collector file (PROMETHEUS_TEXTFILE) after every run.
+    """
+
+    def __init__(self, source: str = ""):
+        self.source = source
+        self.started_at = datetime.now()
+        self._started = time.perf_counter()
+        self.seconds = 0.0
+        self.stages: List[StageRecord] = []
+        self.counts: Dict[str, int] = {}
+        self.success = False
+
+    @contextmanager
+    def stage(self, name: str):
+        """Time a stage; exceptions are recorded with their category and re-raised"""
+        record = StageRecord(name)
+        self.stages.append(record)
+        start = time.perf_counter()
+        try:
+            yield record
+        except Exception as e:
+            record.fail(error_category(e), str(e))
+            raise
+        finally:
+            record.seconds = time.perf_counter() - start
+
+    def record_error(self, error: BaseException, stage: str = "run"):
+        """Record an exception that ended the run, unless a stage already recorded it"""
+        if self.failed_stage is None:
+            record = StageRecord(stage)
+            record.fail(error_category(error), str(error))
+            self.stages.append(record)
+
+    def finish(self, success: bool):
+        self.success = success
+        self.seconds = time.perf_counter() - self._started
+
+    @property
+    def failed_stage(self) -> Optional[StageRecord]:
+        return next((stage for stage in self.stages if stage.status == "error"), None)
+
+    def to_dict(self) -> Dict:
+        failed = self.failed_stage
+        return {
+            "started_at": self.started_at.isoformat(),
+            "source": self.source,
+            "success": self.success,
+            "seconds": round(self.seconds, 6),
+            "error": failed.error if failed else None,
+            "failed_stage": failed.name if failed else None,
+            "counts": self.counts,
+            "stages": [stage.to_dict() for stage in self.stages],
+        }
+
+    def write_json(self, path: str):
+        _write_atomic(path, json.dumps(self.to_dict(), indent=2))
+
+    def prometheus_text(self) -> str:
+        p = METRIC_PREFIX
+        lines = [
+            f"# HELP {p}_last_run_timestamp_seconds Start time of the last sync run.",
+            f"# TYPE {p}_last_run_timestamp_seconds gauge",
+            f"{p}_last_run_timestamp_seconds {self.started_at.timestamp():.0f}",
+            f"# HELP {p}_last_run_success Whether the last sync run succeeded.",
+            f"# TYPE {p}_last_run_success gauge",
+            f"{p}_last_run_success {int(self.success)}",
+            f"# HELP {p}_last_run_duration_seconds Wall-clock duration of the last sync run.",
+            f"# TYPE {p}_last_run_duration_seconds gauge",
+            f"{p}_last_run_duration_seconds {self.seconds:.6f}",
+            f"# HELP {p}_stage_duration_seconds Wall-clock duration of each stage of the last run.",
+            f"# TYPE {p}_stage_duration_seconds gauge",
+        ]
+        lines += [f'{p}_stage_duration_seconds{{stage="{stage.name}"}} {stage.seconds:.6f}'
+                  for stage in self.stages]
+        lines += [f"# HELP {p}_stage_success Whether each stage of the last run succeeded.",
+                  f"# TYPE {p}_stage_success gauge"]
+        lines += [f'{p}_stage_success{{stage="{stage.name}"}} {int(stage.status == "ok")}'
+                  for stage in self.stages]
+        lines += [f"# HELP {p}_stage_items Items handled by each stage of the last run.",
+                  f"# TYPE {p}_stage_items gauge"]
+        lines += [f'{p}_stage_items{{stage="{stage.name}"}} {stage.items}'
+                  for stage in self.stages if stage.items is not None]
+        lines += [f"# HELP {p}_stage_bytes Bytes written or sent by each stage of the last run.",
+                  f"# TYPE {p}_stage_bytes gauge"]
+        lines += [f'{p}_stage_bytes{{stage="{stage.name}"}} {stage.bytes}'
+                  for stage in self.stages if stage.bytes is not None]
+        lines += [f"# HELP {p}_events Event counts from the last run's change detection.",
+                  f"# TYPE {p}_events gauge"]
+        lines += [f'{p}_events{{kind="{kind}"}} {count}' for kind, count in self.counts.items()]
+        failed = self.failed_stage
+        if failed:
+            lines += [f"# HELP {p}_last_run_error Error category of the last failed run.",
+                      f"# TYPE {p}_last_run_error gauge",
+                      f'{p}_last_run_error{{stage="{failed.name}",category="{failed.error}"}} 1']
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str):
+        # The textfile collector may read at any time, so never expose a partial file
+        _write_atomic(path, self.prometheus_text())
+
+    def save(self, json_path: Optional[str], prometheus_path: Optional[str] = None):
+        """Write the configured report files; a failure here never fails the sync"""
+        for path, writer in ((json_path, self.write_json), (prometheus_path, self.write_prometheus)):
+            if not path:
+                continue
+            try:
+                writer(path)
+            except Exception as e:
+                print(f"Could not write run report {path}: {e}")
+
+def _write_atomic(path: str, content: str):
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    os.replace(temp_path, path)
@@ -1,59 +1,203 @@
 import os
-import subprocess
 import sys
 from datetime import datetime
-from dotenv import load_dotenv
+from config import load_config
 from sync_tracker import SyncTracker
-from outlook_manager import OutlookManager
+from sync_state import CalDAVState, ExportCache
+from calendar_sources import get_source
+from export_outlook_calendar import export_incremental
+from csv_to_ics import events_to_ics, write_delta_ics
+from email_icloud import send_calendar_email
+from run_report import RunReport
+import email_icloud
 
 # Load environment variables
-load_dotenv()
+load_config()
 
-def run_sync_with_deletions():
-    """Run the complete sync process with deletion tracking"""
+# "full" publishes the whole calendar every run; "delta" sends only changes, with a
+# full snapshot every FULL_RESYNC_DAYS days (and whenever there is no usable baseline)
+ics_mode = os.getenv("ICS_MODE", "full").lower()
+full_resync_days = int(os.getenv("FULL_RESYNC_DAYS", 7))
+
+# Written after every run; the Prometheus textfile is only written when configured
+run_report_file = os.getenv("RUN_REPORT_FILE", os.path.join(
+    os.getenv("EXPORT_DIRECTORY", r"C:\OutlookCalendarExports"), "sync_report.json"))
+prometheus_textfile = os.getenv("PROMETHEUS_TEXTFILE", "")
+
+# "email" sends ICS files to import; "caldav" pushes each change to CALDAV_URL
+delivery_method = os.getenv("DELIVERY_METHOD", "email").lower()
+
+# Past syncs kept in the SQLite state store for sync_rollback.py (0 keeps none)
+sync_snapshots = int(os.getenv("SYNC_SNAPSHOTS", 10))
+
+def run_sync_with_deletions(source=None, report=None, tracker=None):
+    """Run the complete sync process with deletion tracking
+
+    source is a calendar_sources.CalendarSource; by default the SOURCE_BACKEND one
+    (Classic Outlook unless configured otherwise). Every step is timed into a
+    RunReport (pass one in to inspect it afterwards), which is written to
+    RUN_REPORT_FILE and PROMETHEUS_TEXTFILE when the run ends. A SyncTracker kept
+    from an earlier run supplies the previous state from memory.
+
+    Returns whether the sync succeeded. Errors (a bad setting, an unreachable
+    server) don't escape: they are printed, categorized in the report and the
+    run returns False, as callers go by the return value.
+    """
+    if report is None:
+        report = RunReport(source.name if source is not None else "")
+    success = False
+    try:
+        if source is None:
+            source = get_source()
+            report.source = source.name
+        success = _run_sync(source, report, tracker)
+    except Exception as e:
+        print(f"❌ Sync failed: {e}")
+        report.record_error(e)
+    finally:
+        report.finish(success)
+        report.save(run_report_file, prometheus_textfile)
+    return success
+
+def _send_file(stage, file_path, **kwargs):
+    """Email one file, recording its size and any failure category on the stage"""
+    stage.items = 1
+    stage.add_file(file_path)
+    if send_calendar_email(file_path, **kwargs):
+        return True
+    stage.fail(email_icloud.last_error or "delivery_failed")
+    return False
+
+def _push_caldav(stage, tracker, republished_ids, deletion_ids):
+    """PUT changed and DELETE removed events on the CalDAV calendar, recording ETags"""
+    from caldav_sink import CalDAVSink, get_client
+    from csv_to_ics import calendar_name
+
+    state = CalDAVState(tracker.state_store) if tracker.state_store is not None else None
+    sink = CalDAVSink(get_client(), state.load() if state else {}, calendar_name)
+    # Reconcile with what the server holds: events never pushed (the initial upload, or
+    # ones a rollback brought back) are PUT, resources of events no longer current DELETEd
+    current_owners = {event_id for event_id, event in tracker.current_events.items() if not event.series}
+    missing = sorted(current_owners.difference(sink.resources, republished_ids))
+    if missing:
+        if sink.resources:
+            print(f"  {len(missing)} events missing from the CalDAV calendar")
+        else:
+            print(f"  Initial CalDAV upload of {len(missing)} events")
+        republished_ids = list(republished_ids) + missing
+    orphans = sorted(sink.resources.keys() - current_owners - set(deletion_ids))
+
+    # A series' overrides live in its master's resource, so any change re-PUTs that
+    overrides = {}
+    for event in tracker.current_events.values():
+        if event.series:
+            overrides.setdefault(event.series, []).append((event, tracker.sequences.get(event.event_id)))
+    owners = {}
+    for event_id in republished_ids:
+        event = tracker.current_events[event_id]
+        owner = event.series or event_id
+        if owner in tracker.current_events:
+            owners[owner] = None
+    upserts = [(tracker.current_events[owner], tracker.sequences.get(owner), overrides.get(owner, ()))
+               for owner in owners]
+    deletions = [(event_id, tracker.previous_events.get(event_id)) for event_id in deletion_ids
+                 if not getattr(tracker.previous_events.get(event_id), 'series', "")]
+    deletions += [(event_id, None) for event_id in orphans]
+    pushed = sink.push(upserts, deletions)
+    if state is not None:
+        state.save(sink.updates, sink.removed)
+    stage.items = len(upserts) + len(deletions)
+    stage.bytes = sink.stats['bytes']
+    print(f"  CalDAV: {sink.stats['put']} written, {sink.stats['deleted']} deleted, "
+          f"{sink.stats['conflicts']} conflicts, {sink.stats['failed']} failed "
+          f"({sink.client.requests} requests over {sink.client.connects} connections so far)")
+    for kind, event_id, href in sink.conflicts:
+        action = "update" if kind == 'put' else "deletion"
+        print(f"  Conflict: {href} was changed on the server; kept it there instead of the {action} "
+              f"of {event_id}")
+    if not pushed:
+        stage.fail("caldav", f"{sink.stats['failed']} requests failed")
+    return pushed
+
+def _run_sync(source, report, tracker=None):
     print(f"Starting Outlook Calendar Sync at {datetime.now()}")
     print("=" * 60)
     
-    # Step 0: Ensure Classic Outlook is running
-    print("Step 0: Verifying Classic Outlook...")
-    outlook_manager = OutlookManager()
-    if not outlook_manager.ensure_classic_outlook_running():
-        print("❌ Failed to start or verify Classic Outlook")
-        print("Please ensure Classic Outlook is installed and accessible.")
-        return False
+    # Step 0: Ensure the calendar source (normally Classic Outlook) is ready
+    if source.name == "outlook":
+        print("Step 0: Verifying Classic Outlook...")
+    else:
+        print(f"Step 0: Preparing {source.name} calendar source...")
+    with report.stage("source_ready") as stage:
+        if not source.prepare():
+            stage.fail("source_unavailable")
+            if source.name == "outlook":
+                print("❌ Failed to start or verify Classic Outlook")
+                print("Please ensure Classic Outlook is installed and accessible.")
+            else:
+                print(f"❌ Calendar source '{source.name}' is not available")
+            return False
     
-    print("✅ Classic Outlook is ready")
+    print("✅ Calendar source is ready")
     print()
     
-    # Initialize sync tracker
-    tracker = SyncTracker()
-    
     # Step 1: Load previous sync data
     print("Step 1: Loading previous sync data...")
-    previous_data = tracker.load_previous_sync()
-    if previous_data:
+    with report.stage("state_load") as stage:
+        if tracker is None:
+            # Initialize sync tracker
+            tracker = SyncTracker(os.getenv("SYNC_STATE_FILE", "sync_state.db"),
+                                  keep_snapshots=sync_snapshots)
+        if tracker.previous_loaded and not tracker.baseline_changed():
+            previous_data = None
+        else:
+            previous_data = tracker.load_previous_sync()
+        stage.items = len(tracker.previous_events)
+    if previous_data is None:
+        print(f"  Previous sync: kept in memory ({len(tracker.previous_events)} events)")
+    elif previous_data:
         print(f"  Previous sync: {previous_data.get('sync_date', 'Unknown')}")
         print(f"  Previous events: {previous_data.get('total_events', 0)}")
     else:
         print("  No previous sync data found (first run)")
     
-    # Step 2: Export from Outlook
-    print("\nStep 2: Exporting from Outlook...")
+    # Step 2: Export from the calendar source
+    print(f"\nStep 2: Exporting from {'Outlook' if source.name == 'outlook' else source.name}...")
     try:
-        result = subprocess.run([sys.executable, "export_outlook_calendar.py"], 
-                              capture_output=True, text=True, check=True)
+        with report.stage("export") as stage:
+            export_cache = None
+            if export_incremental and tracker.state_store is not None:
+                export_cache = ExportCache(tracker.state_store)
+            events = source.export(cache=export_cache)
+            stage.items = len(events)
         print("  Export completed successfully")
-    except subprocess.CalledProcessError as e:
+    except Exception as e:
         print(f"  Export failed: {e}")
         return False
     
     # Step 3: Load current events and compare
     print("\nStep 3: Analyzing changes...")
-    csv_file = os.path.join(os.getenv("EXPORT_DIRECTORY", "."), 
-                           os.getenv("CSV_FILENAME", "outlook_calendar_export.csv"))
+    with report.stage("diff") as stage:
+        tracker.load_events(events)
+        tracker.fingerprint = tracker.content_fingerprint()
+        unchanged = (tracker.fingerprint == tracker.delivered_fingerprint
+                     and not (ics_mode == "delta" and tracker.needs_full_sync(full_resync_days)))
+        added, deleted, modified = ([], [], []) if unchanged else tracker.find_changes()
+        stage.items = len(tracker.current_events)
+        if unchanged:
+            stage.message = "unchanged since last delivery"
+    report.counts.update(current=len(tracker.current_events), added=len(added),
+                         deleted=len(deleted), modified=len(modified))
     
-    tracker.load_current_events(csv_file)
-    added, deleted, modified = tracker.find_changes()
+    if unchanged:
+        # Same content as the calendar already delivered: nothing to convert, send or save
+        report.counts["cancelled"] = 0
+        print(f"  Current events: {len(tracker.current_events)}")
+        print("  Calendar unchanged since the last delivery; skipping ICS conversion and email")
+        tracker.promote_current()
+        print("\n" + "=" * 60)
+        print("Enhanced Calendar Sync completed successfully (no changes)")
+        return True
     
     print(f"  Current events: {len(tracker.current_events)}")
     print(f"  Added events: {len(added)}")
@@ -64,14 +208,23 @@ def run_sync_with_deletions():
     deletion_ids = deleted.copy()
     if modified:
         print("  Modified events details:")
-        for old_id, new_id in modified:
-            if old_id in tracker.previous_events and new_id in tracker.current_events:
-                old_event = tracker.previous_events[old_id]
-                new_event = tracker.current_events[new_id]
-                print(f"    - Modified: {old_event['subject']}")
-                print(f"      Old: {old_event['start']} to {old_event['end']}")
-                print(f"      New: {new_event['start']} to {new_event['end']}")
-                deletion_ids.append(old_id)  # Add old version to deletion list
+        for change in modified:
+            old_event = tracker.previous_events[change.old_id]
+            new_event = tracker.current_events[change.new_id]
+            print(f"    - Modified: {old_event.subject} ({', '.join(change.fields)})")
+            if change.old_id != change.new_id:
+                print(f"      Old: {old_event.start_text} to {old_event.end_text}")
+                print(f"      New: {new_event.start_text} to {new_event.end_text}")
+                deletion_ids.append(change.old_id)  # Add old version to deletion list
+
+    # An override gone from a series that is still there is folded back by re-publishing
+    # the master; cancelling its RECURRENCE-ID would drop that occurrence altogether
+    reverted_series = {tracker.previous_events[event_id].series for event_id in deletion_ids
+                       if tracker.previous_events[event_id].series in tracker.current_events}
+    if reverted_series:
+        deletion_ids = [event_id for event_id in deletion_ids
+                        if tracker.previous_events[event_id].series not in reverted_series]
+    report.counts["cancelled"] = len(deletion_ids)
     
     # Show details of deletions
     if deletion_ids:
@@ -79,79 +232,160 @@ def run_sync_with_deletions():
         for event_id in deletion_ids[:5]:  # Show first 5
             if event_id in tracker.previous_events:
                 event = tracker.previous_events[event_id]
-                print(f"    - {event['subject']} ({event['start']} to {event['end']})")
+                print(f"    - {event.subject} ({event.start_text} to {event.end_text})")
         if len(deletion_ids) > 5:
             print(f"    ... and {len(deletion_ids) - 5} more")
     
-    # Step 4: Convert to ICS
-    print("\nStep 4: Converting to ICS format...")
-    try:
-        result = subprocess.run([sys.executable, "csv_to_ics.py"], 
-                              capture_output=True, text=True, check=True)
-        print("  ICS conversion completed")
-    except subprocess.CalledProcessError as e:
-        print(f"  ICS conversion failed: {e}")
-        return False
+    # Re-published and cancelled events move to their next SEQUENCE number
+    republished_ids = added + [change.new_id for change in modified]
+    republished_ids += sorted(reverted_series.difference(republished_ids))
+    tracker.bump_sequences(republished_ids + deletion_ids)
+    
+    use_delta = ics_mode == "delta" and not tracker.needs_full_sync(full_resync_days)
+    tracker.full_sync = not use_delta
     
-    # Step 5: Create deletion ICS if needed
-    ics_file = os.path.join(os.getenv("EXPORT_DIRECTORY", "."), 
-                           os.getenv("ICS_FILENAME", "outlook_calendar_export.ics"))
+    # Step 4: Convert to ICS
+    export_dir = os.getenv("EXPORT_DIRECTORY", r"C:\OutlookCalendarExports")
+    os.makedirs(export_dir, exist_ok=True)
+    ics_file = os.path.join(export_dir, os.getenv("ICS_FILENAME", "outlook_calendar_export.ics"))
     deletion_file = None
+    delta_file = None
     
-    if deletion_ids:
-        print(f"\nStep 5: Creating deletion ICS file for {len(deletion_ids)} deleted/old events...")
-        deletion_file = tracker.generate_deletion_ics(deletion_ids, ics_file)
+    if delivery_method == "caldav":
+        print("\nStep 4: Pushing changes to the CalDAV calendar...")
+        with report.stage("caldav_push") as stage:
+            pushed = _push_caldav(stage, tracker, republished_ids, deletion_ids)
+        if not pushed:
+            print("  CalDAV push incomplete; the changes will be retried next run")
+            return False
+    elif use_delta:
+        print("\nStep 4: Writing delta ICS (changes and cancellations only)...")
+        changed_events = [tracker.current_events[event_id] for event_id in republished_ids]
+        cancelled_events = [tracker.previous_events[event_id] for event_id in deletion_ids
+                            if event_id in tracker.previous_events]
+        if changed_events or cancelled_events:
+            try:
+                with report.stage("delta_ics") as stage:
+                    delta_file, deletion_file = write_delta_ics(
+                        changed_events, cancelled_events, ics_file.replace('.ics', '_delta.ics'),
+                        tracker.sequences)
+                    stage.items = len(changed_events) + len(cancelled_events)
+                    stage.add_file(delta_file)
+                    stage.add_file(deletion_file)
+                if deletion_file:
+                    print(f"  Deletion file created: {deletion_file} ({len(cancelled_events)} cancellations)")
+                if delta_file:
+                    print(f"  Delta file created: {delta_file} ({len(changed_events)} updates)")
+            except Exception as e:
+                print(f"  Delta ICS creation failed: {e}")
+                return False
+        else:
+            print("  No changes since the last sync")
+        
+        # Step 5-7: Email the cancellations (METHOD:CANCEL) first, then the changes
+        print("\nStep 5: Sending calendar changes via email...")
+        if not delta_file and not deletion_file:
+            print("  Nothing to send")
         if deletion_file:
-            print(f"  Deletion file created: {deletion_file}")
+            with report.stage("email_delta_deletions") as stage:
+                sent = _send_file(
+                    stage, deletion_file,
+                    email_subject="Calendar Event Deletions - Pete Work",
+                    email_body=f"Deletion commands for {len(cancelled_events)} removed/modified calendar events since the last sync. Import this FIRST, then the calendar changes."
+                )
+            if sent:
+                print("  Deletion commands emailed successfully")
+            else:
+                print("  Deletion email failed")
+                return False
+        if delta_file:
+            with report.stage("email_delta") as stage:
+                sent = _send_file(
+                    stage, delta_file,
+                    email_subject="Calendar Changes - Pete Work",
+                    email_body=f"Changes to {len(changed_events)} events since the last sync."
+                )
+            if sent:
+                print("  Calendar changes emailed successfully")
+            else:
+                print("  Email failed")
+                return False
     else:
-        print("\nStep 5: No deletions to process")
-    
-    # Step 6: Email the calendar file
-    print("\nStep 6: Sending calendar via email...")
-    try:
-        result = subprocess.run([sys.executable, "email_icloud.py"], 
-                              capture_output=True, text=True, check=True)
-        print("  Main calendar emailed successfully")
-    except subprocess.CalledProcessError as e:
-        print(f"  Email failed: {e}")
-        return False
-    
-    # Step 7: Email deletion file if it exists
-    if deletion_file and os.path.exists(deletion_file):
-        print("\nStep 7: Sending deletion commands via email...")
+        print("\nStep 4: Converting to ICS format...")
         try:
-            # Temporarily modify the environment to send the deletion file
-            original_ics = os.getenv("ICS_FILENAME")
-            os.environ["ICS_FILENAME"] = os.path.basename(deletion_file)
-            os.environ["EMAIL_SUBJECT"] = "Calendar Event Deletions - Pete Work"
-            os.environ["EMAIL_BODY"] = f"Deletion commands for {len(deletion_ids)} removed/modified calendar events. Import this FIRST to remove old versions, then import the main calendar."
-            
-            result = subprocess.run([sys.executable, "email_icloud.py"], 
-                                  capture_output=True, text=True, check=True)
-            print("  Deletion commands emailed successfully")
-            
-            # Restore original environment
-            if original_ics:
-                os.environ["ICS_FILENAME"] = original_ics
-                
-        except subprocess.CalledProcessError as e:
-            print(f"  Deletion email failed: {e}")
-    else:
-        print("\nStep 7: No deletion file to send")
+            with report.stage("ics") as stage:
+                events_to_ics(events, ics_file, tracker.sequences)
+                stage.items = len(events)
+                stage.add_file(ics_file)
+            print("  ICS conversion completed")
+        except Exception as e:
+            print(f"  ICS conversion failed: {e}")
+            return False
+        
+        # Step 5: Create deletion ICS if needed
+        if deletion_ids:
+            print(f"\nStep 5: Creating deletion ICS file for {len(deletion_ids)} deleted/old events...")
+            with report.stage("deletion_ics") as stage:
+                deletion_file = tracker.generate_deletion_ics(deletion_ids, ics_file)
+                stage.items = len(deletion_ids)
+                if deletion_file:
+                    stage.add_file(deletion_file)
+                else:
+                    stage.fail("io")
+            if deletion_file:
+                print(f"  Deletion file created: {deletion_file}")
+        else:
+            print("\nStep 5: No deletions to process")
+        
+        # Step 6: Email the calendar file
+        print("\nStep 6: Sending calendar via email...")
+        with report.stage("email_calendar") as stage:
+            sent = _send_file(stage, ics_file)
+        if sent:
+            print("  Main calendar emailed successfully")
+        else:
+            print("  Email failed")
+            return False
+        
+        # Step 7: Email deletion file if it exists
+        if deletion_file and os.path.exists(deletion_file):
+            print("\nStep 7: Sending deletion commands via email...")
+            with report.stage("email_deletions") as stage:
+                sent = _send_file(
+                    stage, deletion_file,
+                    email_subject="Calendar Event Deletions - Pete Work",
+                    email_body=f"Deletion commands for {len(deletion_ids)} removed/modified calendar events. Import this FIRST to remove old versions, then import the main calendar."
+                )
+            if sent:
+                print("  Deletion commands emailed successfully")
+            else:
+                print("  Deletion email failed")
+        else:
+            print("\nStep 7: No deletion file to send")
     
     # Step 8: Save current sync data for next time
     print("\nStep 8: Saving sync tracking data...")
-    tracker.save_current_sync()
+    with report.stage("state_save") as stage:
+        stage.items = len(tracker.current_events)
+        if tracker.save_current_sync():
+            tracker.promote_current()
+        else:
+            stage.fail("state_store")
     
     print("\n" + "=" * 60)
     print("Enhanced Calendar Sync completed successfully!")
     print(f"Summary:")
-    print(f"  - Total events synced: {len(tracker.current_events)}")
+    print(f"  - Total events synced: {report.counts['current']}")
     print(f"  - New events: {len(added)}")
     print(f"  - Modified events: {len(modified)}")
     print(f"  - Deleted events: {len(deleted)}")
-    print(f"  - Total deletions sent: {len(deletion_ids) if 'deletion_ids' in locals() else 0}")
-    print(f"  - Files sent: {'2 (calendar + deletions)' if deletion_file else '1 (calendar only)'}")
+    print(f"  - Total deletions sent: {len(deletion_ids)}")
+    if delivery_method == "caldav":
+        print(f"  - Delivered via CalDAV")
+    elif use_delta:
+        print(f"  - Files sent: {bool(delta_file) + bool(deletion_file)} (changes and deletions only)")
+    else:
+        print(f"  - Files sent: {'2 (calendar + deletions)' if deletion_file else '1 (calendar only)'}")
     
     return True
 
@@ -0,0 +1,211 @@
+import argparse
+import glob
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from typing import Dict, List, Optional
+from config import load_config
+from run_report import error_category
+
+# Load environment variables
+load_config()
+
+# Profile list: a directory of NAME.env files, or comma-separated .env files, one per person
+batch_profiles = os.getenv("BATCH_PROFILES", "profiles")
+batch_workers = int(os.getenv("BATCH_WORKERS", 4))  # Profiles synced at the same time
+batch_profile_timeout = int(os.getenv("BATCH_PROFILE_TIMEOUT", 1800))  # Seconds per profile (0 = no limit)
+# Each profile's state, exports, run report and log live in BATCH_STATE_DIR/NAME
+batch_state_dir = os.getenv("BATCH_STATE_DIR", "batch")
+batch_report_file = os.getenv("BATCH_REPORT_FILE", os.path.join(batch_state_dir, "batch_report.json"))
+
+SYNC_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sync.py")
+
+# Identity and credentials come from the profile file only, never from the shared .env
+PROFILE_KEYS = ("ICLOUD_EMAIL", "ICLOUD_APP_PASSWORD", "CALDAV_URL", "CALDAV_USERNAME", "CALDAV_PASSWORD",
+                "OUTLOOK_EMAIL", "OUTLOOK_SOURCES", "SOURCE_ICS_FILE", "PROMETHEUS_TEXTFILE")
+# Locations resolved inside the profile's directory, so no two profiles share state
+PROFILE_PATHS = (("SYNC_STATE_FILE", "sync_state.db"), ("EXPORT_DIRECTORY", "exports"),
+                 ("RUN_REPORT_FILE", "sync_report.json"))
+
+class Profile:
+    """One person's sync: their .env settings over the shared one, with a directory of their own"""
+
+    def __init__(self, name: str, path: str, settings: Dict[str, str]):
+        self.name = name
+        self.path = path
+        self.settings = settings
+        self.directory = os.path.abspath(os.path.join(batch_state_dir, name))
+
+    def location(self, key: str, default: str) -> str:
+        return os.path.join(self.directory, self.settings.get(key) or default)
+
+    def environment(self) -> Dict[str, str]:
+        """Environment for this profile's sync process"""
+        env = dict(os.environ)
+        env.update({key: "" for key in PROFILE_KEYS})
+        env.update(self.settings)
+        env.update({key: self.location(key, default) for key, default in PROFILE_PATHS})
+        env["PYTHONIOENCODING"] = "utf-8"  # The log is a file, whatever the console code page
+        return env
+
+    def read_report(self) -> Optional[Dict]:
+        try:
+            with open(self.location("RUN_REPORT_FILE", "sync_report.json"), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def last_success(self) -> str:
+        """Start time of the last sync if it succeeded; '' when it failed or never ran"""
+        report = self.read_report()
+        return report.get("started_at", "") if report and report.get("success") else ""
+
+def load_profiles(spec: str) -> List[Profile]:
+    """Read the profile list: directories (every *.env in them) and .env files, comma-separated"""
+    from dotenv import dotenv_values
+
+    paths = []
+    for entry in filter(None, (part.strip() for part in spec.split(","))):
+        if os.path.isdir(entry):
+            paths += sorted(glob.glob(os.path.join(glob.escape(entry), "*.env")))
+        elif os.path.isfile(entry):
+            paths.append(entry)
+        else:
+            raise ValueError(f"Profile file or directory not found: {entry}")
+    profiles = {}
+    for path in paths:
+        name = os.path.splitext(os.path.basename(path))[0]
+        if name in profiles:
+            raise ValueError(f"Two profiles are named {name!r}: {profiles[name].path} and {path}")
+        settings = {key: value for key, value in dotenv_values(path).items() if value is not None}
+        profiles[name] = Profile(name, path, settings)
+    return list(profiles.values())
+
+def fair_order(profiles: List[Profile]) -> List[Profile]:
+    """Longest without a successful sync first, so a short window never starves the same people"""
+    return sorted(profiles, key=lambda profile: (profile.last_success(), profile.name))
+
+def run_profile(profile: Profile, timeout: Optional[int]) -> Dict:
+    """Sync one profile in its own process; whatever happens there, return its result"""
+    started_at = datetime.now().isoformat()
+    start = time.perf_counter()
+    log_file = os.path.join(profile.directory, "sync.log")
+    result = {"profile": profile.name, "success": False, "error": None, "log": log_file}
+    try:
+        os.makedirs(profile.directory, exist_ok=True)
+        with open(log_file, 'w', encoding='utf-8') as log:
+            completed = subprocess.run([sys.executable, SYNC_SCRIPT], cwd=profile.directory,
+                                       env=profile.environment(), stdout=log, stderr=subprocess.STDOUT,
+                                       timeout=timeout or None)
+        result["success"] = completed.returncode == 0
+        report = profile.read_report()
+        if report is None or report.get("started_at", "") < started_at:
+            report = None  # Left over from an earlier run: this one ended before writing its report
+        if report is not None:
+            result["counts"] = report.get("counts", {})
+            if not result["success"]:
+                result["error"] = report.get("error") or "failed"
+                result["failed_stage"] = report.get("failed_stage")
+        elif not result["success"]:
+            result["error"] = f"exit code {completed.returncode}"
+    except subprocess.TimeoutExpired:
+        result["error"] = "timeout"
+    except Exception as e:
+        result["error"] = error_category(e)
+        result["message"] = str(e)
+    result["seconds"] = round(time.perf_counter() - start, 3)
+    return result
+
+def prepare_outlook(profiles: List[Profile]):
+    """Start Classic Outlook once up front instead of in every profile's process at the same time"""
+    default_backend = os.getenv("SOURCE_BACKEND", "outlook")
+    if not any((profile.settings.get("SOURCE_BACKEND") or default_backend).lower() == "outlook"
+               for profile in profiles):
+        return
+    from calendar_sources import get_source
+
+    try:
+        ready = get_source("outlook").prepare()
+    except Exception as e:
+        print(f"Could not check Classic Outlook: {e}")
+        ready = False
+    if not ready:
+        print("Classic Outlook is not ready; each profile will try to start it itself")
+
+def run_batch(profiles: List[Profile], workers: int, timeout: Optional[int]) -> List[Dict]:
+    """Sync every profile, at most `workers` at a time, in fair_order(); results in that order"""
+    ordered = fair_order(profiles)
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = {pool.submit(run_profile, profile, timeout): profile for profile in ordered}
+        for future in as_completed(futures):
+            result = future.result()
+            status = "ok" if result["success"] else f"FAILED ({result['error']})"
+            print(f"  {result['profile']}: {status} in {result['seconds']:.1f}s")
+    return [future.result() for future in futures]
+
+def print_summary(results: List[Dict], seconds: float, workers: int):
+    failed = [result for result in results if not result["success"]]
+    print("\n" + "=" * 60)
+    print(f"Batch sync of {len(results)} profiles on {workers} workers finished in {seconds:.1f}s: "
+          f"{len(results) - len(failed)} succeeded, {len(failed)} failed")
+    print(f"  {'Profile':<20} {'Result':<8} {'Seconds':>8} {'Events':>7} {'Added':>6} {'Deleted':>8} "
+          f"{'Modified':>9}")
+    totals = {}
+    for result in results:
+        counts = result.get("counts", {})
+        if result["success"]:
+            for kind, count in counts.items():
+                totals[kind] = totals.get(kind, 0) + count
+        columns = " ".join(f"{counts.get(kind, ''):>{width}}" for kind, width in
+                           (("current", 7), ("added", 6), ("deleted", 8), ("modified", 9)))
+        print(f"  {result['profile']:<20} {'ok' if result['success'] else 'FAILED':<8} "
+              f"{result['seconds']:>8.1f} {columns}")
+    print(f"  Total: {totals.get('current', 0)} events synced, {totals.get('added', 0)} added, "
+          f"{totals.get('deleted', 0)} deleted, {totals.get('modified', 0)} modified")
+    for result in failed:
+        stage = f" in {result['failed_stage']}" if result.get("failed_stage") else ""
+        print(f"  {result['profile']} failed: {result['error']}{stage} (log: {result['log']})")
+
+def write_report(path: str, results: List[Dict], started_at: str, seconds: float):
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({"started_at": started_at, "seconds": round(seconds, 3),
+                       "success": all(result["success"] for result in results),
+                       "profiles": results}, f, indent=2)
+    except OSError as e:
+        print(f"Could not write batch report {path}: {e}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Sync many people's calendars, several at a time")
+    parser.add_argument("profiles", nargs="*", help="Profile .env files or directories (BATCH_PROFILES)")
+    parser.add_argument("--workers", type=int, default=batch_workers, help="Profiles synced at once (BATCH_WORKERS)")
+    parser.add_argument("--timeout", type=int, default=batch_profile_timeout,
+                        help="Seconds allowed per profile, 0 for no limit (BATCH_PROFILE_TIMEOUT)")
+    args = parser.parse_args()
+
+    try:
+        profiles = load_profiles(",".join(args.profiles) or batch_profiles)
+    except ValueError as e:
+        print(e)
+        return 1
+    if not profiles:
+        print(f"No profiles found in {','.join(args.profiles) or batch_profiles}")
+        return 1
+
+    started_at = datetime.now().isoformat()
+    start = time.perf_counter()
+    print(f"Starting batch sync of {len(profiles)} profiles at {datetime.now()}")
+    prepare_outlook(profiles)
+    results = run_batch(profiles, args.workers, args.timeout)
+    seconds = time.perf_counter() - start
+    print_summary(results, seconds, args.workers)
+    write_report(batch_report_file, results, started_at, seconds)
+    return 0 if all(result["success"] for result in results) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
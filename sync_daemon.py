@@ -0,0 +1,127 @@
+import argparse
+import os
+import random
+import signal
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from config import load_config
+from calendar_sources import get_source
+from run_report import RunReport
+from sync import run_sync_with_deletions, sync_snapshots
+from sync_tracker import SyncTracker
+
+# Load environment variables
+load_config()
+
+sync_interval_minutes = float(os.getenv("SYNC_INTERVAL_MINUTES", 60))
+sync_jitter_seconds = float(os.getenv("SYNC_JITTER_SECONDS", 120))
+
+WAIT_SLICE_SECONDS = 1.0  # Longest single wait, so a stop request is noticed on Windows too
+
+class SyncDaemon:
+    """Resident sync process: runs syncs on an interval, keeping state warm between them
+
+    The calendar source (and so the Outlook connection), the tracker with the
+    previous sync's events and the loaded configuration live for the whole process,
+    so each run only pays for the export, diff and delivery. A stop request lets the
+    current sync finish before exiting.
+    """
+
+    def __init__(self, source=None, interval_minutes=None, jitter_seconds=None, state_file=None):
+        self.source = source or get_source()
+        self.interval = timedelta(minutes=sync_interval_minutes if interval_minutes is None else interval_minutes)
+        self.jitter = sync_jitter_seconds if jitter_seconds is None else jitter_seconds
+        self.state_file = state_file or os.getenv("SYNC_STATE_FILE", "sync_state.db")
+        self.tracker = None
+        self.runs = 0
+        self.failures = 0
+        self.stop_event = threading.Event()
+
+    def next_delay(self) -> float:
+        """Seconds until the next run: the interval plus or minus random jitter"""
+        delay = self.interval.total_seconds() + random.uniform(-self.jitter, self.jitter)
+        return max(0.0, delay)
+
+    def run_once(self, source=None) -> bool:
+        """One sync with the warm tracker; source overrides the daemon's source for this run"""
+        source = source or self.source
+        if self.tracker is None:
+            self.tracker = SyncTracker(self.state_file, keep_snapshots=sync_snapshots)
+        self.runs += 1
+        try:
+            success = run_sync_with_deletions(source, RunReport(source.name), self.tracker)
+        except Exception as e:
+            print(f"Sync run failed with an unexpected error: {e}")
+            success = False
+        if not success:
+            self.failures += 1
+            self._drop_state()  # A failed run may leave bumped sequences in memory; reload from disk
+        return success
+
+    def _drop_state(self):
+        if self.tracker is not None and self.tracker.state_store is not None:
+            self.tracker.state_store.close()
+        self.tracker = None
+
+    def wait(self, seconds):
+        """Sleep until the next run, returning early once a stop is requested
+
+        Waits in short slices: a single long Event.wait() cannot be interrupted by
+        Ctrl+C on Windows.
+        """
+        deadline = time.monotonic() + seconds
+        while not self.stop_event.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            self.stop_event.wait(min(remaining, WAIT_SLICE_SECONDS))
+
+    def stop(self, signum=None, frame=None):
+        if self.stop_event.is_set():
+            raise KeyboardInterrupt  # Second request: stop immediately
+        print("\nStop requested; finishing the current sync before exiting (repeat to force)")
+        self.stop_event.set()
+
+    def install_signal_handlers(self):
+        for name in ("SIGINT", "SIGTERM", "SIGBREAK"):  # SIGBREAK: Ctrl+Break on Windows
+            if hasattr(signal, name):
+                signal.signal(getattr(signal, name), self.stop)
+
+    def run(self, max_runs=None):
+        """Sync now, then every interval until stopped (or after max_runs runs)"""
+        print(f"Sync daemon started: every {self.interval}, jitter ±{self.jitter:.0f}s, "
+              f"source {self.source.name}")
+        try:
+            while not self.stop_event.is_set():
+                self.run_once()
+                if max_runs is not None and self.runs >= max_runs:
+                    break
+                delay = self.next_delay()
+                next_run = datetime.now() + timedelta(seconds=delay)
+                print(f"Next sync at {next_run:%Y-%m-%d %H:%M:%S} "
+                      f"({self.runs} runs, {self.failures} failed)")
+                self.wait(delay)
+        finally:
+            self._drop_state()
+            print(f"Sync daemon stopped after {self.runs} runs ({self.failures} failed)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the calendar sync continuously")
+    parser.add_argument("--interval", type=float, help="Minutes between syncs (SYNC_INTERVAL_MINUTES)")
+    parser.add_argument("--jitter", type=float, help="Random +/- seconds per interval (SYNC_JITTER_SECONDS)")
+    parser.add_argument("--runs", type=int, help="Stop after this many syncs")
+    args = parser.parse_args()
+
+    daemon = SyncDaemon(interval_minutes=args.interval, jitter_seconds=args.jitter)
+    daemon.install_signal_handlers()
+    try:
+        daemon.run(max_runs=args.runs)
+    except KeyboardInterrupt:
+        print("Sync daemon interrupted")
+        return 1
+    return 1 if daemon.failures and daemon.failures == daemon.runs else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,66 @@
+import argparse
+import os
+import sys
+from config import load_config
+from sync import run_sync_with_deletions, sync_snapshots
+from sync_state import SyncStateStore
+from sync_tracker import SQLITE_SUFFIXES
+
+# Load environment variables
+load_config()
+
+state_file = os.getenv("SYNC_STATE_FILE", "sync_state.db")
+
+def list_snapshots(store: SyncStateStore):
+    snapshots = store.list_snapshots()
+    if not snapshots:
+        print(f"No sync history in {state_file} (SYNC_SNAPSHOTS=0, or no sync saved yet)")
+        return
+    print(f"Sync snapshots in {state_file}:")
+    print(f"  {'ID':>5}  {'Saved':<19}  {'Events':>7}  {'Changes':>7}")
+    for snapshot_id, saved_at, total_events, changes, note in snapshots:
+        current = "  <- current" if snapshot_id == snapshots[-1][0] else ""
+        note = f"  ({note})" if note else ""
+        print(f"  {snapshot_id:>5}  {saved_at[:19]:<19}  {total_events:>7}  {changes:>7}{note}{current}")
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="List the retained sync snapshots, or make one the baseline for the next sync")
+    parser.add_argument("snapshot", type=int, nargs="?", help="Snapshot ID to roll back to")
+    parser.add_argument("--previous", action="store_true", help="Roll back to the snapshot before the current one")
+    parser.add_argument("--sync", action="store_true", help="Sync right away, sending only what differs")
+    args = parser.parse_args()
+
+    if not state_file.lower().endswith(SQLITE_SUFFIXES):
+        print(f"Sync history needs the SQLite state store; SYNC_STATE_FILE is {state_file}")
+        return 1
+    store = SyncStateStore(state_file, sync_snapshots)
+    try:
+        snapshot_id = args.snapshot
+        if args.previous:
+            snapshots = store.list_snapshots()
+            if len(snapshots) < 2:
+                print("No earlier snapshot to roll back to")
+                return 1
+            snapshot_id = snapshots[-2][0]
+        if snapshot_id is None:
+            list_snapshots(store)
+            return 0
+        latest = store.latest_snapshot()
+        try:
+            restored, removed = store.rollback(snapshot_id)
+        except KeyError as e:
+            print(f"{e.args[0]}; run without arguments to list the retained ones")
+            return 1
+        print(f"Rolled back to snapshot {snapshot_id}: {restored} events restored, {removed} removed "
+              f"(roll back to {latest} to undo)")
+    finally:
+        store.close()
+
+    if not args.sync:
+        print("The next sync will send only what differs from this snapshot")
+        return 0
+    return 0 if run_sync_with_deletions() else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,368 @@
+import json
+import os
+import sqlite3
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+from calendar_event import Event
+from diff_engine import changed_fields
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    event_id TEXT PRIMARY KEY,
+    subject TEXT NOT NULL,
+    start_time TEXT NOT NULL,
+    end_time TEXT NOT NULL,
+    location TEXT NOT NULL DEFAULT '',
+    body_digest TEXT NOT NULL,
+    source TEXT NOT NULL DEFAULT '',
+    recurrence TEXT NOT NULL DEFAULT '',
+    series TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS idx_events_subject ON events (subject);
+CREATE TABLE IF NOT EXISTS sync_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS event_sequences (
+    event_id TEXT PRIMARY KEY,
+    sequence INTEGER NOT NULL
+);
+"""
+
+EXPORT_CACHE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS export_cache (
+    item_key TEXT PRIMARY KEY,
+    last_modified TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    start_time TEXT NOT NULL,
+    end_time TEXT NOT NULL,
+    location TEXT NOT NULL DEFAULT '',
+    body TEXT NOT NULL DEFAULT ''
+);
+"""
+
+# Sync history: the events table is the newest snapshot, and each save also records
+# the rows it overwrote (present = 0 for events it added), which undoes it. Older
+# snapshots are rebuilt by applying those undo rows newest first.
+SNAPSHOT_SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    snapshot_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    saved_at TEXT NOT NULL,
+    total_events INTEGER NOT NULL,
+    changes INTEGER NOT NULL DEFAULT 0,
+    note TEXT NOT NULL DEFAULT ''
+);
+CREATE TABLE IF NOT EXISTS snapshot_undo (
+    snapshot_id INTEGER NOT NULL,
+    event_id TEXT NOT NULL,
+    present INTEGER NOT NULL,
+    subject TEXT,
+    start_time TEXT,
+    end_time TEXT,
+    location TEXT,
+    body_digest TEXT,
+    source TEXT,
+    recurrence TEXT,
+    series TEXT,
+    PRIMARY KEY (snapshot_id, event_id)
+);
+"""
+
+EVENT_COLUMNS = "subject, start_time, end_time, location, body_digest, source, recurrence, series"
+
+def _event_columns(alias: str) -> str:
+    return ", ".join(f"{alias}.{column}" for column in EVENT_COLUMNS.split(", "))
+
+CALDAV_SCHEMA = """
+CREATE TABLE IF NOT EXISTS caldav_resources (
+    event_id TEXT PRIMARY KEY,
+    href TEXT NOT NULL,
+    etag TEXT
+);
+"""
+
+KEEP_SNAPSHOTS = 10  # Sync snapshots retained for rollback by default
+
+class SyncStateStore:
+    """SQLite-backed sync state: one indexed row per event, bodies kept only as digests
+
+    The last keep_snapshots saves stay retrievable (load_snapshot) and restorable
+    (rollback); 0 keeps no history.
+    """
+
+    def __init__(self, db_path="sync_state.db", keep_snapshots=KEEP_SNAPSHOTS):
+        self.db_path = db_path
+        self.keep_snapshots = keep_snapshots
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.executescript(SNAPSHOT_SCHEMA)
+        self._upgrade_schema()
+
+    def _upgrade_schema(self):
+        """Add columns introduced after a store was first created"""
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(events)")}
+        with self.conn:
+            for column in ('source', 'recurrence', 'series'):
+                if column not in columns:
+                    self.conn.execute(f"ALTER TABLE events ADD COLUMN {column} TEXT NOT NULL DEFAULT ''")
+
+    def close(self):
+        self.conn.close()
+
+    def get_meta(self, key: str, default=None) -> Optional[str]:
+        row = self.conn.execute("SELECT value FROM sync_meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def set_meta(self, key: str, value):
+        with self.conn:
+            self._set_meta(key, value)
+
+    def _set_meta(self, key: str, value):
+        self.conn.execute(
+            "INSERT INTO sync_meta (key, value) VALUES (?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (key, None if value is None else str(value))
+        )
+
+    def count_events(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM events").fetchone()[0]
+
+    def load_events(self) -> Dict[str, Event]:
+        """Load all stored events keyed by event ID"""
+        rows = self.conn.execute(
+            "SELECT event_id, subject, start_time, end_time, location, body_digest, source, "
+            "recurrence, series FROM events"
+        )
+        return {
+            event_id: Event.from_digest(subject, start, end, location, body_digest, source,
+                                        recurrence, series)
+            for event_id, subject, start, end, location, body_digest, source, recurrence, series in rows
+        }
+
+    def load_sequences(self) -> Dict[str, int]:
+        """Last ICS SEQUENCE sent per event ID (kept after the event itself is deleted)"""
+        return dict(self.conn.execute("SELECT event_id, sequence FROM event_sequences"))
+
+    def apply_changes(self, upserts: Iterable[Event], deleted_ids: Iterable[str], total_events: int,
+                      sequences: Optional[Dict[str, int]] = None, note: str = ""):
+        """Upsert changed events, delete removed ones and stamp the sync, in one transaction"""
+        with self.conn:
+            self._apply(list(upserts), list(deleted_ids), total_events, sequences, note)
+
+    def _apply(self, upserts: List[Event], deleted_ids: List[str], total_events: int,
+               sequences: Optional[Dict[str, int]], note: str):
+        self._record_snapshot([event.event_id for event in upserts] + deleted_ids, total_events, note)
+        if sequences:
+            self.conn.executemany(
+                "INSERT INTO event_sequences (event_id, sequence) VALUES (?, ?) "
+                "ON CONFLICT(event_id) DO UPDATE SET sequence = excluded.sequence",
+                sequences.items()
+            )
+        self.conn.executemany(
+            "INSERT INTO events (event_id, subject, start_time, end_time, location, body_digest, "
+            "source, recurrence, series) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(event_id) DO UPDATE SET subject = excluded.subject, "
+            "start_time = excluded.start_time, end_time = excluded.end_time, "
+            "location = excluded.location, body_digest = excluded.body_digest, "
+            "source = excluded.source, recurrence = excluded.recurrence, series = excluded.series",
+            ((event.event_id, event.subject, event.start_text, event.end_text,
+              event.location or "", event.body_digest, event.source or "",
+              event.recurrence or "", event.series or "") for event in upserts)
+        )
+        self.conn.executemany("DELETE FROM events WHERE event_id = ?",
+                              ((event_id,) for event_id in deleted_ids))
+        self._set_meta('sync_date', datetime.now().isoformat())
+        self._set_meta('total_events', total_events)
+
+    def replace_events(self, events: Dict[str, Event], sequences: Optional[Dict[str, int]] = None):
+        """Replace the stored state with exactly these events"""
+        stored = {row[0] for row in self.conn.execute("SELECT event_id FROM events")}
+        self.apply_changes(events.values(), stored - events.keys(), len(events), sequences)
+
+    def _record_snapshot(self, touched_ids: List[str], total_events: int, note: str):
+        """Register the save about to happen, keeping the rows it overwrites to undo it"""
+        if self.keep_snapshots <= 0:
+            return
+        now = datetime.now().isoformat()
+        touched = list(dict.fromkeys(touched_ids))
+        if self.latest_snapshot() is None:
+            stored = self.count_events()
+            if not stored:
+                # Nothing before this save to roll back to: history starts here
+                self._insert_snapshot(now, total_events, len(touched), note)
+                return
+            # The state saved before history was kept becomes the oldest snapshot
+            self._insert_snapshot(self.get_meta('sync_date') or now, stored, 0, "")
+        snapshot_id = self._insert_snapshot(now, total_events, len(touched), note)
+        self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS touched (event_id TEXT PRIMARY KEY)")
+        self.conn.execute("DELETE FROM touched")
+        self.conn.executemany("INSERT INTO touched (event_id) VALUES (?)", ((event_id,) for event_id in touched))
+        self.conn.execute(
+            f"INSERT INTO snapshot_undo (snapshot_id, event_id, present, {EVENT_COLUMNS}) "
+            f"SELECT ?, t.event_id, e.event_id IS NOT NULL, {_event_columns('e')} "
+            "FROM touched t LEFT JOIN events e ON e.event_id = t.event_id",
+            (snapshot_id,)
+        )
+        oldest = self.conn.execute(
+            "SELECT snapshot_id FROM snapshots ORDER BY snapshot_id DESC LIMIT 1 OFFSET ?",
+            (self.keep_snapshots - 1,)
+        ).fetchone()
+        if oldest:
+            # The oldest kept snapshot needs no undo rows of its own, only those after it
+            self.conn.execute("DELETE FROM snapshots WHERE snapshot_id < ?", oldest)
+            self.conn.execute("DELETE FROM snapshot_undo WHERE snapshot_id <= ?", oldest)
+
+    def _insert_snapshot(self, saved_at: str, total_events: int, changes: int, note: str) -> int:
+        return self.conn.execute(
+            "INSERT INTO snapshots (saved_at, total_events, changes, note) VALUES (?, ?, ?, ?)",
+            (saved_at, total_events, changes, note)
+        ).lastrowid
+
+    def latest_snapshot(self) -> Optional[int]:
+        """ID of the snapshot matching the events table (None without history)"""
+        return self.conn.execute("SELECT MAX(snapshot_id) FROM snapshots").fetchone()[0]
+
+    def list_snapshots(self) -> List[Tuple[int, str, int, int, str]]:
+        """Retained snapshots, oldest first: (snapshot_id, saved_at, total_events, changes, note)"""
+        return self.conn.execute(
+            "SELECT snapshot_id, saved_at, total_events, changes, note FROM snapshots ORDER BY snapshot_id"
+        ).fetchall()
+
+    def load_snapshot(self, snapshot_id: int) -> Dict[str, Event]:
+        """Rebuild the events of a retained snapshot, keyed by event ID
+
+        Each event touched since then is taken from the undo row of the first
+        later save that touched it; everything else is as stored now.
+        """
+        if not self.conn.execute("SELECT 1 FROM snapshots WHERE snapshot_id = ?", (snapshot_id,)).fetchone():
+            raise KeyError(f"Snapshot {snapshot_id} is not retained")
+        events = self.load_events()
+        rows = self.conn.execute(
+            f"SELECT u.event_id, u.present, {_event_columns('u')} "
+            "FROM snapshot_undo u JOIN (SELECT event_id, MIN(snapshot_id) AS first FROM snapshot_undo "
+            "WHERE snapshot_id > ? GROUP BY event_id) f "
+            "ON u.snapshot_id = f.first AND u.event_id = f.event_id",
+            (snapshot_id,)
+        )
+        for event_id, present, subject, start, end, location, body_digest, source, recurrence, series in rows:
+            if present:
+                events[event_id] = Event.from_digest(subject, start, end, location, body_digest, source,
+                                                     recurrence, series)
+            else:
+                events.pop(event_id, None)
+        return events
+
+    def rollback(self, snapshot_id: int) -> Tuple[int, int]:
+        """Make a retained snapshot the stored state again; returns (restored, removed) counts
+
+        Recorded as a new snapshot, so a rollback can itself be rolled back. Sent
+        SEQUENCE numbers are kept, and the delivered fingerprint is cleared so the
+        next sync diffs against the restored events and sends what differs.
+        """
+        target = self.load_snapshot(snapshot_id)
+        current = self.load_events()
+        upserts = [event for event_id, event in target.items()
+                   if event_id not in current or changed_fields(current[event_id], event)]
+        deleted_ids = list(current.keys() - target.keys())
+        with self.conn:
+            self._apply(upserts, deleted_ids, len(target), None, f"rollback to {snapshot_id}")
+            self._set_meta('delivered_fingerprint', None)
+        return len(upserts), len(deleted_ids)
+
+    def migrate_from_json(self, json_file: str) -> bool:
+        """Import a legacy sync_history.json once, when the store is still empty"""
+        if not json_file or not os.path.exists(json_file):
+            return False
+        if self.get_meta('migrated_from') or self.count_events():
+            return False
+
+        try:
+            with open(json_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"Error reading legacy sync data {json_file}: {e}")
+            return False
+
+        events = {event_id: Event.from_dict(event)
+                  for event_id, event in data.get('events', {}).items()}
+        self.replace_events(events, data.get('sequences'))
+        with self.conn:
+            self._set_meta('migrated_from', os.path.abspath(json_file))
+            for key in ('sync_date', 'last_full_sync'):
+                if data.get(key):
+                    self._set_meta(key, data[key])
+        print(f"Migrated {len(events)} events from {json_file} to {self.db_path}")
+        return True
+
+class ExportCache:
+    """Per-item export cache keyed by Outlook EntryID (plus start for recurring occurrences)
+
+    Holds each item's LastModificationTime and extracted fields so unchanged items can
+    be exported without reading them from Outlook again. Lives in the sync state DB.
+    """
+
+    def __init__(self, store: SyncStateStore):
+        self.store = store
+        self.store.conn.executescript(EXPORT_CACHE_SCHEMA)
+
+    def load(self) -> Dict[str, Tuple[str, Event]]:
+        """Return {item_key: (last_modified, Event)}"""
+        rows = self.store.conn.execute(
+            "SELECT item_key, last_modified, subject, start_time, end_time, location, body "
+            "FROM export_cache"
+        )
+        return {
+            item_key: (last_modified, Event(subject, start, end, location, body))
+            for item_key, last_modified, subject, start, end, location, body in rows
+        }
+
+    @property
+    def body_limit(self) -> Optional[int]:
+        """Body character limit the cached bodies were cut to (0: metadata only)"""
+        value = self.store.get_meta('export_body_limit')
+        return None if value is None else int(value)
+
+    def save(self, updates: Dict[str, Tuple[str, Event]], removed_keys: Iterable[str],
+             body_limit: Optional[int] = None):
+        """Store re-read items and forget the ones no longer exported, in one transaction"""
+        conn = self.store.conn
+        with conn:
+            conn.executemany(
+                "INSERT INTO export_cache (item_key, last_modified, subject, start_time, end_time, "
+                "location, body) VALUES (?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(item_key) DO UPDATE SET last_modified = excluded.last_modified, "
+                "subject = excluded.subject, start_time = excluded.start_time, "
+                "end_time = excluded.end_time, location = excluded.location, body = excluded.body",
+                ((key, last_modified, event.subject, event.start_text, event.end_text,
+                  event.location or "", event.body or "")
+                 for key, (last_modified, event) in updates.items())
+            )
+            conn.executemany("DELETE FROM export_cache WHERE item_key = ?",
+                             ((key,) for key in removed_keys))
+            if body_limit is not None:
+                self.store._set_meta('export_body_limit', str(body_limit))
+
+class CalDAVState:
+    """Href and ETag of every event pushed to the CalDAV calendar, keyed by event ID"""
+
+    def __init__(self, store: SyncStateStore):
+        self.store = store
+        self.store.conn.executescript(CALDAV_SCHEMA)
+
+    def load(self) -> Dict[str, Tuple[str, Optional[str]]]:
+        """Return {event_id: (href, etag)}"""
+        rows = self.store.conn.execute("SELECT event_id, href, etag FROM caldav_resources")
+        return {event_id: (href, etag) for event_id, href, etag in rows}
+
+    def save(self, updates: Dict[str, Tuple[str, Optional[str]]], removed_ids: Iterable[str]):
+        conn = self.store.conn
+        with conn:
+            conn.executemany(
+                "INSERT INTO caldav_resources (event_id, href, etag) VALUES (?, ?, ?) "
+                "ON CONFLICT(event_id) DO UPDATE SET href = excluded.href, etag = excluded.etag",
+                ((event_id, href, etag) for event_id, (href, etag) in updates.items())
+            )
+            conn.executemany("DELETE FROM caldav_resources WHERE event_id = ?",
+                             ((event_id,) for event_id in removed_ids))
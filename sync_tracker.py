@@ -1,158 +1,235 @@
+import csv
 import json
 import os
 import hashlib
 from datetime import datetime
-from typing import Dict, List, Set, Tuple
+from typing import Dict, Iterable, List, Set, Tuple
+from calendar_event import Event, as_event
+from diff_engine import EventChange, changed_fields, diff_events
+from ics_writer import ICSWriter, open_ics
+from sync_state import KEEP_SNAPSHOTS, SyncStateStore
+
+SQLITE_SUFFIXES = ('.db', '.sqlite', '.sqlite3')
 
 class SyncTracker:
-    def __init__(self, tracking_file="sync_history.json"):
+    def __init__(self, tracking_file="sync_history.json", legacy_file="sync_history.json",
+                 keep_snapshots=KEEP_SNAPSHOTS):
         self.tracking_file = tracking_file
+        self.legacy_file = legacy_file  # JSON history migrated into the SQLite store on first use
         self.current_events = {}
         self.previous_events = {}
+        self.previous_loaded = False
+        self.sequences = {}  # Last ICS SEQUENCE sent per event ID
+        self.sequence_updates = {}
+        self.last_full_sync = None
+        self.full_sync = False  # Set when this run publishes a full snapshot
+        self.fingerprint = None  # content_fingerprint() of this run, stored on save
+        self.delivered_fingerprint = None  # Fingerprint of the last delivered calendar
+        self.state_store = None
+        self.snapshot_id = None  # Stored snapshot previous_events came from (SQLite store only)
+        # A .db/.sqlite tracking file selects the SQLite state store (which keeps rollback history)
+        if tracking_file.lower().endswith(SQLITE_SUFFIXES):
+            self.state_store = SyncStateStore(tracking_file, keep_snapshots)
         
     def load_previous_sync(self) -> Dict:
         """Load the previous sync data from file"""
+        if self.state_store is not None:
+            return self._load_previous_from_store()
         if os.path.exists(self.tracking_file):
             try:
                 with open(self.tracking_file, 'r', encoding='utf-8') as f:
                     data = json.load(f)
-                    self.previous_events = data.get('events', {})
+                    self.previous_events = {
+                        event_id: Event.from_dict(event)
+                        for event_id, event in data.get('events', {}).items()
+                    }
+                    self.sequences = data.get('sequences', {})
+                    self.last_full_sync = data.get('last_full_sync')
+                    self.delivered_fingerprint = data.get('delivered_fingerprint')
+                    self.previous_loaded = True
                     return data
             except Exception as e:
                 print(f"Error loading previous sync data: {e}")
                 return {}
         return {}
     
+    def _load_previous_from_store(self) -> Dict:
+        """Load the previous sync from SQLite, migrating the legacy JSON history first"""
+        try:
+            self.state_store.migrate_from_json(self.legacy_file)
+            self.previous_events = self.state_store.load_events()
+            self.sequences = self.state_store.load_sequences()
+            self.last_full_sync = self.state_store.get_meta('last_full_sync')
+            self.delivered_fingerprint = self.state_store.get_meta('delivered_fingerprint')
+            self.snapshot_id = self.state_store.latest_snapshot()
+            self.previous_loaded = True
+        except Exception as e:
+            print(f"Error loading previous sync data: {e}")
+            return {}
+        sync_date = self.state_store.get_meta('sync_date')
+        if sync_date is None:
+            return {}
+        return {'sync_date': sync_date, 'total_events': len(self.previous_events)}
+    
+    def baseline_changed(self) -> bool:
+        """True when the store has moved on since this tracker last read or wrote it (e.g. a rollback)"""
+        return self.state_store is not None and self.state_store.latest_snapshot() != self.snapshot_id
+    
     def generate_event_id(self, subject: str, start_time: str, end_time: str) -> str:
         """Generate a unique ID for an event based on its key properties"""
         # Create a hash of subject + start time + end time for unique identification
         event_string = f"{subject}|{start_time}|{end_time}"
         return hashlib.md5(event_string.encode('utf-8')).hexdigest()
     
-    def load_current_events(self, csv_file: str) -> Dict:
-        """Load current events from CSV export"""
-        import csv
+    def load_events(self, events: Iterable) -> Dict[str, Event]:
+        """Load current events from Events (or CSV-style dicts, converted on the fly)"""
+        self.current_events = {}
         
+        for event in events:
+            event = as_event(event)
+            self.current_events[event.event_id] = event
+            
+        return self.current_events
+    
+    def load_current_events(self, csv_file: str) -> Dict[str, Event]:
+        """Load current events from CSV export"""
         self.current_events = {}
         
         try:
             with open(csv_file, 'r', encoding='utf-8') as csvfile:
-                reader = csv.DictReader(csvfile)
-                for row in reader:
-                    event_id = self.generate_event_id(
-                        row['Subject'], 
-                        row['Start'], 
-                        row['End']
-                    )
-                    self.current_events[event_id] = {
-                        'subject': row['Subject'],
-                        'start': row['Start'],
-                        'end': row['End'],
-                        'location': row['Location'],
-                        'body': row['Body']
-                    }
+                self.load_events(Event.from_csv_row(row) for row in csv.DictReader(csvfile))
         except Exception as e:
             print(f"Error loading current events: {e}")
             
         return self.current_events
     
-    def find_changes(self) -> Tuple[List[str], List[str], List[str]]:
+    def find_changes(self) -> Tuple[List[str], List[str], List[EventChange]]:
         """
         Compare current events with previous events
-        Returns: (added_event_ids, deleted_event_ids, modified_event_ids)
+        Returns: (added_event_ids, deleted_event_ids, modified_events)
+        Each modified event is an EventChange(old_id, new_id, fields); old_id == new_id
+        when only the location or body changed.
         """
-        current_ids = set(self.current_events.keys())
-        previous_ids = set(self.previous_events.keys())
-        
-        # Find added events (in current but not in previous)
-        added = list(current_ids - previous_ids)
-        
-        # Find deleted events (in previous but not in current)
-        deleted = list(previous_ids - current_ids)
-        
-        # For modified events, we need to be smarter about matching
-        # Look for events with same subject but different start/end times
-        modified = []
-        subjects_current = {self.current_events[eid]['subject']: eid for eid in current_ids}
-        subjects_previous = {self.previous_events[eid]['subject']: eid for eid in previous_ids}
-        
-        # Find events with same subject that have different IDs (meaning time/date changed)
-        for subject in subjects_current:
-            if subject in subjects_previous:
-                current_id = subjects_current[subject]
-                previous_id = subjects_previous[subject]
-                
-                if current_id != previous_id:  # Same subject, different ID = modified
-                    # Remove from added/deleted lists since this is a modification
-                    if current_id in added:
-                        added.remove(current_id)
-                    if previous_id in deleted:
-                        deleted.remove(previous_id)
-                    
-                    # Add to modified list - we'll delete the old and add the new
-                    modified.append((previous_id, current_id))
-        
-        return added, deleted, modified
+        return diff_events(self.previous_events, self.current_events)
     
-    def save_current_sync(self):
-        """Save current sync data for next comparison"""
+    def content_fingerprint(self) -> str:
+        """Hash of the current event set, ignoring everything regenerated per run
+
+        Covers what the calendar shows (subject, times, source, location, body and
+        recurrence) but none of the DTSTAMP-style timestamps the ICS writer adds,
+        so an unchanged calendar always hashes the same.
+        """
+        digest = hashlib.sha256()
+        for event_id in sorted(self.current_events):
+            event = self.current_events[event_id]
+            digest.update(f"{event_id}\0{event.subject}\0{event.start_text}\0{event.end_text}\0"
+                          f"{event.location or ''}\0{event.body_digest}\0{event.recurrence}\n"
+                          .encode('utf-8'))
+        return digest.hexdigest()
+    
+    def bump_sequences(self, event_ids: Iterable[str]) -> Dict[str, int]:
+        """Assign the next ICS SEQUENCE to events being re-published or cancelled"""
+        for event_id in event_ids:
+            sequence = self.sequences.get(event_id, -1) + 1
+            self.sequences[event_id] = sequence
+            self.sequence_updates[event_id] = sequence
+        return self.sequences
+    
+    def needs_full_sync(self, resync_days: int) -> bool:
+        """True when no full snapshot was published within the last resync_days"""
+        if not self.previous_loaded or not self.previous_events or not self.last_full_sync:
+            return True
+        try:
+            last_full = datetime.fromisoformat(self.last_full_sync)
+        except ValueError:
+            return True
+        return (datetime.now() - last_full).days >= resync_days
+    
+    def save_current_sync(self) -> bool:
+        """Save current sync data for next comparison; returns False if it could not be saved"""
+        if self.state_store is not None:
+            return self._save_to_store()
+        sync_date = datetime.now().isoformat()
+        if self.full_sync:
+            self.last_full_sync = sync_date
         sync_data = {
-            'sync_date': datetime.now().isoformat(),
-            'events': self.current_events,
-            'total_events': len(self.current_events)
+            'sync_date': sync_date,
+            'events': {event_id: event.to_dict() for event_id, event in self.current_events.items()},
+            'total_events': len(self.current_events),
+            'sequences': self.sequences,
+            'last_full_sync': self.last_full_sync,
+            'delivered_fingerprint': self.fingerprint or self.delivered_fingerprint
         }
         
         try:
             with open(self.tracking_file, 'w', encoding='utf-8') as f:
                 json.dump(sync_data, f, indent=2, ensure_ascii=False)
             print(f"Sync tracking data saved to {self.tracking_file}")
+            if self.fingerprint:
+                self.delivered_fingerprint = self.fingerprint
+            return True
+        except Exception as e:
+            print(f"Error saving sync data: {e}")
+            return False
+    
+    def _save_to_store(self) -> bool:
+        """Write only the rows that changed since the previous sync"""
+        try:
+            if not self.previous_loaded:
+                self.state_store.replace_events(self.current_events, self.sequence_updates)
+            else:
+                previous = self.previous_events
+                upserts = [
+                    event for event_id, event in self.current_events.items()
+                    if event_id not in previous or changed_fields(previous[event_id], event)
+                ]
+                deleted_ids = previous.keys() - self.current_events.keys()
+                self.state_store.apply_changes(upserts, deleted_ids, len(self.current_events),
+                                               self.sequence_updates)
+            if self.full_sync:
+                self.last_full_sync = datetime.now().isoformat()
+                self.state_store.set_meta('last_full_sync', self.last_full_sync)
+            if self.fingerprint:
+                # Written after the events, so a crash in between only costs one redundant send
+                self.state_store.set_meta('delivered_fingerprint', self.fingerprint)
+                self.delivered_fingerprint = self.fingerprint
+            self.snapshot_id = self.state_store.latest_snapshot()
+            self.sequence_updates = {}
+            print(f"Sync tracking data saved to {self.tracking_file}")
+            return True
         except Exception as e:
             print(f"Error saving sync data: {e}")
+            return False
+    
+    def promote_current(self):
+        """After a successful save, make this run's events the baseline for the next one
+
+        Lets a long-running process diff the next run against memory instead of
+        reloading the state it just wrote.
+        """
+        self.previous_events = self.current_events
+        self.current_events = {}
+        self.previous_loaded = True
+        self.full_sync = False
+        self.fingerprint = None
     
     def generate_deletion_ics(self, deleted_event_ids: List[str], output_file: str):
         """Generate an ICS file with deletion commands for removed events"""
         if not deleted_event_ids:
             return
             
-        ics_content = []
-        ics_content.append("BEGIN:VCALENDAR")
-        ics_content.append("VERSION:2.0")
-        ics_content.append("PRODID:-//OutlookSync//Calendar Deletion//EN")
-        ics_content.append("CALSCALE:GREGORIAN")
-        ics_content.append("METHOD:CANCEL")  # This indicates event cancellation/deletion
-        ics_content.append("X-WR-CALNAME:Pete Work - Deletions")
-        
-        for event_id in deleted_event_ids:
-            if event_id in self.previous_events:
-                event = self.previous_events[event_id]
-                
-                # Create cancellation event
-                ics_content.append("BEGIN:VEVENT")
-                ics_content.append(f"UID:{event_id}@outlooksync.local")
-                ics_content.append(f"DTSTAMP:{datetime.now().strftime('%Y%m%dT%H%M%SZ')}")
-                ics_content.append("STATUS:CANCELLED")
-                ics_content.append(f"SUMMARY:{event['subject']}")
-                
-                # Convert datetime format for ICS
-                try:
-                    start_dt = datetime.fromisoformat(event['start'].replace('Z', '+00:00'))
-                    ics_content.append(f"DTSTART:{start_dt.strftime('%Y%m%dT%H%M%SZ')}")
-                    
-                    end_dt = datetime.fromisoformat(event['end'].replace('Z', '+00:00'))
-                    ics_content.append(f"DTEND:{end_dt.strftime('%Y%m%dT%H%M%SZ')}")
-                except:
-                    # Fallback for date format issues
-                    pass
-                
-                ics_content.append("END:VEVENT")
-        
-        ics_content.append("END:VCALENDAR")
-        
         # Save deletion ICS file
         deletion_file = output_file.replace('.ics', '_deletions.ics')
         try:
-            with open(deletion_file, 'w', encoding='utf-8') as f:
-                f.write('\n'.join(ics_content))
+            with open_ics(deletion_file) as f:
+                writer = ICSWriter(f, "Pete Work - Deletions", method="CANCEL",  # CANCEL = event deletion
+                                   prodid="-//OutlookSync//Calendar Deletion//EN")
+                writer.begin()
+                for event_id in deleted_event_ids:
+                    if event_id in self.previous_events:
+                        writer.write_cancellation(self.previous_events[event_id],
+                                                  self.sequences.get(event_id, 0))
+                writer.end()
             print(f"Deletion ICS file created: {deletion_file}")
             return deletion_file
         except Exception as e:
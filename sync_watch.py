@@ -0,0 +1,212 @@
+import argparse
+import os
+import sys
+import threading
+import time
+from config import load_config
+from calendar_sources import CalendarSource, OutlookSource, get_source
+from sync_daemon import SyncDaemon
+
+# Load environment variables
+load_config()
+
+# Quiet period after the last change before syncing, and the longest a burst of
+# changes may hold a sync back
+watch_debounce_seconds = float(os.getenv("WATCH_DEBOUNCE_SECONDS", 5))
+watch_max_delay_seconds = float(os.getenv("WATCH_MAX_DELAY_SECONDS", 30))
+
+POLL_SECONDS = 0.2  # How often COM messages are pumped and the debounce is checked
+
+class ChangeCollector:
+    """EntryIDs touched since the last sync, with debounce timing
+
+    Filled from Outlook's Items events; thread-safe so a fake emitter may fire
+    from any thread.
+    """
+
+    def __init__(self, debounce_seconds=None, max_delay_seconds=None, clock=time.monotonic):
+        self.debounce = watch_debounce_seconds if debounce_seconds is None else debounce_seconds
+        self.max_delay = watch_max_delay_seconds if max_delay_seconds is None else max_delay_seconds
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._entry_ids = set()
+        self._removed = False
+        self._first = None
+        self._last = None
+
+    def touch(self, entry_id):
+        with self._lock:
+            self._entry_ids.add(entry_id)
+            self._mark()
+
+    def removed(self):
+        with self._lock:
+            self._removed = True
+            self._mark()
+
+    def _mark(self):
+        now = self.clock()
+        if self._first is None:
+            self._first = now
+        self._last = now
+
+    def due(self) -> bool:
+        """True once changes have been quiet for the debounce period, or waited max_delay"""
+        with self._lock:
+            if self._first is None:
+                return False
+            now = self.clock()
+            return now - self._last >= self.debounce or now - self._first >= self.max_delay
+
+    def drain(self):
+        """Return (entry_ids, removed) collected so far and start a new batch"""
+        with self._lock:
+            batch = (self._entry_ids, self._removed)
+            self._entry_ids = set()
+            self._removed = False
+            self._first = self._last = None
+        return batch
+
+class ItemsEventHandler:
+    """Sink for a calendar folder's Items events, feeding a ChangeCollector"""
+
+    collector = None
+
+    def OnItemAdd(self, item):
+        self.collector.touch(item.EntryID)
+
+    def OnItemChange(self, item):
+        self.collector.touch(item.EntryID)
+
+    def OnItemRemove(self):
+        self.collector.removed()  # Outlook doesn't say which item was removed
+
+def subscribe(folder, collector):
+    """Route folder's Items events to collector
+
+    Returns the subscription; events stop once it is garbage collected, so keep it.
+    """
+    # win32com builds the sink instance itself, so the collector rides on the class
+    handler_class = type("CollectingItemsEventHandler", (ItemsEventHandler,), {"collector": collector})
+    if hasattr(folder, "subscribe"):  # fake_outlook folders emit events directly
+        handler = handler_class()
+        folder.subscribe(handler)
+        return handler
+    import win32com.client
+
+    return win32com.client.DispatchWithEvents(folder.Items, handler_class)
+
+def _message_pump():
+    """COM events are delivered while the subscribing thread pumps messages"""
+    try:
+        import pythoncom
+    except ImportError:
+        return None
+    return pythoncom.PumpWaitingMessages
+
+class ChangedItemsSource(CalendarSource):
+    """The watched Outlook source, re-reading only the items Outlook reported"""
+
+    def __init__(self, source: OutlookSource, entry_ids):
+        self.source = source
+        self.entry_ids = entry_ids
+        self.name = source.name
+
+    def prepare(self) -> bool:
+        return self.source.prepare()
+
+    def export(self, cache=None):
+        return self.source.export(cache=cache, entry_ids=self.entry_ids)
+
+class SyncWatcher(SyncDaemon):
+    """Sync when Outlook reports calendar changes instead of on a timer
+
+    Subscribes to the exported folders' Items events and collects the EntryIDs of
+    added and changed items. Once a burst has been quiet for WATCH_DEBOUNCE_SECONDS
+    the sync runs with only those items re-read from Outlook. Removals carry no
+    EntryID, so they trigger a normal incremental sync, as does the safety sync
+    every SYNC_INTERVAL_MINUTES that catches anything a notification missed.
+    """
+
+    def __init__(self, source=None, debounce_seconds=None, max_delay_seconds=None,
+                 interval_minutes=None, state_file=None):
+        super().__init__(source, interval_minutes, 0, state_file)
+        if not isinstance(self.source, OutlookSource):
+            raise ValueError(f"Watch mode needs an Outlook source, not {self.source.name}")
+        self.collector = ChangeCollector(debounce_seconds, max_delay_seconds)
+        self.subscriptions = []
+        self.subscribed_namespace = None
+        self.targeted_runs = 0
+        self.pump = _message_pump()
+
+    def ensure_subscribed(self):
+        """(Re)subscribe when there is no subscription or Outlook was reconnected"""
+        if self.subscriptions and self.source.namespace is self.subscribed_namespace:
+            return
+        if not self.source.prepare():
+            return
+        from export_outlook_calendar import get_export_folders
+
+        self.subscriptions = [subscribe(folder, self.collector)
+                              for folder in get_export_folders(self.source.namespace)]
+        self.subscribed_namespace = self.source.namespace
+        print(f"Watching {len(self.subscriptions)} calendar folder(s) for changes")
+
+    def sync_changes(self) -> bool:
+        entry_ids, removed = self.collector.drain()
+        if removed or not entry_ids:
+            print("Calendar items were removed, running an incremental sync")
+            return self.run_once()
+        print(f"{len(entry_ids)} calendar item(s) changed, syncing them")
+        self.targeted_runs += 1
+        return self.run_once(ChangedItemsSource(self.source, entry_ids))
+
+    def wait(self, seconds):
+        if self.pump is not None:
+            self.pump()
+        super().wait(seconds)
+
+    def run(self, max_runs=None):
+        """Full sync now, then sync on change notifications until stopped"""
+        print(f"Sync watcher started: debounce {self.collector.debounce:g}s "
+              f"(max {self.collector.max_delay:g}s), safety sync every {self.interval}")
+        next_full = time.monotonic()
+        try:
+            while not self.stop_event.is_set():
+                self.ensure_subscribed()
+                if self.collector.due():
+                    self.sync_changes()
+                elif time.monotonic() >= next_full:
+                    self.collector.drain()  # The full sync reads everything anyway
+                    self.run_once()
+                    next_full = time.monotonic() + self.interval.total_seconds()
+                else:
+                    self.wait(POLL_SECONDS)
+                    continue
+                if max_runs is not None and self.runs >= max_runs:
+                    break
+        finally:
+            self.subscriptions = []
+            self._drop_state()
+            print(f"Sync watcher stopped after {self.runs} runs ({self.targeted_runs} targeted, "
+                  f"{self.failures} failed)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Sync the calendar whenever Outlook reports a change")
+    parser.add_argument("--debounce", type=float, help="Quiet seconds before syncing (WATCH_DEBOUNCE_SECONDS)")
+    parser.add_argument("--max-delay", type=float, help="Longest seconds a burst may delay a sync "
+                                                        "(WATCH_MAX_DELAY_SECONDS)")
+    parser.add_argument("--interval", type=float, help="Minutes between safety syncs (SYNC_INTERVAL_MINUTES)")
+    args = parser.parse_args()
+
+    watcher = SyncWatcher(get_source(), args.debounce, args.max_delay, args.interval)
+    watcher.install_signal_handlers()
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        print("Sync watcher interrupted")
+        return 1
+    return 1 if watcher.failures and watcher.failures == watcher.runs else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+import pytest
+from caldav_sink import CalDAVClient, CalDAVSink
+from calendar_event import Event
+from fake_caldav import FakeCalDAVServer
+
+@pytest.fixture
+def server():
+    with FakeCalDAVServer() as server:
+        yield server
+
+def make_sink(server, resources=None):
+    return CalDAVSink(CalDAVClient(server.url, connections=2), resources, workers=2)
+
+def meeting(subject="Planning"):
+    return Event(subject, "2025-03-03 10:00:00", "2025-03-03 11:00:00", location="Room 1")
+
+def test_push_creates_and_records_etags(server):
+    event = meeting()
+    sink = make_sink(server)
+    assert sink.push([(event, 0, ())], [])
+    href, etag = sink.updates[event.event_id]
+    assert server.resources[href][0] == etag
+    assert b"SUMMARY:Planning" in server.resources[href][1]
+    assert sink.stats['put'] == 1 and sink.stats['conflicts'] == 0
+
+def test_update_over_a_server_edit_is_reported_not_overwritten(server):
+    event = meeting()
+    first = make_sink(server)
+    first.push([(event, 0, ())], [])
+    href, etag = first.updates[event.event_id]
+    server.edit(href, b"BEGIN:VCALENDAR\r\nEDITED\r\nEND:VCALENDAR\r\n")
+
+    sink = make_sink(server, first.updates)
+    assert sink.push([(event, 1, ())], [])
+    assert server.resources[href][1].startswith(b"BEGIN:VCALENDAR\r\nEDITED")
+    assert sink.stats == {'put': 0, 'deleted': 0, 'conflicts': 1, 'failed': 0, 'bytes': 0}
+    assert sink.conflicts == [('put', event.event_id, href)]
+    # The server's ETag is adopted, so the next change made in Outlook goes through
+    assert sink.updates[event.event_id] == (href, server.resources[href][0])
+    assert [request for request in server.requests if request[0] == "PUT"][-1][2] == 412
+
+    later = make_sink(server, sink.updates)
+    assert later.push([(event, 2, ())], [])
+    assert later.stats['put'] == 1 and later.stats['conflicts'] == 0
+    assert b"SUMMARY:Planning" in server.resources[href][1]
+
+def test_existing_resource_is_not_replaced_by_a_new_event(server):
+    event = meeting()
+    href = CalDAVSink.href(event)
+    server.edit(href, b"THEIRS")
+    sink = make_sink(server)
+    assert sink.push([(event, 0, ())], [])
+    assert server.resources[href][1] == b"THEIRS"
+    assert sink.stats['conflicts'] == 1
+
+def test_update_of_a_resource_deleted_on_the_server_recreates_it(server):
+    event = meeting()
+    first = make_sink(server)
+    first.push([(event, 0, ())], [])
+    href, _ = first.updates[event.event_id]
+    del server.resources[href]
+
+    sink = make_sink(server, first.updates)
+    assert sink.push([(event, 1, ())], [])
+    assert sink.stats['put'] == 1 and sink.stats['conflicts'] == 0
+    assert sink.updates[event.event_id] == (href, server.resources[href][0])
+
+def test_delete_of_an_edited_resource_keeps_it_and_stops_tracking(server):
+    kept, removed = meeting("Kept"), meeting("Removed")
+    first = make_sink(server)
+    first.push([(kept, 0, ()), (removed, 0, ())], [])
+    kept_href = first.updates[kept.event_id][0]
+    server.edit(kept_href, b"EDITED")
+
+    sink = make_sink(server, first.updates)
+    assert sink.push([], [(kept.event_id, kept), (removed.event_id, removed)])
+    assert server.resources == {kept_href: server.resources[kept_href]}
+    assert sink.stats['deleted'] == 1 and sink.stats['conflicts'] == 1
+    assert sink.conflicts == [('deleted', kept.event_id, kept_href)]
+    assert sink.removed == {kept.event_id, removed.event_id}
+
+def test_untracked_event_is_deleted_only_over_a_fetched_etag(server):
+    event, absent = meeting(), meeting("Offsite")
+    href = CalDAVSink.href(event)
+    server.edit(href, b"BEGIN:VCALENDAR\r\nEND:VCALENDAR\r\n")
+    sink = make_sink(server)
+    assert sink.push([], [(event.event_id, event), (absent.event_id, absent)])
+    assert href not in server.resources
+    assert sorted(server.requests) == sorted([("GET", href, 200), ("DELETE", href, 204),
+                                              ("GET", CalDAVSink.href(absent), 404)])
+    assert sink.removed == {event.event_id, absent.event_id}
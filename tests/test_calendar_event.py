@@ -0,0 +1,51 @@
+from datetime import datetime
+import pytest
+import calendar_event
+from calendar_event import DateParser, Event, _match_format
+
+def test_event_id_follows_fields_assigned_after_construction():
+    event = Event("Planning", "2025-03-03 09:00:00", "2025-03-03 10:00:00")
+    untagged = event.event_id
+    assert event.event_id == untagged
+    event.source = "Work"
+    tagged = event.event_id
+    assert tagged != untagged
+    assert tagged == Event("Planning", "2025-03-03 09:00:00", "2025-03-03 10:00:00", source="Work").event_id
+    event.subject = "Planning (moved)"
+    assert event.event_id not in (untagged, tagged)
+    event.series, event.recurrence = "master", "RECURRENCE-ID:20250303T090000"
+    assert event.event_id == Event("Other", "", "", series="master",
+                                   recurrence="RECURRENCE-ID:20250303T090000").event_id
+
+def test_events_compare_by_value_but_are_not_hashable():
+    first = Event("Planning", "2025-03-03 09:00:00", "2025-03-03 10:00:00", "Room 1")
+    assert first == Event("Planning", "2025-03-03 09:00:00", "2025-03-03 10:00:00", "Room 1")
+    with pytest.raises(TypeError):
+        hash(first)
+
+@pytest.mark.parametrize("values", [
+    ["2025-03-03 09:00:00", "2025-12-31 23:59:59", "2025-03-03T09:00:00"],
+    ["2025-03-03T09:00:00+01:00", "2025-03-03T09:00:00-05:30", "2025-03-03 09:00:00+00:00"],
+    ["3/3/2025 9:00:00 AM", "12/31/2025 12:00:00 PM", "1/1/2025 12:30:00 AM", "07/04/2025 11:59:59 pm"],
+])
+def test_fast_path_agrees_with_the_format_list(values):
+    parser = DateParser()
+    assert [parser.parse(value) for value in values] == [_match_format(value)[0] for value in values]
+    assert parser._fast is not None
+
+def test_value_in_another_format_falls_back_to_the_format_list():
+    parser = DateParser()
+    parser.parse("3/3/2025 9:00:00 AM")
+    assert parser.parse("2025-03-04 10:00:00") == datetime(2025, 3, 4, 10)
+    assert parser.format == "%m/%d/%Y %I:%M:%S %p"  # The learned format stays
+    with pytest.raises(ValueError):
+        parser.parse("13/45/2025 9:00:00 AM")
+
+def test_parse_cache_is_cleared_when_full(monkeypatch):
+    monkeypatch.setattr(calendar_event, "PARSE_CACHE_SIZE", 3)
+    parser = DateParser()
+    for hour in range(10):
+        value = f"2025-03-03 {hour:02d}:00:00"
+        assert parser.parse(value) == datetime(2025, 3, 3, hour)
+        assert len(parser._cache) <= 3
+    assert value in parser._cache
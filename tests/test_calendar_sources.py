@@ -0,0 +1,23 @@
+from calendar_sources import iter_ics_events
+
+def write_ics(path, *lines):
+    path.write_bytes(("\r\n".join(("BEGIN:VCALENDAR", "VERSION:2.0") + lines + ("END:VCALENDAR", "")))
+                     .encode("utf-8"))
+    return str(path)
+
+def test_alarm_properties_do_not_replace_the_events_own(tmp_path):
+    path = write_ics(tmp_path / "calendar.ics",
+                     "BEGIN:VEVENT", "UID:1", "SUMMARY:Budget review", "DTSTART:20250303T100000",
+                     "BEGIN:VALARM", "ACTION:DISPLAY", "DESCRIPTION:Reminder", "SUMMARY:Alarm",
+                     "STATUS:CANCELLED", "TRIGGER:-PT15M", "END:VALARM",
+                     "DTEND:20250303T110000", "DESCRIPTION:Numbers for Q3\\, draft", "END:VEVENT")
+    [event] = iter_ics_events(path)
+    assert (event.subject, event.body) == ("Budget review", "Numbers for Q3, draft")
+    assert (event.start_text, event.end_text) == ("2025-03-03 10:00:00", "2025-03-03 11:00:00")
+
+def test_stray_end_and_cancelled_events_are_skipped(tmp_path):
+    path = write_ics(tmp_path / "calendar.ics",
+                     "END:VEVENT",
+                     "BEGIN:VEVENT", "SUMMARY:Gone", "DTSTART:20250303T100000", "STATUS:CANCELLED", "END:VEVENT",
+                     "BEGIN:VEVENT", "SUMMARY:Kept", "DTSTART:20250304T100000", "END:VEVENT")
+    assert [event.subject for event in iter_ics_events(path)] == ["Kept"]
@@ -0,0 +1,53 @@
+from calendar_event import Event
+from diff_engine import EventChange, diff_events
+
+def events(*items):
+    return {event.event_id: event for event in items}
+
+def meeting(subject, start, end, location="Room 1", body="Agenda"):
+    return Event(subject, start, end, location, body)
+
+def test_unchanged_calendar_has_no_changes():
+    calendar = events(meeting("Standup", "2025-03-03 09:00:00", "2025-03-03 09:15:00"))
+    assert diff_events(calendar, dict(calendar)) == ([], [], [])
+
+def test_location_and_body_edits_keep_the_event_id():
+    old = meeting("Review", "2025-03-03 10:00:00", "2025-03-03 11:00:00")
+    new = meeting("Review", "2025-03-03 10:00:00", "2025-03-03 11:00:00", "Room 2", "New agenda")
+    added, deleted, modified = diff_events(events(old), events(new))
+    assert (added, deleted) == ([], [])
+    assert modified == [EventChange(old.event_id, old.event_id, ('location', 'body'))]
+
+def test_moved_event_is_paired_with_its_new_time():
+    old = meeting("Review", "2025-03-03 10:00:00", "2025-03-03 11:00:00")
+    new = meeting("Review", "2025-03-04 14:00:00", "2025-03-04 15:00:00")
+    assert diff_events(events(old), events(new)) == ([], [], [EventChange(old.event_id, new.event_id, ('time',))])
+
+def test_repeated_subjects_each_find_their_counterpart():
+    days = range(3, 8)
+    old = [meeting("Weekly sync", f"2025-03-{day:02d} 10:00:00", f"2025-03-{day:02d} 10:30:00") for day in days]
+    new = [meeting("Weekly sync", f"2025-03-{day:02d} 11:00:00", f"2025-03-{day:02d} 11:30:00") for day in days]
+    added, deleted, modified = diff_events(events(*old), events(*new))
+    assert (added, deleted) == ([], [])
+    assert sorted((change.old_id, change.new_id) for change in modified) == \
+        sorted((before.event_id, after.event_id) for before, after in zip(old, new))
+
+def test_unrelated_events_are_added_and_deleted():
+    gone = meeting("Offsite", "2025-03-03 09:00:00", "2025-03-03 17:00:00")
+    came = meeting("Planning", "2025-03-05 09:00:00", "2025-03-05 10:00:00")
+    assert diff_events(events(gone), events(came)) == ([came.event_id], [gone.event_id], [])
+
+def test_naive_and_aware_starts_are_ranked_together():
+    old = [meeting("Review", "2025-03-05T10:00:00+01:00", "2025-03-05T11:00:00+01:00"),
+           meeting("Review", "2025-03-03 10:00:00", "2025-03-03 11:00:00")]
+    new = [meeting("Review", "2025-03-12T10:00:00+01:00", "2025-03-12T11:00:00+01:00"),
+           meeting("Review", "2025-03-10 10:00:00", "2025-03-10 11:00:00")]
+    added, deleted, modified = diff_events(events(*old), events(*new))
+    assert (added, deleted) == ([], [])
+    assert sorted((change.old_id, change.new_id) for change in modified) == \
+        sorted((before.event_id, after.event_id) for before, after in zip(old, new))
+
+def test_events_only_pair_within_their_source():
+    old = Event("Review", "2025-03-03 10:00:00", "2025-03-03 11:00:00", source="team")
+    new = Event("Review", "2025-03-03 12:00:00", "2025-03-03 13:00:00", source="rooms")
+    assert diff_events(events(old), events(new)) == ([new.event_id], [old.event_id], [])
@@ -0,0 +1,44 @@
+import smtplib
+from email.message import EmailMessage
+import pytest
+from email_icloud import SMTPSession
+from fake_smtp import FakeSMTPServer
+
+@pytest.fixture
+def server():
+    with FakeSMTPServer(user="me@example.com", password="secret") as server:
+        yield server
+
+def session_for(server, password="secret"):
+    return SMTPSession(server.host, server.port, "me@example.com", password, timeout=5, security="none")
+
+def message(number):
+    msg = EmailMessage()
+    msg["From"], msg["To"], msg["Subject"] = "me@example.com", "me@icloud.com", f"Calendar {number}"
+    msg.set_content("See attachment")
+    return msg
+
+def test_messages_share_one_connection_and_login(server):
+    with session_for(server) as session:
+        for number in range(3):
+            session.send(message(number))
+    assert [msg["Subject"] for msg in server.messages] == ["Calendar 0", "Calendar 1", "Calendar 2"]
+    assert (server.connections, server.logins) == (1, 1)
+    assert (session.connects, session.messages_sent) == (1, 3)
+
+def test_dropped_connection_is_reopened_once(server):
+    with session_for(server) as session:
+        session.send(message(0))
+        server.drop_connections()
+        session.send(message(1))
+        session.send(message(2))
+    assert len(server.messages) == 3
+    assert (server.connections, server.logins) == (2, 2)
+    assert session.connects == 2
+
+def test_rejected_login_is_not_retried(server):
+    session = session_for(server, password="wrong")
+    with pytest.raises(smtplib.SMTPAuthenticationError):
+        session.send(message(0))
+    assert session.server is None and session.connects == 0
+    assert (server.connections, server.logins, server.messages) == (1, 0, [])
@@ -0,0 +1,68 @@
+from datetime import datetime, timedelta
+import pytest
+from export_engine import OutlookExportEngine, get_export_window
+from fake_outlook import build_sample_namespace
+from sync_state import ExportCache, SyncStateStore
+
+START = datetime(2025, 3, 3, 9)
+WINDOW = (START - timedelta(weeks=2), START + timedelta(weeks=12))
+
+@pytest.fixture
+def namespace():
+    return build_sample_namespace(single_events=200, recurring_series=3, days=120, history_years=1,
+                                  start=START)
+
+@pytest.fixture
+def cache(tmp_path):
+    store = SyncStateStore(str(tmp_path / "state.db"))
+    yield ExportCache(store)
+    store.close()
+
+def export(namespace, cache=None, recurrence="expand"):
+    engine = OutlookExportEngine(namespace.calendar, namespace, cache=cache, recurrence=recurrence)
+    return engine, engine.export(*WINDOW)
+
+def single_in_window(namespace):
+    return next(item for item in namespace.calendar._appointments
+                if not item.get_property('IsRecurring') and WINDOW[0] <= item.get_property('Start') < WINDOW[1])
+
+def test_export_reads_only_the_window_in_start_order(namespace):
+    _, events = export(namespace)
+    window_start, window_end = get_export_window(*WINDOW)
+    starts = [event.start for event in events]
+    assert starts == sorted(starts)
+    assert all(window_start <= start < window_end for start in starts)
+    singles = [event for event in events if event.subject.startswith("Meeting")]
+    weekly = [event for event in events if event.subject.startswith("Weekly sync")]
+    assert singles and weekly
+    number = singles[0].subject.split()[1]
+    assert singles[0].body.split() == f"Agenda for meeting {number} Details follow.".split()
+
+def test_rrule_mode_exports_one_master_per_series(namespace):
+    _, events = export(namespace, recurrence="rrule")
+    masters = [event for event in events if event.recurrence.startswith("RRULE:")]
+    assert len(masters) == 3
+    assert all("FREQ=WEEKLY" in master.recurrence for master in masters)
+    assert namespace.counter.pattern_reads == 3  # One GetRecurrencePattern() per series
+
+def test_cached_export_rereads_only_modified_items(namespace, cache):
+    _, first = export(namespace, cache)
+    engine, second = export(namespace, cache)
+    assert [event.event_id for event in second] == [event.event_id for event in first]
+    assert engine.stats['body_reads'] == 0 and engine.stats['cache_hits'] > 0
+
+    item = single_in_window(namespace)
+    namespace.calendar.change(item, Location="Board room")
+    engine, third = export(namespace, cache)
+    assert engine.stats['body_reads'] == 1
+    assert [event.location for event in third if event.subject == item.get_property('Subject')] == ["Board room"]
+
+def test_export_items_rereads_just_the_reported_items(namespace, cache):
+    export(namespace, cache)
+    item = single_in_window(namespace)
+    namespace.calendar.change(item, Subject="Moved meeting")
+    engine = OutlookExportEngine(namespace.calendar, namespace, cache=cache)
+    events = engine.export_items([item.get_property('EntryID')], *WINDOW)
+    _, full = export(namespace)
+    assert sorted(event.event_id for event in events) == sorted(event.event_id for event in full)
+    assert engine.stats['body_reads'] == 1
@@ -0,0 +1,73 @@
+from datetime import datetime, timedelta
+import pytest
+import export_outlook_calendar
+import fake_outlook
+from export_outlook_calendar import export_source, export_sources
+from fake_outlook import build_sample_namespace
+from sync_state import ExportCache, SyncStateStore
+
+START = datetime(2025, 3, 3, 9)
+WINDOW = (START - timedelta(weeks=2), START + timedelta(weeks=8))
+SOURCES = ["default", "team@example.com"]
+
+@pytest.fixture
+def namespaces():
+    own = build_sample_namespace(single_events=60, recurring_series=2, days=60, history_years=0, start=START)
+    team = build_sample_namespace(single_events=30, recurring_series=1, days=60, history_years=0, start=START)
+    own.shared_calendars["team@example.com"] = team.calendar
+    return own, team
+
+@pytest.fixture
+def cache(tmp_path):
+    store = SyncStateStore(str(tmp_path / "state.db"))
+    yield ExportCache(store)
+    store.close()
+
+def property_reads(namespaces):
+    reads = [namespace.counter.property_reads for namespace in namespaces]
+    for namespace in namespaces:
+        namespace.counter.property_reads = 0
+    return reads
+
+def test_sources_share_one_export_cache(namespaces, cache):
+    own, team = namespaces
+    first = export_sources(SOURCES, *WINDOW, namespace_factory=lambda: own, cache=cache)
+    first_reads = property_reads(namespaces)
+    assert {event.source for event in first} == set(SOURCES)
+    assert len({event.event_id for event in first}) == len(first)  # "Meeting 0" on both keeps two IDs
+    starts = [event.start for event in first]
+    assert starts == sorted(starts)
+    assert {key.split("|")[0] for key in cache.load()} == set(SOURCES)
+
+    second = export_sources(SOURCES, *WINDOW, namespace_factory=lambda: own, cache=cache)
+    second_reads = property_reads(namespaces)
+    assert [event.event_id for event in second] == [event.event_id for event in first]
+    assert [event.body for event in second] == [event.body for event in first]
+    assert all(now < before for now, before in zip(second_reads, first_reads))  # Bodies came from the cache
+
+@pytest.fixture
+def body_reads(monkeypatch):
+    """Names of the appointments whose Body was fetched"""
+    reads = []
+    read = fake_outlook.FakeAppointment.__getattr__
+    def counting_read(item, name):
+        if name == "Body":
+            reads.append(item.get_property("Subject"))
+        return read(item, name)
+    monkeypatch.setattr(fake_outlook.FakeAppointment, "__getattr__", counting_read)
+    return reads
+
+@pytest.mark.parametrize("engine, recurrence", [("table", "expand"), ("table", "rrule"), ("items", "expand")])
+def test_body_mode_none_never_fetches_a_body(namespaces, cache, body_reads, monkeypatch, engine, recurrence):
+    own, _ = namespaces
+    monkeypatch.setattr(export_outlook_calendar, "export_engine", engine)
+    monkeypatch.setattr(export_outlook_calendar, "export_recurrence", recurrence)
+    monkeypatch.setattr(export_outlook_calendar, "export_body_limit", 0)
+    events = export_source("default", *WINDOW, namespace_factory=lambda: own,
+                           cache=cache if engine == "table" else None)
+    assert events and all(event.body == "" for event in events)
+    assert body_reads == []
+
+    monkeypatch.setattr(export_outlook_calendar, "export_body_limit", 200)
+    events = export_source("default", *WINDOW, namespace_factory=lambda: own)
+    assert body_reads and all(event.body for event in events)
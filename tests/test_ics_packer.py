@@ -0,0 +1,59 @@
+import re
+from calendar_event import Event
+from ics_packer import pack_sizes, split_ics
+from ics_writer import ICSWriter, open_ics
+
+def write_calendar(path, events):
+    with open_ics(str(path)) as f:
+        writer = ICSWriter(f, "Work")
+        writer.begin()
+        for event in events:
+            writer.write_event(event)
+        writer.end()
+
+def uids(path):
+    return re.findall(r"^UID:(.*)\r$", path.read_bytes().decode("utf-8"), re.M)
+
+def sample_events(count):
+    return [Event(f"Meeting {index}", f"2025-03-{1 + index % 28:02d} 09:00:00",
+                  f"2025-03-{1 + index % 28:02d} 10:00:00", body="Agenda " * (index % 50))
+            for index in range(count)]
+
+def test_pack_sizes_places_every_item_once_within_capacity():
+    sizes = [70, 10, 40, 30, 60, 20, 50, 90, 5]
+    bins = pack_sizes(sizes, 100)
+    assert sorted(index for bin_ in bins for index in bin_) == list(range(len(sizes)))
+    assert all(sum(sizes[index] for index in bin_) <= 100 for bin_ in bins)
+    assert len(bins) == 4  # 375 in all: 90+10, 70+30, 60+40, 50+20+5
+
+def test_small_file_is_left_alone(tmp_path):
+    path = tmp_path / "calendar.ics"
+    write_calendar(path, sample_events(3))
+    assert split_ics(str(path), 1_000_000) == [str(path)]
+
+def test_parts_fit_the_budget_and_keep_every_event(tmp_path):
+    path = tmp_path / "calendar.ics"
+    write_calendar(path, sample_events(200))
+    assert len(uids(path)) == 200
+    budget = path.stat().st_size // 4
+    parts = split_ics(str(path), budget)
+    assert len(parts) >= 4
+    header = path.read_bytes().split(b"BEGIN:VEVENT")[0]
+    for part in parts:
+        data = open(part, "rb").read()
+        assert len(data) <= budget
+        assert data.startswith(header) and data.endswith(b"END:VCALENDAR\r\n")
+    assert sorted(uid for part in parts for uid in uids(tmp_path / part)) == sorted(uids(path))
+
+def test_series_overrides_stay_with_their_master(tmp_path):
+    master = Event("Weekly sync", "2025-03-03 10:00:00", "2025-03-03 10:30:00",
+                   recurrence="RRULE:FREQ=WEEKLY;BYDAY=MO")
+    overrides = [Event("Weekly sync", f"2025-03-{day:02d} 11:00:00", f"2025-03-{day:02d} 11:30:00",
+                       recurrence=f"RECURRENCE-ID:202503{day:02d}T100000", series=master.event_id)
+                 for day in (10, 17, 24)]
+    path = tmp_path / "calendar.ics"
+    write_calendar(path, sample_events(60) + [master] + overrides)
+    parts = split_ics(str(path), path.stat().st_size // 3)
+    holding = [part for part in parts if master.uid in uids(tmp_path / part)]
+    assert len(holding) == 1
+    assert uids(tmp_path / holding[0]).count(master.uid) == 4
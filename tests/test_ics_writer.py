@@ -0,0 +1,57 @@
+import io
+from datetime import datetime, timezone
+from calendar_event import Event
+from calendar_sources import iter_ics_events
+from ics_writer import ICSWriter, escape_text, fold_line
+
+def octets(line):
+    return len(line.encode("utf-8"))
+
+def unfold(text):
+    return text.replace("\r\n ", "")
+
+def test_escape_text():
+    assert escape_text("a,b;c\\d") == r"a\,b\;c\\d"
+    assert escape_text("one\r\ntwo\nthree\rfour") == "one\\ntwo\\nthreefour"
+
+def test_short_line_is_not_folded():
+    assert fold_line("SUMMARY:Standup") == "SUMMARY:Standup\r\n"
+
+def test_ascii_line_folds_at_75_octets():
+    line = "DESCRIPTION:" + "x" * 300
+    folded = fold_line(line)
+    assert all(octets(part) <= 75 for part in folded.split("\r\n"))
+    assert unfold(folded) == line + "\r\n"
+
+def test_folding_never_splits_a_utf8_character():
+    line = "SUMMARY:" + "Überprüfung 📅 " * 20
+    folded = fold_line(line)
+    parts = folded.split("\r\n")[:-1]
+    assert all(octets(part) <= 75 for part in parts)
+    assert all(part.startswith(" ") for part in parts[1:])
+    assert unfold(folded) == line + "\r\n"
+
+def write(*events, method="PUBLISH"):
+    buffer = io.StringIO()
+    writer = ICSWriter(buffer, "Work", method=method, dtstamp=datetime(2025, 1, 1, tzinfo=timezone.utc))
+    writer.begin()
+    for event in events:
+        writer.write_event(event, 0)
+    writer.end()
+    return buffer.getvalue()
+
+def test_written_events_read_back_unchanged(tmp_path):
+    event = Event("Budget; Q3, draft", "2025-03-03 10:00:00", "2025-03-03 11:30:00",
+                  "Room 1, 2nd floor", "Line one\r\nLine two: a\\b " + "long " * 40)
+    path = tmp_path / "out.ics"
+    path.write_text(write(event), encoding="utf-8", newline="")
+    [parsed] = iter_ics_events(str(path))
+    assert (parsed.subject, parsed.location) == (event.subject, event.location)
+    assert parsed.body == event.body.replace("\r\n", "\n")
+    assert (parsed.start, parsed.end) == (event.start, event.end)
+
+def test_every_line_ends_in_crlf():
+    text = write(Event("Standup", "2025-03-03 09:00:00", "2025-03-03 09:15:00"))
+    assert text.startswith("BEGIN:VCALENDAR\r\n") and text.endswith("END:VCALENDAR\r\n")
+    assert "\n" not in text.replace("\r\n", "")
+    assert "METHOD:PUBLISH\r\n" in text and "DTSTAMP:20250101T000000Z\r\n" in text
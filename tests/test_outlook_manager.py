@@ -0,0 +1,72 @@
+import io
+import pytest
+import outlook_manager
+from outlook_manager import OutlookManager
+
+class FakeClock:
+    """Stands in for the time module so waits take no wall-clock time"""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(outlook_manager, "time", clock)
+    return clock
+
+def failing_probe(failures):
+    calls = []
+    def probe():
+        calls.append(1)
+        if len(calls) <= failures:
+            raise RuntimeError("Outlook is still starting")
+        return "namespace"
+    return probe, calls
+
+def test_probe_backs_off_from_a_tenth_of_a_second_up_to_two(clock):
+    manager = OutlookManager(start_timeout=30)
+    manager.probe_outlook_com, calls = failing_probe(7)
+    assert manager.wait_for_outlook_com()
+    assert len(calls) == 8
+    assert clock.sleeps == pytest.approx([0.1, 0.2, 0.4, 0.8, 1.6, 2.0, 2.0])
+    assert manager.namespace == "namespace"
+
+def test_running_outlook_is_picked_up_without_waiting(clock):
+    manager = OutlookManager()
+    manager.probe_outlook_com, calls = failing_probe(0)
+    assert manager.wait_for_outlook_com()
+    assert clock.sleeps == []
+
+def test_probe_gives_up_at_the_timeout(clock):
+    manager = OutlookManager()
+    manager.probe_outlook_com, calls = failing_probe(1000)
+    assert not manager.wait_for_outlook_com(timeout=5)
+    assert clock.now == pytest.approx(5)
+    assert max(clock.sleeps) <= outlook_manager.PROBE_MAX_DELAY
+
+@pytest.mark.parametrize("policy, expected", [("ask", True), ("continue", True), ("abort", False)])
+def test_unattended_runs_only_stop_on_an_explicit_abort(monkeypatch, policy, expected):
+    monkeypatch.setattr("sys.stdin", io.StringIO(""))  # Not a console
+    monkeypatch.setattr("builtins.input", lambda prompt: pytest.fail("unattended run prompted"))
+    assert OutlookManager(new_outlook_policy=policy).continue_despite_new_outlook() is expected
+
+def test_ask_prompts_from_a_console(monkeypatch):
+    stdin = io.StringIO("")
+    stdin.isatty = lambda: True
+    monkeypatch.setattr("sys.stdin", stdin)
+    monkeypatch.setattr("builtins.input", lambda prompt: "n")
+    assert not OutlookManager(new_outlook_policy="ask").continue_despite_new_outlook()
+
+def test_only_new_outlook_counts_as_new():
+    assert outlook_manager._is_new_outlook("olk.exe", r"C:\Program Files\WindowsApps\olk.exe")
+    assert outlook_manager._is_new_outlook("outlook.exe", r"C:\Program Files\WindowsApps\Microsoft.OutlookForWindows\outlook.exe")
+    assert not outlook_manager._is_new_outlook("outlook.exe", r"C:\Program Files\Microsoft Office\root\Office16\OUTLOOK.EXE")
@@ -0,0 +1,62 @@
+import json
+import smtplib
+import socket
+import pytest
+from run_report import RunReport, error_category
+
+def failed_run():
+    report = RunReport("default")
+    with report.stage("export") as stage:
+        stage.items = 42
+    report.counts = {"added": 3, "deleted": 1, "modified": 2}
+    with pytest.raises(ConnectionResetError):
+        with report.stage("email"):
+            raise ConnectionResetError("Connection reset by peer")
+    report.finish(False)
+    return report
+
+def test_json_report_names_the_failed_stage(tmp_path):
+    path = tmp_path / "reports" / "last_run.json"
+    failed_run().save(str(path))
+    data = json.loads(path.read_text(encoding="utf-8"))
+    assert (data["source"], data["success"]) == ("default", False)
+    assert (data["failed_stage"], data["error"]) == ("email", "connection")
+    assert data["counts"] == {"added": 3, "deleted": 1, "modified": 2}
+    export, email = data["stages"]
+    assert export["name"] == "export" and export["status"] == "ok" and export["items"] == 42
+    assert "error" not in export and "bytes" not in export
+    assert email == {"name": "email", "seconds": email["seconds"], "status": "error",
+                     "error": "connection", "message": "Connection reset by peer"}
+
+def test_prometheus_text_has_a_sample_per_stage_and_the_error(tmp_path):
+    path = tmp_path / "outlook_sync.prom"
+    failed_run().save(None, str(path))
+    samples = dict(line.rsplit(" ", 1) for line in path.read_text(encoding="utf-8").splitlines()
+                   if not line.startswith("#"))
+    assert samples["outlook_sync_last_run_success"] == "0"
+    assert samples['outlook_sync_stage_success{stage="export"}'] == "1"
+    assert samples['outlook_sync_stage_success{stage="email"}'] == "0"
+    assert samples['outlook_sync_stage_items{stage="export"}'] == "42"
+    assert samples['outlook_sync_events{kind="modified"}'] == "2"
+    assert samples['outlook_sync_last_run_error{stage="email",category="connection"}'] == "1"
+    assert not list(tmp_path.glob("*.tmp"))
+
+def test_successful_run_reports_no_error():
+    report = RunReport("default")
+    with report.stage("export"):
+        pass
+    report.finish(True)
+    assert report.to_dict()["error"] is None
+    assert "last_run_error" not in report.prometheus_text()
+
+@pytest.mark.parametrize("error, category", [
+    (socket.timeout("timed out"), "timeout"),
+    (smtplib.SMTPAuthenticationError(535, b"bad credentials"), "auth"),
+    (smtplib.SMTPDataError(554, b"rejected"), "smtp"),
+    (ConnectionRefusedError(), "connection"),
+    (FileNotFoundError("missing.csv"), "io"),
+    (ValueError("Unrecognized date format"), "data"),
+    (KeyError("Subject"), "unexpected"),
+])
+def test_error_categories(error, category):
+    assert error_category(error) == category
@@ -0,0 +1,110 @@
+import json
+import pytest
+import caldav_sink
+import calendar_sources
+import email_icloud
+import export_outlook_calendar
+import sync
+from calendar_sources import OutlookSource
+from fake_outlook import build_sample_namespace
+from fake_smtp import FakeSMTPServer
+from run_report import RunReport
+from sync_watch import SyncWatcher
+
+@pytest.fixture
+def smtp(tmp_path, monkeypatch):
+    with FakeSMTPServer() as server:
+        for name, value in (("smtp_server", server.host), ("smtp_port", server.port),
+                            ("smtp_security", "none"), ("smtp_user", "me@example.com"),
+                            ("smtp_password", "secret"), ("sender_email", "me@example.com"),
+                            ("receiver_email", "me@example.com"), ("_session", None)):
+            monkeypatch.setattr(email_icloud, name, value)
+        monkeypatch.setattr(export_outlook_calendar, "export_dir", str(tmp_path))
+        monkeypatch.setattr(sync, "run_report_file", str(tmp_path / "sync_report.json"))
+        monkeypatch.setattr(sync, "delivery_method", "email")
+        monkeypatch.setattr(sync, "ics_mode", "full")
+        monkeypatch.setenv("EXPORT_DIRECTORY", str(tmp_path))
+        monkeypatch.setenv("SYNC_STATE_FILE", str(tmp_path / "sync_state.db"))
+        yield server
+        email_icloud.get_session().close()
+
+@pytest.fixture
+def namespace():
+    return build_sample_namespace(single_events=60, recurring_series=2, days=60, history_years=0)
+
+def attachments(messages):
+    return [part.get_content() for message in messages for part in message.iter_attachments()]
+
+def text(content):
+    return content.decode("utf-8") if isinstance(content, bytes) else content
+
+def run(source):
+    report = RunReport(source.name)
+    assert sync.run_sync_with_deletions(source, report)
+    return report
+
+def upcoming_single(namespace):
+    return next(item for item in namespace.calendar._appointments
+                if item.get_property('Subject') == "Meeting 5")
+
+def test_unchanged_calendar_is_not_sent_again(smtp, namespace):
+    source = OutlookSource(namespace_factory=lambda: namespace)
+    run(source)
+    sent = len(smtp.messages)
+    assert sent >= 1
+
+    report = run(source)
+    assert len(smtp.messages) == sent
+    assert report.counts['added'] == report.counts['modified'] == report.counts['cancelled'] == 0
+
+    namespace.calendar.change(upcoming_single(namespace), Location="Board room")
+    report = run(source)
+    assert report.counts['modified'] == 1
+    assert any("LOCATION:Board room" in text(content) for content in attachments(smtp.messages[sent:]))
+
+def test_delta_mode_sends_cancellations_first(smtp, namespace, monkeypatch):
+    monkeypatch.setattr(sync, "ics_mode", "delta")
+    source = OutlookSource(namespace_factory=lambda: namespace)
+    run(source)
+    sent = len(smtp.messages)
+
+    item = upcoming_single(namespace)
+    start = item.get_property('Start').replace(hour=7)
+    namespace.calendar.change(item, Start=start, End=start.replace(hour=8))
+    run(source)
+    deletions, changes = [text(content) for content in attachments(smtp.messages[sent:])]
+    assert "METHOD:CANCEL" in deletions and deletions.count("BEGIN:VEVENT") == 1
+    assert "METHOD:PUBLISH" in changes and changes.count("BEGIN:VEVENT") == 1
+
+def test_watcher_rereads_only_the_reported_items(smtp, namespace, tmp_path):
+    watcher = SyncWatcher(OutlookSource(namespace_factory=lambda: namespace), debounce_seconds=0,
+                          max_delay_seconds=0, interval_minutes=60, state_file=str(tmp_path / "sync_state.db"))
+    try:
+        assert watcher.run_once()
+        watcher.ensure_subscribed()
+        sent = len(smtp.messages)
+
+        item = upcoming_single(namespace)
+        namespace.calendar.change(item, Subject="Renamed meeting")
+        assert watcher.collector.due()
+        assert watcher.sync_changes()
+        assert watcher.targeted_runs == 1
+        assert any("SUMMARY:Renamed meeting" in text(content) for content in attachments(smtp.messages[sent:]))
+    finally:
+        watcher._drop_state()
+
+def test_configuration_error_fails_the_run_instead_of_raising(smtp, namespace, monkeypatch, tmp_path):
+    monkeypatch.setattr(sync, "delivery_method", "caldav")
+    monkeypatch.setattr(caldav_sink, "caldav_url", "")
+    monkeypatch.setattr(caldav_sink, "_client", None)
+    report = RunReport("outlook")
+    assert sync.run_sync_with_deletions(OutlookSource(namespace_factory=lambda: namespace), report) is False
+    saved = json.loads((tmp_path / "sync_report.json").read_text(encoding="utf-8"))
+    assert (saved["success"], saved["failed_stage"], saved["error"]) == (False, "caldav_push", "data")
+    assert "Invalid CalDAV collection URL" in report.failed_stage.message
+
+def test_error_outside_a_stage_is_reported_too(smtp, monkeypatch):
+    monkeypatch.setattr(calendar_sources, "source_backend", "exchange")
+    report = RunReport()
+    assert sync.run_sync_with_deletions(report=report) is False
+    assert (report.failed_stage.name, report.failed_stage.error) == ("run", "data")
@@ -0,0 +1,56 @@
+import json
+import sys
+import pytest
+import sync_batch
+from fake_caldav import FakeCalDAVServer
+
+@pytest.fixture
+def caldav():
+    with FakeCalDAVServer() as server:
+        yield server
+
+@pytest.fixture
+def batch(tmp_path, monkeypatch):
+    """Profiles directory; state and the batch report go under tmp_path"""
+    monkeypatch.setattr(sync_batch, "batch_state_dir", str(tmp_path / "state"))
+    monkeypatch.setattr(sync_batch, "batch_report_file", str(tmp_path / "state" / "batch_report.json"))
+    profiles = tmp_path / "profiles"
+    profiles.mkdir()
+    return profiles
+
+def write_profile(directory, name, **settings):
+    (directory / f"{name}.env").write_text("".join(f"{key}={value}\n" for key, value in settings.items()),
+                                           encoding="utf-8")
+
+def run_main(monkeypatch, *args):
+    monkeypatch.setattr(sys, "argv", ["sync_batch.py", *args])
+    return sync_batch.main()
+
+def test_failing_profile_does_not_stop_the_others(batch, caldav, monkeypatch):
+    write_profile(batch, "alice", SOURCE_BACKEND="synthetic", SYNTHETIC_EVENTS=20,
+                  DELIVERY_METHOD="caldav", CALDAV_URL=caldav.url)
+    write_profile(batch, "bob", SOURCE_BACKEND="ics", SOURCE_ICS_FILE=str(batch / "missing.ics"),
+                  DELIVERY_METHOD="caldav", CALDAV_URL=caldav.url)
+
+    assert run_main(monkeypatch, str(batch), "--workers", "2", "--timeout", "60") == 1
+
+    report = json.loads(open(sync_batch.batch_report_file, encoding="utf-8").read())
+    results = {result["profile"]: result for result in report["profiles"]}
+    assert report["success"] is False
+    assert results["alice"]["success"] and results["alice"]["counts"]["added"] == 20
+    assert not results["bob"]["success"] and results["bob"]["error"]
+    assert len(caldav.resources) == 20  # Only alice's events were pushed
+    # Each profile keeps its own state and log
+    state = batch.parent / "state"
+    assert (state / "alice" / "sync_state.db").exists()
+    assert results["bob"]["log"] == str(state / "bob" / "sync.log")
+    assert "missing.ics" in (state / "bob" / "sync.log").read_text(encoding="utf-8")
+    # The profile without a successful sync goes first next time
+    profiles = sync_batch.load_profiles(str(batch))
+    assert [profile.name for profile in sync_batch.fair_order(profiles)] == ["bob", "alice"]
+
+def test_batch_succeeds_only_when_every_profile_does(batch, caldav, monkeypatch):
+    write_profile(batch, "alice", SOURCE_BACKEND="synthetic", SYNTHETIC_EVENTS=5,
+                  DELIVERY_METHOD="caldav", CALDAV_URL=caldav.url)
+    assert run_main(monkeypatch, str(batch)) == 0
+    assert run_main(monkeypatch, str(batch / "nobody.env")) == 1  # Unknown profile file
@@ -0,0 +1,72 @@
+import threading
+import time
+from types import SimpleNamespace
+import pytest
+import sync_daemon
+from sync_daemon import SyncDaemon
+
+class Outcomes(list):
+    """Scripted results for run_sync_with_deletions, with the tracker each run got"""
+    trackers = None
+
+@pytest.fixture
+def outcomes(monkeypatch):
+    outcomes = Outcomes()
+    trackers = []
+    def fake_sync(source, report, tracker):
+        trackers.append(tracker)
+        tracker.sequences["event"] = tracker.sequences.get("event", 0) + 1  # As bump_sequences would
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+    monkeypatch.setattr(sync_daemon, "run_sync_with_deletions", fake_sync)
+    outcomes.trackers = trackers
+    return outcomes
+
+@pytest.fixture
+def daemon(tmp_path):
+    daemon = SyncDaemon(source=SimpleNamespace(name="test"), interval_minutes=0, jitter_seconds=0,
+                        state_file=str(tmp_path / "state.db"))
+    yield daemon
+    daemon._drop_state()
+
+def test_successful_runs_keep_the_tracker_warm(daemon, outcomes):
+    outcomes.extend([True, True])
+    assert daemon.run_once() and daemon.run_once()
+    assert outcomes.trackers[0] is outcomes.trackers[1]
+    assert daemon.failures == 0
+
+@pytest.mark.parametrize("failure", [False, RuntimeError("boom")])
+def test_a_failed_run_discards_the_tracker(daemon, outcomes, failure):
+    outcomes.extend([failure, True])
+    assert not daemon.run_once()
+    assert daemon.tracker is None
+    assert daemon.run_once()
+    first, second = outcomes.trackers
+    assert second is not first
+    assert second.sequences == {"event": 1}  # The failed run's bump was not kept
+    assert (daemon.runs, daemon.failures) == (2, 1)
+
+def test_run_retries_after_a_failure_until_max_runs(daemon, outcomes):
+    outcomes.extend([False, True, True])
+    daemon.run(max_runs=3)
+    assert (daemon.runs, daemon.failures) == (3, 1)
+    assert daemon.tracker is None
+
+def test_stop_ends_a_long_wait_promptly(daemon, outcomes):
+    outcomes.append(True)
+    daemon.next_delay = lambda: 3600
+    threading.Timer(0.2, daemon.stop).start()
+    started = time.monotonic()
+    daemon.run()
+    assert time.monotonic() - started < 5
+    assert daemon.runs == 1
+
+def test_wait_uses_short_slices(daemon, monkeypatch):
+    waits = []
+    monkeypatch.setattr(daemon.stop_event, "wait", lambda timeout: waits.append(timeout))
+    clock = iter(range(100))
+    monkeypatch.setattr(sync_daemon, "time", SimpleNamespace(monotonic=lambda: next(clock) * 0.5))
+    daemon.wait(3.5)
+    assert len(waits) > 1 and max(waits) <= sync_daemon.WAIT_SLICE_SECONDS
@@ -0,0 +1,82 @@
+import json
+import pytest
+from calendar_event import Event
+from sync_state import SyncStateStore
+
+def meeting(index, hour=9, location="Room 1"):
+    return Event(f"Meeting {index}", f"2025-03-{index:02d} {hour:02d}:00:00",
+                 f"2025-03-{index:02d} {hour + 1:02d}:00:00", location, f"Agenda {index}")
+
+def summary(events):
+    return {event_id: (event.subject, event.start_text, event.location, event.body_digest)
+            for event_id, event in events.items()}
+
+@pytest.fixture
+def store(tmp_path):
+    store = SyncStateStore(str(tmp_path / "state.db"), keep_snapshots=3)
+    yield store
+    store.close()
+
+def save(store, events):
+    store.replace_events({event.event_id: event for event in events})
+    return store.load_events()
+
+def test_rollback_restores_an_earlier_save(store):
+    first = save(store, [meeting(1), meeting(2), meeting(3)])
+    first_id = store.latest_snapshot()
+    save(store, [meeting(1, location="Room 9"), meeting(3, hour=14), meeting(4)])
+    store.set_meta('delivered_fingerprint', "abc")
+
+    restored, removed = store.rollback(first_id)
+    assert summary(store.load_events()) == summary(first)
+    assert (restored, removed) == (3, 2)  # Meetings 1-3 back, moved 3 and new 4 gone
+    assert store.get_meta('delivered_fingerprint') is None
+
+def test_a_rollback_can_be_undone(store):
+    save(store, [meeting(1)])
+    first_id = store.latest_snapshot()
+    second = save(store, [meeting(1), meeting(2)])
+    second_id = store.latest_snapshot()
+    store.rollback(first_id)
+    assert store.latest_snapshot() > second_id
+    assert store.list_snapshots()[-1][4] == f"rollback to {first_id}"
+    store.rollback(second_id)
+    assert summary(store.load_events()) == summary(second)
+
+def test_load_snapshot_rebuilds_every_retained_save(store):
+    expected = {}
+    for events in ([meeting(1)], [meeting(1), meeting(2)], [meeting(2, location="Hall")]):
+        saved = save(store, events)
+        expected[store.latest_snapshot()] = summary(saved)
+    for snapshot_id, events in expected.items():
+        assert summary(store.load_snapshot(snapshot_id)) == events
+
+def test_only_keep_snapshots_are_retained(store):
+    for index in range(1, 7):
+        save(store, [meeting(day) for day in range(1, index + 1)])
+    snapshots = store.list_snapshots()
+    assert len(snapshots) == 3
+    assert [total for _, _, total, _, _ in snapshots] == [4, 5, 6]
+    with pytest.raises(KeyError):
+        store.load_snapshot(snapshots[0][0] - 1)
+    assert len(store.load_snapshot(snapshots[0][0])) == 4
+
+def test_legacy_json_history_is_migrated_once(store, tmp_path):
+    events = [meeting(1), meeting(2, location="Room 7")]
+    legacy = tmp_path / "sync_history.json"
+    legacy.write_text(json.dumps({
+        'sync_date': "2025-03-01T08:00:00", 'last_full_sync': "2025-02-28T08:00:00",
+        'events': {event.event_id: event.to_dict() for event in events},
+        'sequences': {events[1].event_id: 3},
+    }), encoding='utf-8')
+
+    assert store.migrate_from_json(str(legacy))
+    assert summary(store.load_events()) == summary({event.event_id: event for event in events})
+    assert store.load_sequences() == {events[1].event_id: 3}
+    assert store.get_meta('sync_date') == "2025-03-01T08:00:00"
+    assert store.get_meta('last_full_sync') == "2025-02-28T08:00:00"
+    assert store.get_meta('migrated_from') == str(legacy)
+
+    save(store, [meeting(3)])
+    assert not store.migrate_from_json(str(legacy))  # Already migrated; the store is not overwritten
+    assert [event.subject for event in store.load_events().values()] == ["Meeting 3"]